@@ -0,0 +1,226 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+import numpy as np
+
+from plotting.aggregate import aggregate_run
+from plotting.convert import convert_run
+from plotting.parsing import decode_run, load_run, read_run
+from plotting.registry import figure_job, figure_targets, trial_matches
+from plotting.render import render_figures
+from plotting.settings import is_dynamic
+from plotting.synthetic import TRIALS, generate_tree
+
+# Sizes as seeds x samples per dynamic run, from today's single seed upwards.
+# 10000x10000 writes tens of gigabytes and has to be asked for explicitly.
+DEFAULT_SIZES = "1x1000,100x1000,1000x1000"
+
+
+def parse_size(size):
+    nOfSeeds, _, nOfSamples = size.partition("x")
+    return int(nOfSeeds), int(nOfSamples)
+
+
+def tree_size(path):
+    return sum(os.path.getsize(os.path.join(path, run)) for run in os.listdir(path))
+
+
+def baseline_load(path, trial):
+    """Parse a run file like generate_plots.py did before plotting.parsing, the reference for the load stage.
+
+    The whole file is read with readlines, every line split and parsed by
+    np.fromstring, and the dynamic runs are cut to the shortest one.
+    """
+    with open(path) as f:
+        lines = f.readlines()
+
+    xRuns = []
+    yRuns = {}
+    for line in lines:
+        key, values = line.strip().split(":")
+        if key == "settings":
+            xRuns.append(np.fromstring(values, sep=",") if is_dynamic(trial) else values)
+        else:
+            yRuns.setdefault(key, []).append(np.fromstring(values, sep=","))
+
+    if not is_dynamic(trial):
+        return np.array(xRuns, dtype=object), {yDatName: np.array(values).flatten() for yDatName, values in yRuns.items()}
+    minItems = min(x.shape[0] for x in xRuns)
+    return (
+        np.array([x[:minItems] for x in xRuns]).flatten(),
+        {yDatName: np.array([run[:minItems] for run in values]).flatten() for yDatName, values in yRuns.items()}
+    )
+
+
+def measure(stage, repeat, memory):
+    """Run `stage()` `repeat` times and return its result, the fastest time and the peak traced memory.
+
+    The peak comes from an extra run under tracemalloc, which NumPy reports
+    its buffers to, so tracing does not slow down the timed runs.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = stage()
+        best = min(best, time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        stage()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def benchmark_trial(topDir, trial, figureDir, repeat, memory):
+    """Time the parse (of the text and of the binary run files), align, aggregate and render stages of one result directory.
+
+    The load stage parses and aligns the text run files in one go, as
+    generate_plots.py does, and loadBaseline does the same with the parser
+    it replaced (see baseline_load).
+    """
+    runs = sorted(os.listdir(f"{topDir}/{trial}"))
+    targets = [(spec, trialDir) for spec, trialDir in figure_targets([trial]) if trialDir == trial]
+    results = []
+
+    raw, seconds, peak = measure(lambda: {run: read_run(f"{topDir}/{trial}/{run}", trial) for run in runs}, repeat, memory)
+    results.append(("parse", seconds, peak))
+
+    # The same run files in the binary format of plotting.binary
+    binaryDir = f"{topDir}_binary/{trial}"
+    for run in runs:
+        if not os.path.exists(f"{binaryDir}/{run}"):
+            convert_run(f"{topDir}/{trial}/{run}", f"{binaryDir}/{run}", trial)
+    _, seconds, peak = measure(lambda: {run: read_run(f"{binaryDir}/{run}", trial) for run in runs}, repeat, memory)
+    results.append(("parseBinary", seconds, peak))
+
+    _, seconds, peak = measure(lambda: {run: load_run(f"{topDir}/{trial}/{run}", trial, run) for run in runs}, repeat, memory)
+    results.append(("load", seconds, peak))
+    _, seconds, peak = measure(lambda: {run: baseline_load(f"{topDir}/{trial}/{run}", trial) for run in runs}, repeat, memory)
+    results.append(("loadBaseline", seconds, peak))
+
+    # Aligning the dynamic runs onto the sampling grid, decoding the settings of the others
+    parsed, seconds, peak = measure(lambda: {run: decode_run(raw[run], trial, run) for run in runs}, repeat, memory)
+    results.append(("align" if is_dynamic(trial) else "decode", seconds, peak))
+
+    def aggregate():
+        trialData = {}
+        for run in runs:
+            x, y, yErr = aggregate_run(parsed[run].xRuns, parsed[run].yRuns)
+            trialData[run] = {"x": x, "y": y, "yErr": yErr}
+        return trialData
+    trialData, seconds, peak = measure(aggregate, repeat, memory)
+    results.append(("aggregate", seconds, peak))
+
+    def render():
+        jobs = [figure_job(spec, trialDir, trialData) for spec, trialDir in targets]
+        return render_figures([job._replace(path=os.path.join(figureDir, job.path)) for job in jobs])
+    _, seconds, peak = measure(render, repeat, memory)
+    results.append(("render", seconds, peak))
+
+    return [
+        {"trial": trial, "stage": stage, "seconds": seconds, "peakBytes": peak, "inputBytes": tree_size(f"{topDir}/{trial}"), "blocks": sum(r.blocks for r in raw.values())}
+        for stage, seconds, peak in results
+    ]
+
+
+def regressions(results, baseline, tolerance):
+    """The results that are more than `tolerance` times slower than the same benchmark in `baseline`."""
+    def key(result):
+        return (result["seeds"], result["samples"], result["trial"], result["stage"])
+
+    baselineSeconds = {key(result): result["seconds"] for result in baseline["results"]}
+    return [
+        (result, baselineSeconds[key(result)]) for result in results
+        if key(result) in baselineSeconds and result["seconds"] > tolerance * baselineSeconds[key(result)]
+    ]
+
+
+def print_load_comparison(trialResults):
+    load, baseline = ({result["stage"]: result for result in trialResults}[stage] for stage in ("load", "loadBaseline"))
+    line = f"  load {load['seconds']:.3f}s, baseline {baseline['seconds']:.3f}s"
+    if load["peakBytes"] is not None:
+        line += f"; peak {load['peakBytes'] / 2 ** 20:.0f} MiB, baseline {baseline['peakBytes'] / 2 ** 20:.0f} MiB"
+    print(line, file=sys.stderr)
+
+
+def run_benchmarks(args, dataDir, figureDir):
+    results = []
+    for size in args.sizes.split(","):
+        nOfSeeds, nOfSamples = parse_size(size)
+        topDir = os.path.join(dataDir, f"{nOfSeeds}x{nOfSamples}")
+        if not os.path.exists(topDir):
+            print(f"Generating {topDir}", file=sys.stderr)
+            generate_tree(f"{topDir}.tmp", args.trial or TRIALS, nOfSeeds, nOfSamples)
+            os.replace(f"{topDir}.tmp", topDir)
+
+        for trial in sorted(os.listdir(topDir)):
+            if args.trial and not any(trial_matches(pattern, trial) for pattern in args.trial):
+                continue
+            print(f"Benchmarking {trial} at {nOfSeeds}x{nOfSamples}", file=sys.stderr)
+            trialResults = benchmark_trial(topDir, trial, figureDir, args.repeat, not args.no_memory)
+            results += [dict(result, seeds=nOfSeeds, samples=nOfSamples) for result in trialResults]
+            print_load_comparison(trialResults)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stages of generate_plots.py on synthetic result trees")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"comma separated SEEDSxSAMPLES sizes, default {DEFAULT_SIZES}")
+    parser.add_argument("--trial", action="append", choices=TRIALS, help="only benchmark this trial, can be repeated")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs per stage, the fastest counts")
+    parser.add_argument("--no-memory", action="store_true", help="skip the extra tracemalloc run per stage that measures peak memory")
+    parser.add_argument("--data-dir", help="keep the generated trees in this directory and reuse them on the next invocation")
+    parser.add_argument("--output", help="write the results as JSON to this file instead of stdout")
+    parser.add_argument("--baseline", help="JSON results of an earlier invocation to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="slowdown relative to --baseline that counts as a regression")
+    args = parser.parse_args()
+
+    matplotlib.use("Agg")
+    workDir = tempfile.mkdtemp(prefix="benchmark_plots_")
+
+    try:
+        # Keep stdout for the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            results = run_benchmarks(args, args.data_dir or workDir, workDir)
+    finally:
+        shutil.rmtree(workDir)
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "machine": platform.machine(),
+        # ru_maxrss is in KiB on Linux
+        "maxRssBytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "results": results
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f), args.tolerance)
+        for result, baselineSeconds in slower:
+            print(f"Regression: {result['stage']} of {result['trial']} at {result['seeds']}x{result['samples']} took {result['seconds']:.4f}s, was {baselineSeconds:.4f}s", file=sys.stderr)
+        if len(slower) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
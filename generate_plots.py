@@ -1,565 +1,289 @@
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mtick
 import numpy as np
+import argparse
+import cProfile
+import csv
 import os
+import sys
+import time
+
+from plotting.cache import RunCache
+from plotting.ingest import ingest_runs, ingest_stored_run
+from plotting.instrument import PROFILER, debug, set_verbosity
+from plotting.online import SKETCH_ACCURACY
+from plotting.parsing import describe_skipped
+from plotting.registry import DYNAMIC_BAND_METRICS, DYNAMIC_LABELS, DYNAMIC_RUNS, figure_job, figure_path, figure_targets, required_runs, sweep_jobs, sweep_runs, sweep_targets
+from plotting.render import FigureManifest, render_figures
+from plotting.settings import is_dynamic
+from plotting.statistics import compare_runs, confidence_bands, run_quantiles
+from plotting.store import ResultStore
+from plotting.summary import WRITERS
 
 topDir = "app/output_files"
-trials = os.listdir(topDir)
-
-print(trials)
-
-def sort_on_first_row(data):
-    return data[:, data[0, :].argsort()]
 
 trial_data = {}
-for trial in trials:
-    # if (trial != "DYNAMIC_REBALANCING_COMPARISON"):
-    #     continue
-
-    trial_data[trial] = {}
-    runFiles = os.listdir(f"{topDir}/{trial}")
-    print(len(runFiles))
-
-    for run in runFiles:
-        lines = []
-        with open(f"{topDir}/{trial}/{run}") as f:
-            lines = f.readlines()
-
-        trial_data[trial][run] = {
-            "xRuns": [],
-            "yRuns": {},
-            "x": [],
-            "y": {},
-            "yErr": {}
-        }
-
-        i = 0
-        while i < len(lines):
-            currentLine = lines[i]
-            lineParts = currentLine.strip().split(":")
-            if lineParts[0] == "settings":
-                settingParts = lineParts[1].split("_")
-                if trial == "PART_DISC" and "hopCount" in run:
-                    trial_data[trial][run]["xRuns"].append(settingParts[0])
-                elif trial == "PART_DISC" and "maxNumberOfInvites" in run:
-                    trial_data[trial][run]["xRuns"].append(settingParts[1])
-                elif trial == "SCORE_VS_PERC_LEADERS" and "percentageLeaders" in run:
-                    trial_data[trial][run]["xRuns"].append(settingParts[2])
-                elif trial == "STATIC_REBALANCING_COMPARISON":
-                    trial_data[trial][run]["xRuns"].append(lineParts[1])
-                elif "DYNAMIC_REBALANCING_COMPARISON" in trial:
-                    trial_data[trial][run]["xRuns"].append(np.fromstring(lineParts[1], sep=","))
-
-
-                j = i + 1
-                while j < len(lines) and lines[j].strip().split(":")[0] != "settings":
-                    lineParts = lines[j].strip().split(":")
-                    if not (lineParts[0] in trial_data[trial][run]["yRuns"]):
-                        trial_data[trial][run]["yRuns"][lineParts[0]] = [np.fromstring(lineParts[1], sep=",")]
-                    else:
-                        trial_data[trial][run]["yRuns"][lineParts[0]].append(np.fromstring(lineParts[1], sep=",")) #np.vstack((trial_data[trial][run]["yRuns"][lineParts[0]], np.fromstring(lineParts[1], sep=",")))
-                    
-                    j += 1
-
-                i = j
-
-        minItems = 100000000
-        minArr = None
-        if "DYNAMIC_REBALANCING_COMPARISON" in trial:
-            for arr in trial_data[trial][run]["xRuns"]:
-                if arr.shape[0] < minItems:
-                    minItems = arr.shape[0]
-                    minArr = arr
-
-            for i in range(len(trial_data[trial][run]["xRuns"])):
-                trial_data[trial][run]["xRuns"][i] = trial_data[trial][run]["xRuns"][i][:minItems]
-
-                for yDatName in trial_data[trial][run]["yRuns"]:
-                    trial_data[trial][run]["yRuns"][yDatName][i] = trial_data[trial][run]["yRuns"][yDatName][i][:minItems]
-                
-                
-
-            for yDatName in trial_data[trial][run]["yRuns"]:
-                    trial_data[trial][run]["yRuns"][yDatName] = np.array(trial_data[trial][run]["yRuns"][yDatName])
-                    #print("yshape", trial_data[trial][run]["yRuns"][yDatName].shape)
-
-            trial_data[trial][run]["xRuns"] = np.array(trial_data[trial][run]["xRuns"]).flatten()
-            #print("xshape", trial_data[trial][run]["xRuns"].shape)
-
-        else:
-            trial_data[trial][run]["xRuns"] = np.array(trial_data[trial][run]["xRuns"], dtype=object)
-
-        for yDatName in trial_data[trial][run]["yRuns"]:
-            trial_data[trial][run]["yRuns"][yDatName] = np.array(trial_data[trial][run]["yRuns"][yDatName]).flatten()
 
-        unique_x = np.unique(trial_data[trial][run]["xRuns"])
-        print("unique", unique_x, unique_x.shape)
-        trial_data[trial][run]["x"] = unique_x
-
-        for xU in unique_x:
-            unique_indices = np.where(trial_data[trial][run]["xRuns"] == xU)
-            for yDatName in trial_data[trial][run]["yRuns"]:
-                yPerX = trial_data[trial][run]["yRuns"][yDatName][unique_indices]
-
-                if not (yDatName in trial_data[trial][run]["y"]):
-                    trial_data[trial][run]["y"][yDatName] = []
-                    trial_data[trial][run]["yErr"][yDatName] = []
-
-                trial_data[trial][run]["y"][yDatName].append(np.average(yPerX))
-                trial_data[trial][run]["yErr"][yDatName].append(np.std(yPerX))
-
-        for yDatName in trial_data[trial][run]["y"]:
-            trial_data[trial][run]["y"][yDatName] = np.array(trial_data[trial][run]["y"][yDatName])
+def run_file_stats(trialRuns):
+    stats = {}
+    for trial, run in trialRuns:
+        path = f"{topDir}/{trial}/{run}"
+        if os.path.exists(path):
+            stat = os.stat(path)
+            stats[(trial, run)] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+def load_runs(trialRuns, cache, nOfJobs, streaming=False, store=None, sketchAccuracy=None):
+    if store is None:
+        runs = [(f"{topDir}/{trial}/{run}", trial, run) for trial, run in trialRuns]
+        results = ingest_runs(runs, cache, nOfJobs, streaming, sketchAccuracy)
+    else:
+        results = [ingest_stored_run(store, trial, run) for trial, run in trialRuns]
+    for (trial, run), runData in zip(trialRuns, results):
+        trial_data.setdefault(trial, {})[run] = runData
+        debug("unique", runData["x"], runData["x"].shape)
+        for line in describe_skipped(f"{trial}/{run}", runData["skipped"]):
+            print(line)
 
         #print("final_processing", trial_data[trial][run])
 
-    if trial == "PART_DISC":
-        fig = plt.figure()
-        ax1 = fig.subplots(1)
-
-        x = np.array(trial_data[trial]["hopCount_5.csv"]["x"], dtype=np.double)
-        all_data = np.array([
-            x, 
-            trial_data[trial]["hopCount_5.csv"]["y"]["nOfParticipants"], 
-            trial_data[trial]["hopCount_5.csv"]["yErr"]["nOfParticipants"], 
-            trial_data[trial]["hopCount_7.csv"]["y"]["nOfParticipants"], 
-            trial_data[trial]["hopCount_7.csv"]["yErr"]["nOfParticipants"], 
-            trial_data[trial]["hopCount_9.csv"]["y"]["nOfParticipants"], 
-            trial_data[trial]["hopCount_9.csv"]["yErr"]["nOfParticipants"]
-        ], dtype=np.double)
-        sorted_data = sort_on_first_row(all_data)
-
-        for i in range(1, 7, 2):
-            ax1.plot(
-                sorted_data[0,:], 
-                sorted_data[i,:], 
-                marker='o',
-                label=fr"$I_m = {i+4}$"
-            )
-            ax1.fill_between(
-                sorted_data[0,:],
-                sorted_data[i,:] - sorted_data[i+1,:],
-                sorted_data[i,:] + sorted_data[i+1,:],
-                alpha=0.5
-            )
-        ax1.set_xlim(1)
-        ax1.set_ylim(0)
-        ax1.set_ylabel("Number of participants $|P|$")
-        ax1.set_xlabel("Hop count $h_c$")
-
-        ax1.grid()
-
-        ax1.legend()
-
-        fig.savefig(f"{trial}_hopCount.pdf")
-        plt.close(fig)
-
-        fig = plt.figure()
-        ax1 = fig.subplots(1)
-
-        x = np.array(trial_data[trial]["maxNumberOfInvites_3.csv"]["x"], dtype=np.double)
-        all_data = np.array([x, 
-            trial_data[trial]["maxNumberOfInvites_3.csv"]["y"]["nOfParticipants"], 
-            trial_data[trial]["maxNumberOfInvites_3.csv"]["yErr"]["nOfParticipants"], 
-            trial_data[trial]["maxNumberOfInvites_4.csv"]["y"]["nOfParticipants"], 
-            trial_data[trial]["maxNumberOfInvites_4.csv"]["yErr"]["nOfParticipants"], 
-            trial_data[trial]["maxNumberOfInvites_5.csv"]["y"]["nOfParticipants"], 
-            trial_data[trial]["maxNumberOfInvites_5.csv"]["yErr"]["nOfParticipants"]
-        ], dtype=np.double)
-        sorted_data = sort_on_first_row(all_data)
-        
-        j = 0
-        for i in range(1, 7, 2):
-            ax1.plot(
-                sorted_data[0,:], 
-                sorted_data[i,:], 
-                marker='o',
-                label=fr"$h_c = {j + 3}$"
-            )
-            ax1.fill_between(
-                sorted_data[0,:],
-                sorted_data[i,:] - sorted_data[i+1,:],
-                sorted_data[i,:] + sorted_data[i+1,:],
-                alpha=0.5
-            )
-            j += 1
-
-        ax1.set_xlim(1)
-        ax1.set_ylim(0)
-        ax1.set_ylabel("Number of participants $|P|$")
-        ax1.set_xlabel("Maxmimum number of invites per node $I_m$")
-
-        ax1.grid()
-        ax1.legend(loc="upper left")
-
-        fig.savefig(f"{trial}_maxNumberOfInvites.pdf")
-        plt.close(fig)
-    elif trial == "SCORE_VS_PERC_LEADERS":
-        fig = plt.figure()
-        ax1 = fig.subplots(1)
-        
-        x = np.array(trial_data[trial]["percentageLeaders_5.csv"]["x"], dtype=np.double) * 100.
-        all_data = np.array([
-            x, 
-            trial_data[trial]["percentageLeaders_5.csv"]["y"]["totalDemandsMet"], 
-            trial_data[trial]["percentageLeaders_5.csv"]["yErr"]["totalDemandsMet"], 
-            trial_data[trial]["percentageLeaders_7.csv"]["y"]["totalDemandsMet"], 
-            trial_data[trial]["percentageLeaders_7.csv"]["yErr"]["totalDemandsMet"],
-            trial_data[trial]["percentageLeaders_9.csv"]["y"]["totalDemandsMet"], 
-            trial_data[trial]["percentageLeaders_9.csv"]["yErr"]["totalDemandsMet"],
-            trial_data[trial]["percentageLeaders_5.csv"]["y"]["nOfRebalanceMes"], 
-            trial_data[trial]["percentageLeaders_5.csv"]["yErr"]["nOfRebalanceMes"],
-            trial_data[trial]["percentageLeaders_7.csv"]["y"]["nOfRebalanceMes"], 
-            trial_data[trial]["percentageLeaders_7.csv"]["yErr"]["nOfRebalanceMes"],
-            trial_data[trial]["percentageLeaders_9.csv"]["y"]["nOfRebalanceMes"], 
-            trial_data[trial]["percentageLeaders_9.csv"]["yErr"]["nOfRebalanceMes"]
-        ], dtype=np.double)
-        sorted_data = sort_on_first_row(all_data)
-
-        for i in range(1, 7, 2):
-            ax1.plot(
-                sorted_data[0,:], 
-                sorted_data[i,:], 
-                marker='o',
-                label=fr"$I_m = {i+4}$"
-            )
-            ax1.fill_between(
-                sorted_data[0,:],
-                sorted_data[i,:] - sorted_data[i+1,:],
-                sorted_data[i,:] + sorted_data[i+1,:],
-                alpha=0.5
-            )
-
-        ax1.set_xlim(0, 100)
-        ax1.set_ylim(0)
-        ax1.set_ylabel("Number of demands met")
-        ax1.set_xlabel(r"Percentage of leaders $\rho$")
-        ax1.xaxis.set_major_formatter(mtick.PercentFormatter())
-
-        ax1.grid()
-
-        ax1.legend(loc="lower right")
-
-        fig.savefig(f"{trial}_percentageLeaders_score.pdf")
-        plt.close(fig)
-        
-        fig = plt.figure()
-        ax1 = fig.subplots(1)
-        
-        for i in range(7, 13, 2):
-            ax1.plot(
-                sorted_data[0,:], 
-                sorted_data[i,:], 
-                marker='o',
-                label=fr"$I_m = {i-6+4}$"
-            )
-            ax1.fill_between(
-                sorted_data[0,:],
-                sorted_data[i,:] - sorted_data[i+1,:],
-                sorted_data[i,:] + sorted_data[i+1,:],
-                alpha=0.5
-            )
-
-        ax1.set_xlim(0, 100)
-        ax1.set_ylim(0)
-        ax1.set_ylabel("Number of messages send")
-        ax1.set_xlabel(r"Percentage of leaders $\rho$")
-        ax1.xaxis.set_major_formatter(mtick.PercentFormatter())
-
-        ax1.grid()
-
-        ax1.legend()
-
-        fig.savefig(f"{trial}_percentageLeaders_mes.pdf")
-        plt.close(fig)
-    elif trial == "STATIC_REBALANCING_COMPARISON":
-        width = 0.35
-
-        fig = plt.figure()
-        ax1 = fig.subplots(1)
-        
-        proto_types = trial_data[trial]["score_complete_graph.txt.csv"]["x"]
-        proto_types[np.where(proto_types == "CoinWasher")] = "Our protocol"
-
-        y_all = np.array([
-            trial_data[trial]["score_complete_graph.txt.csv"]["y"]["totalDemandsMet"],  
-            trial_data[trial]["score_difficult_graph.txt.csv"]["y"]["totalDemandsMet"], 
-            trial_data[trial]["score_lightning.csv"]["y"]["totalDemandsMet"],
-            trial_data[trial]["score_complete_graph.txt.csv"]["y"]["nOfRebalanceMes"],  
-            trial_data[trial]["score_difficult_graph.txt.csv"]["y"]["nOfRebalanceMes"], 
-            trial_data[trial]["score_lightning.csv"]["y"]["nOfRebalanceMes"],  
-            trial_data[trial]["score_complete_graph.txt.csv"]["y"]["time"],  
-            trial_data[trial]["score_difficult_graph.txt.csv"]["y"]["time"], 
-            trial_data[trial]["score_lightning.csv"]["y"]["time"], 
-        ], dtype=np.double)
-        yErr_all = np.array([
-            trial_data[trial]["score_complete_graph.txt.csv"]["yErr"]["totalDemandsMet"], 
-            trial_data[trial]["score_difficult_graph.txt.csv"]["yErr"]["totalDemandsMet"], 
-            trial_data[trial]["score_lightning.csv"]["yErr"]["totalDemandsMet"],
-            trial_data[trial]["score_complete_graph.txt.csv"]["yErr"]["nOfRebalanceMes"],  
-            trial_data[trial]["score_difficult_graph.txt.csv"]["yErr"]["nOfRebalanceMes"], 
-            trial_data[trial]["score_lightning.csv"]["yErr"]["nOfRebalanceMes"],  
-            trial_data[trial]["score_complete_graph.txt.csv"]["yErr"]["time"],  
-            trial_data[trial]["score_difficult_graph.txt.csv"]["yErr"]["time"], 
-            trial_data[trial]["score_lightning.csv"]["yErr"]["time"], 
-        ], dtype=np.double)
-        
-        labels_score = [r"$G_{\mathrm{Complete}}$", r"$G_{\mathrm{Design}}$", r"$G_{\mathrm{Lightning}}$ / $10^4$"]
-        labels_mes = [r"$G_{\mathrm{Complete}}$", r"$G_{\mathrm{Design}}$", r"$G_{\mathrm{Lightning}}$ / $10^3$"]
-        labels_time = [r"$G_{\mathrm{Complete}}$", r"$G_{\mathrm{Design}}$", r"$G_{\mathrm{Lightning}}$ / $10^2$"]
-        x = np.arange(len(labels_score))
-        print(y_all)
-
-        y_all[2, :] = y_all[2, :] / 1e4
-        yErr_all[2, :] = yErr_all[2, :] / 1e4
-        y_all[5, :] = y_all[5, :] / 1e3
-        yErr_all[5, :] = yErr_all[5, :] / 1e3
-        y_all[8, :] = y_all[8, :] / 1e2
-        yErr_all[8, :] = yErr_all[8, :] / 1e2
-        
-        ax1.grid()
-        ax1.set_axisbelow(True)
-
-        ax1.bar(x - width/2, y_all[:3,0], width, label=proto_types[0])
-        ax1.bar(x + width/2, y_all[:3,1], width, label=proto_types[1])
-        ax1.errorbar(x - width/2, y_all[:3,0], yErr_all[:3, 0], color="black", linestyle="", capsize=8)
-        ax1.errorbar(x + width/2, y_all[:3,1], yErr_all[:3, 1], color="black", linestyle="", capsize=8)
-
-        ax1.set_xticks(x)
-        ax1.set_xticklabels(labels_score)
-        ax1.set_ylabel("Number of demands met")
-        
-        ax1.legend()
-        fig.savefig(f"{trial}_static_comp_1.pdf")
-
-        fig = plt.figure()
-        ax1 = fig.subplots(1)
-
-        ax1.grid()
-        ax1.set_axisbelow(True)
-
-        ax1.bar(x - width/2, y_all[3:6,0], width, label=proto_types[0])
-        ax1.bar(x + width/2, y_all[3:6,1], width, label=proto_types[1])
-        ax1.errorbar(x - width/2, y_all[3:6,0], yErr_all[3:6, 0], color="black", linestyle="", capsize=8)
-        ax1.errorbar(x + width/2, y_all[3:6,1], yErr_all[3:6, 1], color="black", linestyle="", capsize=8)
-
-        ax1.set_xticks(x)
-        ax1.set_xticklabels(labels_mes)
-        ax1.set_ylabel("Number of messages send")
-        
-        ax1.legend()
-        fig.savefig(f"{trial}_static_comp_messages.pdf")
-        plt.close(fig)
-
-        fig = plt.figure()
-        ax1 = fig.subplots(1)
-
-        ax1.grid()
-        ax1.set_axisbelow(True)
-
-        ax1.bar(x - width/2, y_all[6:,0], width, label=proto_types[0])
-        ax1.bar(x + width/2, y_all[6:,1], width, label=proto_types[1])
-        ax1.errorbar(x - width/2, y_all[6:,0], yErr_all[6:, 0], color="black", linestyle="", capsize=8)
-        ax1.errorbar(x + width/2, y_all[6:,1], yErr_all[6:, 1], color="black", linestyle="", capsize=8)
-
-        ax1.set_xticks(x)
-        ax1.set_xticklabels(labels_time)
-        ax1.set_ylabel("Total time elapsed (ms)")
-        
-        ax1.legend()
-        fig.savefig(f"{trial}_static_comp_time.pdf")
-        plt.close(fig)
-    elif "DYNAMIC_REBALANCING_COMPARISON" in trial:
-        print(trial_data[trial]["data_CoinWasher.csv"]["x"])
-
-        fig = plt.figure()
-        ax1, ax2 = fig.subplots(2, sharex=True)
-
-        all_coinwasher_data = np.array([
-            trial_data[trial]["data_CoinWasher.csv"]["x"] / 1000, 
-            trial_data[trial]["data_CoinWasher.csv"]["y"]["successRatio"], 
-            trial_data[trial]["data_CoinWasher.csv"]["yErr"]["successRatio"], 
-            trial_data[trial]["data_CoinWasher.csv"]["y"]["networkImbalance"], 
-            trial_data[trial]["data_CoinWasher.csv"]["yErr"]["networkImbalance"], 
-            trial_data[trial]["data_CoinWasher.csv"]["y"]["nsOfTxAbortBecauseLocked"], 
-            trial_data[trial]["data_CoinWasher.csv"]["yErr"]["nsOfTxAbortBecauseLocked"], 
-            trial_data[trial]["data_CoinWasher.csv"]["y"]["nsOfTxAbortBecauseNoFunds"], 
-            trial_data[trial]["data_CoinWasher.csv"]["yErr"]["nsOfTxAbortBecauseNoFunds"], 
-            trial_data[trial]["data_CoinWasher.csv"]["y"]["nsOfRebalancingInvocations"], 
-            trial_data[trial]["data_CoinWasher.csv"]["yErr"]["nsOfRebalancingInvocations"]
-        ], dtype=np.double)
-        sorted_data = sort_on_first_row(all_coinwasher_data)
-
-        all_revive_data = np.array([
-            trial_data[trial]["data_Revive.csv"]["x"] / 1000, 
-            trial_data[trial]["data_Revive.csv"]["y"]["successRatio"], 
-            trial_data[trial]["data_Revive.csv"]["yErr"]["successRatio"], 
-            trial_data[trial]["data_Revive.csv"]["y"]["networkImbalance"], 
-            trial_data[trial]["data_Revive.csv"]["yErr"]["networkImbalance"], 
-            trial_data[trial]["data_Revive.csv"]["y"]["nsOfTxAbortBecauseLocked"], 
-            trial_data[trial]["data_Revive.csv"]["yErr"]["nsOfTxAbortBecauseLocked"], 
-            trial_data[trial]["data_Revive.csv"]["y"]["nsOfTxAbortBecauseNoFunds"], 
-            trial_data[trial]["data_Revive.csv"]["yErr"]["nsOfTxAbortBecauseNoFunds"], 
-            trial_data[trial]["data_Revive.csv"]["y"]["nsOfRebalancingInvocations"], 
-            trial_data[trial]["data_Revive.csv"]["yErr"]["nsOfRebalancingInvocations"]
-        ], dtype=np.double)
-        sorted_data = sort_on_first_row(all_revive_data)
-
-        all_no_rebalancing_data = np.array([
-            trial_data[trial]["data_Normal.csv"]["x"] / 1000, 
-            trial_data[trial]["data_Normal.csv"]["y"]["successRatio"], 
-            trial_data[trial]["data_Normal.csv"]["yErr"]["successRatio"], 
-            trial_data[trial]["data_Normal.csv"]["y"]["networkImbalance"], 
-            trial_data[trial]["data_Normal.csv"]["yErr"]["networkImbalance"], 
-            trial_data[trial]["data_Normal.csv"]["y"]["nsOfTxAbortBecauseLocked"], 
-            trial_data[trial]["data_Normal.csv"]["yErr"]["nsOfTxAbortBecauseLocked"], 
-            trial_data[trial]["data_Normal.csv"]["y"]["nsOfTxAbortBecauseNoFunds"], 
-            trial_data[trial]["data_Normal.csv"]["yErr"]["nsOfTxAbortBecauseNoFunds"], 
-            trial_data[trial]["data_Normal.csv"]["y"]["nsOfRebalancingInvocations"], 
-            trial_data[trial]["data_Normal.csv"]["yErr"]["nsOfRebalancingInvocations"]
-        ], dtype=np.double)
-        sorted_data = sort_on_first_row(all_no_rebalancing_data)
-        
-        dt = [all_coinwasher_data, all_revive_data, all_no_rebalancing_data]
-        labels = ["Our protocol", "Revive", "No rebalancing"]
-
-        for i in range(len(dt)):
-            ax1.plot(
-                dt[i][0, :], 
-                dt[i][1, :], 
-                label=labels[i]
-            )
-
-            ax1.fill_between(
-                dt[i][0,:],
-                dt[i][1,:] - dt[i][2,:],
-                dt[i][1,:] + dt[i][2,:],
-                alpha=0.5
-            )
-
-        ax1.set_xlim(0, dt[i][0, -1])
-        ax1.set_ylim(0, 1)
-        ax1.set_ylabel("Success ratio")
-        ax2.set_xlabel("Time (s)")
-        ax1.grid()
-
-        for i in range(len(dt)):
-            ax2.plot(
-                dt[i][0, :], 
-                dt[i][3, :]
-            )
-
-            ax2.fill_between(
-                dt[i][0,:],
-                dt[i][3,:] - dt[i][4,:],
-                dt[i][3,:] + dt[i][4,:],
-                alpha=0.5
-            )
-
-        ax2.set_ylabel("Average network imbalance")
-        ax2.grid()
-
-        fig.legend()
-
-        fig.savefig(f"{trial}_success_ratio.pdf")
-        plt.close(fig)
-
-        fig = plt.figure()
-        ax1, ax2, ax3 = fig.subplots(3, sharex=True, sharey=True)
-        axes = [ax1, ax2, ax3]
-        
-        for i in range(len(dt)):
-            axes[i].stackplot(
-                dt[i][0, :], 
-                dt[i][5, :],
-                dt[i][7, :],
-                labels=['Aborted because locked', 'Aborted because no funds'] if i == 0 else []
-            )
-            axes[i].set_ylabel(labels[i])
-            axes[i].yaxis.set_label_position('right')
-            axes[i].grid()
-
-            maxErrorLocked = np.max(dt[i][6, :])
-            maxErrorNoFunds = np.max(dt[i][8, :])
-            print(f"StDev of {labels[i]} is locked: {maxErrorLocked} noFunds: {maxErrorNoFunds}")
-
-        ax1.set_xlim(0, dt[i][0, -1])
-        ax3.set_xlabel("Time (s)")
-        fig.supylabel("Number of aborted transactions")
-        ax1.set_ylim(0, 4500)
-        
-        
-        fig.legend()
-
-        fig.savefig(f"{trial}_nOfTransactions.pdf")
-        plt.close(fig)
-
-        fig = plt.figure()
-        ax1 = fig.subplots(1)
-        
-        for i in range(len(dt) - 1):
-            ax1.plot(
-                dt[i][0, :], 
-                dt[i][9, :],
-                label=labels[i]
-            )
-
-            ax1.fill_between(
-                dt[i][0,:],
-                dt[i][9,:] - dt[i][10,:],
-                dt[i][9,:] + dt[i][10,:],
-                alpha=0.5
-            )
-
-        ax1.set_xlim(0, dt[i][0, -1])
-        ax1.set_xlabel("Time (s)")
-        ax1.set_ylabel("Number of protocol invocations")
-        ax1.grid()
-        ax1.set_ylim(0)
-        
-        ax1.legend()
-
-        fig.savefig(f"{trial}_nOfRebalancingInvocations.pdf")
-        plt.close(fig)
-
-
-
-# trial_names = ["no_rebalancing", "coinwasher", "revive"]
-# arr_per_trial = {}
-
-# for name in trial_names:
-#     arr_per_trial[name] = np.loadtxt(f"app/output_files/{name}.csv", delimiter=",")
-
-# fig = plt.figure()
-# ax1, ax2 = fig.subplots(2, sharex=True)
-
-# for name in trial_names:
-#     ax1.plot(arr_per_trial[name][0] / 1000, arr_per_trial[name][1], label=name)
-#     ax2.plot(arr_per_trial[name][0] / 1000, arr_per_trial[name][2])
-
-# ax1.set_xlim(0)
-# ax1.set_ylim(0, 1)
-# ax1.set_ylabel("Success ratio")
-
-# ax2.set_ylim(0)
-# ax2.set_xlabel("Time (s)")
-# ax2.set_ylabel("Average network imbalance")
-
-# fig.legend()
-
-# fig.savefig("test.pdf")
-# print("done")
-
-# val plt = Plot.create()
-# plt.plot()
-#     .add(x, y)
-#     .label("label")
-#     .linestyle("-")
-# plt.xlabel("Time (ms)")
-# plt.ylabel("Success ratio")
-# // plt.ylim(0, 1)
-# plt.xlim(0, x[x.size - 1])
-# //plt.text(0.5, 0.2, "text")
-# //plt.legend()
-# plt.savefig("success_ratio.pdf")
-# plt.executeSilently()
\ No newline at end of file
+def band_metrics(runData):
+    return [yDatName for yDatName in DYNAMIC_BAND_METRICS if yDatName in runData["yRuns"]]
+
+def add_confidence_bands(trialRuns, args):
+    # The dynamic figures shade these instead of ±std
+    with PROFILER.stage("statistics"):
+        for trial, run in trialRuns:
+            if is_dynamic(trial) and run in trial_data.get(trial, {}):
+                runData = trial_data[trial][run]
+                runData["yLower"], runData["yUpper"] = confidence_bands(runData, band_metrics(runData), args.confidence, args.resamples, args.seed)
+
+def add_quantiles(trialRuns, args):
+    # Written by the summary next to the mean and std
+    with PROFILER.stage("statistics"):
+        for trial, run in trialRuns:
+            if run in trial_data.get(trial, {}):
+                runData = trial_data[trial][run]
+                runData["quantiles"] = run_quantiles(runData, list(runData["y"]), args.quantiles)
+
+def report_significance(trialRuns, args):
+    """Test at every sample time whether our protocol differs from each other protocol of a dynamic trial."""
+    alpha = 1 - args.confidence
+    rows = []
+    with PROFILER.stage("statistics"):
+        for trial in sorted({trial for trial, run in trialRuns if is_dynamic(trial)}):
+            runs = [run for run in DYNAMIC_RUNS if run in trial_data.get(trial, {})]
+            for other in runs[1:]:
+                results = compare_runs(trial_data[trial][runs[0]], trial_data[trial][other], band_metrics(trial_data[trial][runs[0]]))
+                labels = [DYNAMIC_LABELS[DYNAMIC_RUNS.index(run)] for run in (runs[0], other)]
+                for yDatName, result in results.items():
+                    print(
+                        f"{trial} {yDatName}: {labels[0]} vs {labels[1]} differ at {np.sum(result.pWelch < alpha)} (Welch t) "
+                        f"and {np.sum(result.pMannWhitney < alpha)} (Mann-Whitney U) of {result.x.shape[0]} sample times, p < {alpha:g}"
+                    )
+                    for i in range(result.x.shape[0]):
+                        rows.append([trial, yDatName, runs[0], other] + [values[i] for values in result])
+
+    if args.tests_csv is not None:
+        with open(args.tests_csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["trial", "metric", "run", "otherRun", "x", "meanDifference", "t", "pWelch", "u", "pMannWhitney"])
+            writer.writerows(rows)
+
+def write_summary(targets, trialRuns, args):
+    # With --figure only the metrics of the selected figures, otherwise every metric of the runs
+    metrics = list(dict.fromkeys(yDatName for spec, trial in targets for yDatName in spec.metrics)) if args.figure else None
+    if args.summary_output is None:
+        WRITERS[args.summary](sys.stdout, trial_data, trialRuns, metrics)
+        return
+    with open(args.summary_output, "w", newline="") as f:
+        WRITERS[args.summary](f, trial_data, trialRuns, metrics)
+
+def quantile_levels(text):
+    levels = [float(level) for level in text.split(",")]
+    if not all(0 <= level <= 1 for level in levels):
+        raise argparse.ArgumentTypeError(f"quantiles must be between 0 and 1, not {text}")
+    return levels
+
+def sketch_accuracy(args):
+    # Streamed runs only keep quantile sketches when their quantiles are asked for
+    return SKETCH_ACCURACY if args.streaming and args.quantiles is not None else None
+
+def render_options(args):
+    # Only set options end up in the kwargs, so figures rendered without them keep their fingerprint
+    options = {}
+    if args.max_points is not None:
+        options["maxPoints"] = args.max_points
+    if args.rasterize:
+        options["rasterized"] = True
+    return options
+
+def try_figure_job(spec, trial, options):
+    # Trials of a running simulation may still miss run files
+    try:
+        return [figure_job(spec, trial, trial_data.get(trial, {}), options)]
+    except (KeyError, ValueError) as e:
+        print(f"Could not plot {figure_path(spec, trial)} yet: {e!r}")
+        return []
+
+def result_dirs(store=None):
+    return os.listdir(topDir) if store is None else store.result_dirs()
+
+def selected_targets(args, store=None):
+    with PROFILER.stage("scan"):
+        if args.sweep:
+            return sweep_targets(result_dirs(store), args.figure, args.trial)
+        return figure_targets(result_dirs(store), args.figure, args.trial)
+
+def target_runs(args, targets, store=None):
+    if args.sweep:
+        return sweep_runs(targets, result_dirs(store))
+    return required_runs(targets)
+
+def watch(cache, manifest, args):
+    stats = run_file_stats(required_runs(selected_targets(args)))
+    while True:
+        time.sleep(args.watch_interval)
+        # New directories of the dynamic trial may have appeared since the last poll
+        targets = selected_targets(args)
+        with PROFILER.stage("scan"):
+            newStats = run_file_stats(required_runs(targets))
+        changed = [key for key in newStats if newStats[key] != stats.get(key)]
+        removed = [key for key in stats if key not in newStats]
+        stats = newStats
+
+        for trial, run in removed:
+            del trial_data[trial][run]
+        load_runs(changed, cache, args.jobs, args.streaming)
+        if args.confidence is not None:
+            add_confidence_bands(changed, args)
+
+        touched = set(changed + removed)
+        jobs = []
+        for spec, trial in targets:
+            if any((trial, run) in touched for run in spec.runs):
+                jobs += try_figure_job(spec, trial, render_options(args))
+        for path in render_figures(jobs, args.jobs, manifest):
+            print(f"Re-rendered {path}")
+
+def list_figures(targets):
+    for spec, trial in targets:
+        print(f"{figure_path(spec, trial)}: {spec.name} from {', '.join(spec.runs)} ({', '.join(spec.metrics)})")
+
+def generate(parser, args, store=None):
+    try:
+        targets = selected_targets(args, store)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.list:
+        list_figures(targets)
+        return
+
+    # The runs of a store are parsed already, so only the manifest is used with it
+    cache = None if args.no_cache or store is not None else RunCache(args.cache_dir)
+    manifest = None if args.no_cache or args.summary is not None else FigureManifest(os.path.join(args.cache_dir, "figures.json"))
+
+    # Only the run files the selected figures read are parsed, missing ones are reported by figure_job
+    with PROFILER.stage("scan"):
+        if store is None:
+            trialRuns = list(run_file_stats(target_runs(args, targets)))
+        else:
+            storedRuns = set(store.runs())
+            trialRuns = [key for key in target_runs(args, targets, store) if key in storedRuns]
+    load_runs(trialRuns, cache, args.jobs, args.streaming, store, sketch_accuracy(args))
+    if args.confidence is not None:
+        add_confidence_bands(trialRuns, args)
+        report_significance(trialRuns, args)
+    if args.quantiles is not None:
+        add_quantiles(trialRuns, args)
+
+    if args.summary is not None:
+        write_summary(targets, trialRuns, args)
+        return
+
+    options = render_options(args)
+    if args.sweep:
+        # Every Gini coefficient directory is ingested once and stacked into one array per trial
+        jobs = sweep_jobs(targets, list(trial_data), trial_data, options)
+    else:
+        jobs = []
+        for spec, trial in targets:
+            jobs += try_figure_job(spec, trial, options) if args.watch else [figure_job(spec, trial, trial_data.get(trial, {}), options)]
+    rendered = render_figures(jobs, args.jobs, manifest)
+    print(f"Rendered {len(rendered)} figures, {len(jobs) - len(rendered)} were unchanged")
+
+    if args.watch:
+        watch(cache, manifest, args)
+
+def main():
+    global topDir
+    parser = argparse.ArgumentParser(description="Generate the thesis figures from app/output_files")
+    parser.add_argument("--figure", action="append", metavar="NAME", help="only render this figure, can be repeated, see --list")
+    parser.add_argument("--trial", action="append", metavar="TRIAL", help="only render the figures of this trial (or result directory), can be repeated")
+    parser.add_argument("--list", action="store_true", help="list the selected figures with the run files and metrics they read, without rendering")
+    parser.add_argument("--no-cache", action="store_true", help="always parse the run files from text and re-render every figure")
+    parser.add_argument("--cache-dir", default="app/plot_cache", help="directory of the parsed results cache and the manifest of rendered figures")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of worker processes parsing run files and rendering figures, 1 works serially")
+    parser.add_argument("--streaming", action="store_true", help="fold every block into running mean/std accumulators instead of keeping all samples in memory")
+    parser.add_argument("--summary", nargs="?", const="text", choices=sorted(WRITERS), help="write the aggregated mean and std of the selected runs as a text table (the default), CSV or JSON instead of rendering, without importing matplotlib")
+    parser.add_argument("--summary-output", metavar="PATH", help="write the --summary to this file instead of stdout")
+    parser.add_argument("--quantiles", type=quantile_levels, metavar="Q,...", help="also write these quantiles between seeds (e.g. 0.05,0.5,0.95) of every metric per x in the --summary, from quantile sketches with --streaming")
+    parser.add_argument("--confidence", type=float, metavar="LEVEL", help="shade bootstrap confidence intervals of the mean at this level (e.g. 0.95) instead of ±std in the dynamic figures, and test at every sample time whether the protocols differ")
+    parser.add_argument("--resamples", type=int, default=1000, help="number of bootstrap resamples of --confidence")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the bootstrap resampling, the same seed gives the same intervals")
+    parser.add_argument("--tests-csv", metavar="PATH", help="with --confidence, write the Welch t and Mann-Whitney U test of every sample time to this CSV file")
+    parser.add_argument("--sweep", action="store_true", help="render the figures comparing all Gini coefficients of the dynamic trial instead of one set of figures per directory")
+    parser.add_argument("--results-dir", default=topDir, metavar="DIR", help="read the run files from this directory, text or binary (see plotting.convert), instead of app/output_files")
+    parser.add_argument("--store", metavar="PATH", help="read the runs from this SQLite results store (see plotting.store) instead of app/output_files")
+    parser.add_argument("--watch", action="store_true", help="keep polling app/output_files and re-render the trials whose run files changed")
+    parser.add_argument("--watch-interval", type=float, default=30., help="seconds between two polls in --watch mode")
+    parser.add_argument("--max-points", type=int, metavar="N", help="decimate every time series of the dynamic figures to about N points (LTTB lines, min/max envelope bands)")
+    parser.add_argument("--rasterize", action="store_true", help="rasterize the lines and bands of the dynamic figures inside the PDF")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="print debug output such as the x values of every run")
+    parser.add_argument("--profile", action="store_true", help="time every pipeline stage, sample the peak RSS after it and print a summary at the end")
+    parser.add_argument("--profile-memory", action="store_true", help="like --profile, but also trace the peak memory of every stage with tracemalloc, which makes the run several times slower")
+    parser.add_argument("--profile-json", metavar="PATH", help="with --profile, also write the stage, run file and figure statistics to this JSON file")
+    parser.add_argument("--cprofile", metavar="PATH", help="write a cProfile dump of the main process to this file")
+    args = parser.parse_args()
+    if args.confidence is not None and args.streaming:
+        parser.error("--confidence needs the samples of every seed, which --streaming does not keep")
+    if args.confidence is not None and not 0 < args.confidence < 1:
+        parser.error("--confidence must be between 0 and 1")
+    if args.quantiles is not None and args.summary is None:
+        parser.error("--quantiles is only written by --summary")
+    if args.summary is not None and args.watch:
+        parser.error("--summary cannot be combined with --watch")
+    if args.sweep and args.watch:
+        parser.error("--sweep cannot be combined with --watch")
+    if args.store is not None and (args.watch or args.streaming):
+        parser.error("--store cannot be combined with --watch or --streaming")
+    if args.store is not None and not os.path.exists(args.store):
+        parser.error(f"{args.store} does not exist, create it with python -m plotting.store")
+
+    topDir = args.results_dir
+    set_verbosity(args.verbose)
+    args.profile = args.profile or args.profile_memory
+    if args.profile:
+        PROFILER.enable(args.profile_memory)
+    profiler = cProfile.Profile() if args.cprofile else None
+    if profiler is not None:
+        profiler.enable()
+
+    store = None if args.store is None else ResultStore(args.store)
+    start = time.perf_counter()
+    try:
+        generate(parser, args, store)
+    finally:
+        if store is not None:
+            store.close()
+        # Also reached when --watch is stopped with Ctrl-C
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        if args.profile:
+            print(PROFILER.summary())
+            print(f"Wall time {time.perf_counter() - start:.3f}s, stage times of worker processes are summed")
+            if args.profile_json:
+                PROFILER.to_json(args.profile_json)
+
+if __name__ == "__main__":
+    main()
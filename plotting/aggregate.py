@@ -0,0 +1,73 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Per-x statistics of one metric, `quantiles` maps every requested quantile to its array
+MetricStats = namedtuple("MetricStats", ["mean", "std", "min", "max", "quantiles"])
+
+
+def _sort_within_groups(grouped, starts, count):
+    if np.all(count == count[0]):
+        # Every x has as many samples, the usual case, so the groups are the rows of a matrix
+        return np.sort(grouped.reshape(count.shape[0], count[0]), axis=1).ravel()
+
+    # Rank the values globally and sort on (group, rank) as a single integer key
+    rank = np.empty(grouped.shape[0], dtype=np.int64)
+    rank[np.argsort(grouped, kind="stable")] = np.arange(grouped.shape[0])
+    group = np.repeat(np.arange(count.shape[0], dtype=np.int64), count)
+    return grouped[np.argsort(group * grouped.shape[0] + rank)]
+
+
+def group_stats(xRuns, yRuns, quantiles=()):
+    """Group the samples of every metric in `yRuns` by their x value in `xRuns`.
+
+    The samples are grouped with a single stable sort of `xRuns`, after which
+    every statistic is one `np.add.reduceat` style pass over all groups at
+    once. Quantiles interpolate linearly like `np.quantile` and need the
+    values sorted within every group, so they are only computed when asked for.
+
+    Returns (x, count, stats) with the sorted unique x values, the number of
+    samples per x and a MetricStats per metric.
+    """
+    stats = {}
+    if len(xRuns) == 0:
+        return np.unique(xRuns), np.empty(0, dtype=np.intp), stats
+
+    order = np.argsort(xRuns, kind="stable")
+    sortedX = xRuns[order]
+    starts = np.flatnonzero(np.concatenate(([True], sortedX[1:] != sortedX[:-1])))
+    count = np.diff(np.append(starts, sortedX.shape[0]))
+    x = sortedX[starts]
+    ends = starts + count - 1
+
+    for yDatName, values in yRuns.items():
+        grouped = values[order]
+        mean = np.add.reduceat(grouped, starts) / count
+        deviation = grouped - np.repeat(mean, count)
+        std = np.sqrt(np.add.reduceat(deviation * deviation, starts) / count)
+
+        quantileValues = {}
+        if len(quantiles) > 0:
+            grouped = _sort_within_groups(grouped, starts, count)
+            minimum = grouped[starts]
+            maximum = grouped[ends]
+            for q in quantiles:
+                position = starts + q * (count - 1)
+                lower = np.floor(position).astype(np.intp)
+                upper = np.ceil(position).astype(np.intp)
+                quantileValues[q] = grouped[lower] + (grouped[upper] - grouped[lower]) * (position - lower)
+        else:
+            minimum = np.minimum.reduceat(grouped, starts)
+            maximum = np.maximum.reduceat(grouped, starts)
+
+        stats[yDatName] = MetricStats(mean, std, minimum, maximum, quantileValues)
+
+    return x, count, stats
+
+
+def aggregate_run(xRuns, yRuns):
+    """Average every metric over the runs that share the same x value."""
+    x, _, stats = group_stats(xRuns, yRuns)
+    y = {yDatName: metricStats.mean for yDatName, metricStats in stats.items()}
+    yErr = {yDatName: metricStats.std for yDatName, metricStats in stats.items()}
+    return x, y, yErr
@@ -0,0 +1,161 @@
+"""Binary alternative to the `metric:v1,v2,...` text lines of GraphHolder.saveData.
+
+A binary run file is a sequence of segments, each holding one or more
+settings blocks of the run:
+
+    magic  b"RBIN"
+    uint32 length of the header, little-endian
+    header JSON, padded with spaces to a multiple of ALIGNMENT bytes
+    arrays, every one starting at a multiple of ALIGNMENT bytes
+
+The header describes the segment: its trial, number of blocks, the
+settings strings of the blocks (null for the dynamic trials, whose
+settings line holds the sample times), the total length of the segment in
+bytes and every array with its name, dtype, length and byte offset from
+the start of the segment. The dynamic trials store the sample times of
+all blocks back to back as "x" with the number of samples of every block
+in "lengths", metrics are stored as "metric/<name>". A simulation appends
+a segment per block like it appends text blocks, plotting.convert writes
+one segment for all blocks of a text file.
+
+Arrays are read as np.frombuffer views of a read-only memory map of the
+file, so reading them does not copy or parse anything. The statistics are
+computed in float64, so plotting.parsing.decode_run does copy int32 and
+float32 columns once, while aligning them for the dynamic trials.
+"""
+import json
+import mmap
+import os
+from collections import namedtuple
+
+import numpy as np
+
+MAGIC = b"RBIN"
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+PREFIX_BYTES = len(MAGIC) + 4
+
+# One segment of a binary run file. `settings` is the list of the settings
+# strings of its blocks, or None for the dynamic trials, which have their
+# sample times in `x` and the number of samples per block in `lengths`.
+# `metrics` maps every metric to its array. `start` and `end` are the byte
+# offsets of the segment in its file, `error` says why it cannot be used,
+# None when it can.
+Segment = namedtuple("Segment", ["trial", "blocks", "settings", "x", "lengths", "metrics", "start", "end", "error"])
+
+
+def _padded(size):
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def is_binary(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_segment(f, trial, settings, x, lengths, metrics):
+    """Append one segment holding the blocks of `settings` (or `lengths` for the dynamic trials) to binary file `f`.
+
+    Every array is written with the dtype it has, converted to little-endian.
+    """
+    arrays = {} if x is None else {"x": x, "lengths": lengths}
+    arrays.update({f"metric/{yDatName}": values for yDatName, values in metrics.items()})
+    arrays = {name: np.ascontiguousarray(values, dtype=np.asarray(values).dtype.newbyteorder("<")) for name, values in arrays.items()}
+
+    def header(dataStart):
+        descriptions = []
+        offset = dataStart
+        for name, values in arrays.items():
+            descriptions.append({"name": name, "dtype": values.dtype.str, "length": int(values.shape[0]), "offset": offset})
+            offset = _padded(offset + values.nbytes)
+        return {
+            "version": FORMAT_VERSION,
+            "trial": trial,
+            "blocks": len(settings) if x is None else int(np.asarray(lengths).shape[0]),
+            "settings": settings if x is None else None,
+            "bytes": offset,
+            "arrays": descriptions
+        }
+
+    # The offsets depend on the length of the header and the other way around, so grow it until it holds
+    headerBytes = 0
+    while True:
+        encoded = json.dumps(header(PREFIX_BYTES + headerBytes)).encode()
+        if len(encoded) <= headerBytes:
+            break
+        headerBytes = _padded(PREFIX_BYTES + len(encoded)) - PREFIX_BYTES
+
+    f.write(MAGIC)
+    f.write(np.uint32(headerBytes).astype("<u4").tobytes())
+    f.write(encoded.ljust(headerBytes))
+    position = PREFIX_BYTES + headerBytes
+    for values in arrays.values():
+        f.write(values.tobytes())
+        position += values.nbytes
+        f.write(b"\0" * (_padded(position) - position))
+        position = _padded(position)
+
+
+def _segment(buffer, start):
+    # The Segment at byte `start` of `buffer`, None when it does not end within `buffer` yet.
+    # Raises ValueError when its header is not a valid one.
+    headerBytes = int(np.frombuffer(buffer, dtype="<u4", count=1, offset=start + len(MAGIC))[0])
+    if start + PREFIX_BYTES + headerBytes > len(buffer):
+        return None
+    if buffer.find(MAGIC, start + 1, start + PREFIX_BYTES + headerBytes) >= 0:
+        raise ValueError(f"segment at byte {start} was cut off by the next one")
+    header = json.loads(bytes(buffer[start + PREFIX_BYTES:start + PREFIX_BYTES + headerBytes]))
+    if header["version"] != FORMAT_VERSION:
+        raise ValueError(f"format version {header['version']} instead of {FORMAT_VERSION}")
+    if start + header["bytes"] > len(buffer):
+        return None
+
+    arrays = {}
+    for description in header["arrays"]:
+        dtype = np.dtype(description["dtype"])
+        if description["offset"] + description["length"] * dtype.itemsize > header["bytes"]:
+            raise ValueError(f"{description['name']} does not fit in the segment")
+        arrays[description["name"]] = np.frombuffer(buffer, dtype=dtype, count=description["length"], offset=start + description["offset"])
+
+    metrics = {name[len("metric/"):]: values for name, values in arrays.items() if name.startswith("metric/")}
+    return Segment(
+        header["trial"], header["blocks"], header["settings"], arrays.get("x"), arrays.get("lengths"), metrics,
+        start, start + header["bytes"], None
+    )
+
+
+def read_segments(path, offset=0):
+    """Yield every Segment of binary run file `path` from byte `offset` on.
+
+    A segment whose header does not parse is yielded with its `error` set,
+    up to the next segment found after it. A last segment that is not
+    completely written yet is left for the next read.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= offset:
+            return
+        # The memory map stays valid after the file is closed, for as long as a view of it exists
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    position = offset
+    while position + PREFIX_BYTES <= size:
+        try:
+            if buffer[position:position + len(MAGIC)] != MAGIC:
+                raise ValueError(f"no segment starts at byte {position}")
+            segment = _segment(buffer, position)
+            error = f"segment at byte {position} was cut off by the next one"
+        except (ValueError, KeyError, TypeError) as e:
+            segment = None
+            error = str(e)
+
+        if segment is None:
+            # Segments are only ever appended, so only the last one can still be being written
+            following = buffer.find(MAGIC, position + 1)
+            if following < 0:
+                return
+            yield Segment(None, 0, None, None, None, {}, position, following, error)
+            position = following
+            continue
+        yield segment
+        position = segment.end
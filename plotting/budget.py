@@ -0,0 +1,184 @@
+"""Advise how many more seeds every setting of a (partial) app/output_files tree needs.
+
+    python -m plotting.budget app/output_files --relative-width 0.05 --output app/seed_plan.json
+
+groups the blocks of every run file by the setting they are plotted
+against, like the aggregation of generate_plots.py, estimates the bootstrap
+confidence interval of the mean of every (setting, metric) cell and writes
+a JSON plan with the cells that converged, those that did not, and how many
+seeds every setting still needs.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+from plotting.cache import RunCache
+from plotting.ingest import ingest_run
+from plotting.registry import FIGURES, trial_matches
+from plotting.settings import NODE_TYPES, is_dynamic, x_field
+from plotting.statistics import bootstrap_ci, sample_matrix
+
+# Below this many seeds the spread of a cell is not worth estimating
+MIN_SEEDS = 3
+
+
+def plotted_metrics(resultDir, run):
+    """The metrics the figures of the registry read from a run file, in registry order."""
+    return list(dict.fromkeys(
+        metric for spec in FIGURES if trial_matches(spec.trial, resultDir) and run in spec.runs for metric in spec.metrics
+    ))
+
+
+def _cell_settings(runData, resultDir, run, x):
+    # The decoded settings of the first block of the group, the other blocks of a group only differ in their seed
+    if is_dynamic(resultDir):
+        return {"time": float(x)}
+    settings = runData.get("settings")
+    field = x_field(resultDir, run)
+    if settings is None or field is None:
+        return {}
+    record = settings[np.flatnonzero(runData["xRuns"] == x)[0]]
+    return {name: NODE_TYPES[record[name]] if name == "nodeType" else record[name].item() for name in settings.dtype.names}
+
+
+def seeds_needed(nOfSeeds, width, targetWidth, minSeeds=MIN_SEEDS):
+    """Seeds a cell needs for a confidence interval of at most `targetWidth`, None when it cannot get there.
+
+    The width of the interval of a mean shrinks with the square root of the
+    number of seeds.
+    """
+    if nOfSeeds < minSeeds:
+        return minSeeds if targetWidth > 0 or width == 0 else None
+    if width <= targetWidth:
+        return nOfSeeds
+    if targetWidth <= 0:
+        return None
+    return max(minSeeds, math.ceil(nOfSeeds * (width / targetWidth) ** 2))
+
+
+def run_cells(runData, resultDir, run, metrics, confidence=0.95, relativeWidth=0.05, absoluteWidth=0., nOfResamples=1000, seed=0, minSeeds=MIN_SEEDS):
+    """Return one plan cell (a dict) per (setting, metric) of an ingested run file.
+
+    The groups are the x values the figures plot, one block per seed. Of a
+    dynamic run only the last sample time every seed reached is a cell, as
+    earlier times have at least as many samples. A cell converged when its
+    interval is at most `relativeWidth` times its mean, or `absoluteWidth`.
+    """
+    x, count, samples = sample_matrix(runData["xRuns"], runData["yRuns"], metrics)
+    rows = np.arange(x.shape[0])
+    if is_dynamic(resultDir) and x.shape[0] > 0:
+        rows = rows[count == count.max()][-1:]
+    # All metrics of the run at once, every metric takes len(x) rows
+    rows = (rows + x.shape[0] * np.arange(len(metrics))[:, None]).ravel()
+    lower, upper = bootstrap_ci(samples[rows], np.tile(count, len(metrics))[rows], confidence, nOfResamples, seed)
+
+    cells = []
+    for i, row in enumerate(rows.tolist()):
+        metric, xIndex = metrics[row // x.shape[0]], row % x.shape[0]
+        nOfSeeds = int(count[xIndex])
+        values = samples[row, :nOfSeeds]
+        mean = float(np.mean(values))
+        width = float(upper[i] - lower[i])
+        targetWidth = max(relativeWidth * abs(mean), absoluteWidth)
+        needed = seeds_needed(nOfSeeds, width, targetWidth, minSeeds)
+        cells.append({
+            "trial": resultDir,
+            "run": run,
+            "x": float(x[xIndex]),
+            "settings": _cell_settings(runData, resultDir, run, x[xIndex]),
+            "metric": metric,
+            "seeds": nOfSeeds,
+            "mean": mean,
+            "std": float(np.std(values)),
+            "ciLower": float(lower[i]),
+            "ciUpper": float(upper[i]),
+            "ciWidth": width,
+            "targetWidth": targetWidth,
+            "converged": needed is not None and needed <= nOfSeeds,
+            "seedsNeeded": needed,
+            "additionalSeeds": None if needed is None else max(0, needed - nOfSeeds)
+        })
+    return cells
+
+
+def seed_plan(cells):
+    """Collect the cells into a plan with the seeds every setting still needs, the largest need of its metrics."""
+    settings = {}
+    for cell in cells:
+        key = (cell["trial"], cell["run"], cell["x"])
+        setting = settings.setdefault(key, {
+            "trial": cell["trial"],
+            "run": cell["run"],
+            "x": cell["x"],
+            "settings": cell["settings"],
+            "seeds": cell["seeds"],
+            "additionalSeeds": 0,
+            "unconvergedMetrics": []
+        })
+        if not cell["converged"]:
+            setting["unconvergedMetrics"].append(cell["metric"])
+            # A cell that can never reach its target keeps the setting at None, it needs a looser target instead
+            if cell["additionalSeeds"] is None or setting["additionalSeeds"] is None:
+                setting["additionalSeeds"] = None
+            else:
+                setting["additionalSeeds"] = max(setting["additionalSeeds"], cell["additionalSeeds"])
+
+    return {
+        "cells": cells,
+        "settings": [setting for setting in settings.values() if len(setting["unconvergedMetrics"]) > 0],
+        "converged": [setting for setting in settings.values() if len(setting["unconvergedMetrics"]) == 0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate which settings of an app/output_files tree need more seeds")
+    parser.add_argument("topDir", nargs="?", default="app/output_files", help="directory holding the trial directories")
+    parser.add_argument("--trial", action="append", metavar="TRIAL", help="only advise on this trial (or result directory), can be repeated")
+    parser.add_argument("--metric", action="append", metavar="METRIC", help="advise on this metric instead of the ones the figures plot, can be repeated")
+    parser.add_argument("--confidence", type=float, default=0.95, help="level of the bootstrap confidence intervals")
+    parser.add_argument("--relative-width", type=float, default=0.05, help="a cell converged when its interval is at most this fraction of its mean")
+    parser.add_argument("--absolute-width", type=float, default=0., help="or when its interval is at most this wide")
+    parser.add_argument("--min-seeds", type=int, default=MIN_SEEDS, help="seeds every cell needs before its interval is trusted")
+    parser.add_argument("--resamples", type=int, default=1000, help="number of bootstrap resamples")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the bootstrap resampling")
+    parser.add_argument("--cache-dir", default="app/plot_cache", help="parsed results cache shared with generate_plots.py")
+    parser.add_argument("--no-cache", action="store_true", help="parse the run files from text")
+    parser.add_argument("--output", default="app/seed_plan.json", help="JSON file to write the plan to, - for stdout")
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else RunCache(args.cache_dir)
+    cells = []
+    for resultDir in sorted(os.listdir(args.topDir)):
+        if args.trial and not any(trial_matches(pattern, resultDir) for pattern in args.trial):
+            continue
+        for run in sorted(os.listdir(os.path.join(args.topDir, resultDir))):
+            runData = ingest_run(os.path.join(args.topDir, resultDir, run), resultDir, run, cache)
+            metrics = [metric for metric in args.metric or plotted_metrics(resultDir, run) or list(runData["yRuns"]) if metric in runData["yRuns"]]
+            if len(metrics) > 0:
+                cells += run_cells(
+                    runData, resultDir, run, metrics,
+                    args.confidence, args.relative_width, args.absolute_width, args.resamples, args.seed, args.min_seeds
+                )
+
+    plan = dict(seed_plan(cells), confidence=args.confidence, relativeWidth=args.relative_width, absoluteWidth=args.absolute_width)
+    if args.output == "-":
+        print(json.dumps(plan, indent=2))
+    else:
+        with open(args.output, "w") as f:
+            json.dump(plan, f, indent=2)
+
+    nOfConverged = sum(cell["converged"] for cell in cells)
+    additional = sum(setting["additionalSeeds"] or 0 for setting in plan["settings"])
+    summary = f"{nOfConverged} of {len(cells)} cells converged, {len(plan['settings'])} settings need {additional} more seeds"
+    if any(setting["additionalSeeds"] is None for setting in plan["settings"]):
+        summary += ", some cells cannot reach their target width, see --absolute-width"
+    # Keep stdout valid JSON with --output -
+    print(summary, file=sys.stderr if args.output == "-" else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+from plotting.online import OnlineStats
+
+# Bump whenever parsing or aggregation changes what ends up in a cache entry
+CACHE_VERSION = 6
+
+ARRAY_KEYS = ("xRuns", "x")
+METRIC_KEYS = ("yRuns", "y", "yErr")
+
+
+def prefix_hash(path, offset, window=1 << 20):
+    """Hash the first and last `window` bytes of the first `offset` bytes of `path`.
+
+    Result files are only ever appended to or recreated, so the head and tail
+    of the consumed prefix identify it without re-reading gigabytes of samples
+    every time a live simulation appends a block.
+    """
+    digest = hashlib.sha256(str(offset).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(min(window, offset)))
+        if offset > window:
+            f.seek(max(window, offset - window))
+            digest.update(f.read(offset - max(window, offset - window)))
+    return digest.hexdigest()
+
+
+def _to_storable(values):
+    # Object arrays of setting strings would need pickling, store them as unicode instead
+    if values.dtype == object:
+        return values.astype(str)
+    return values
+
+
+def _from_storable(values):
+    if values.dtype.kind == "U":
+        return values.astype(object)
+    return values
+
+
+class RunCache:
+    """On-disk .npz cache of the parsed and aggregated data of every run file.
+
+    Entries of runs ingested in streaming mode hold their OnlineStats
+    accumulators instead of the raw samples. Next to the arrays every entry
+    records the size and mtime of its run file, the byte offset up to which
+    the file was consumed, the number of blocks read and a hash of the
+    consumed prefix (see `prefix_hash`). Entries are keyed by the path of
+    their run file as well, so the same run read from another results
+    directory (e.g. its binary conversion) has an entry of its own. Storing
+    an entry removes the stale entries of its run, see `_is_stale`.
+    """
+
+    def __init__(self, cacheDir):
+        self.cacheDir = cacheDir
+
+    def entry_path(self, path, trial, run):
+        source = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+        return os.path.join(self.cacheDir, trial, f"{run}.{source}.npz")
+
+    @staticmethod
+    def _is_stale(entryPath):
+        # An entry of an older CACHE_VERSION, or of a run file that no longer exists
+        try:
+            with np.load(entryPath) as entry:
+                meta = json.loads(str(entry["meta"]))
+        except (OSError, ValueError, KeyError):
+            return True
+        return meta.get("version") != CACHE_VERSION or not os.path.exists(meta.get("path", ""))
+
+    def _remove_stale(self, path, trial, run):
+        entryPath = self.entry_path(path, trial, run)
+        # The entries of `run` under any path, including the {run}.npz of versions before paths were part of the key
+        pattern = re.compile(re.escape(run) + r"(\.[0-9a-f]{16})?\.npz")
+        for name in os.listdir(os.path.dirname(entryPath)):
+            otherPath = os.path.join(os.path.dirname(entryPath), name)
+            if otherPath != entryPath and pattern.fullmatch(name) is not None and self._is_stale(otherPath):
+                try:
+                    os.remove(otherPath)
+                except FileNotFoundError:
+                    # Removed by another process storing the same run
+                    pass
+
+    def lookup(self, path, trial, run):
+        """Return (runData, meta) of the entry of run file `path`, or (None, None) if there is no usable entry."""
+        entryPath = self.entry_path(path, trial, run)
+        if not os.path.exists(entryPath):
+            return None, None
+
+        try:
+            with np.load(entryPath) as entry:
+                meta = json.loads(str(entry["meta"]))
+                if meta["version"] != CACHE_VERSION:
+                    return None, None
+
+                runData = {key: _from_storable(entry[key]) for key in ARRAY_KEYS}
+                for key in METRIC_KEYS:
+                    runData[key] = {yDatName: entry[f"{key}/{yDatName}"] for yDatName in meta["metrics"][key]}
+                if "settings" in entry.files:
+                    runData["settings"] = entry["settings"]
+                if meta.get("streaming", False):
+                    runData["stats"] = OnlineStats.from_arrays({key[len("stats/"):]: _from_storable(entry[key]) for key in entry.files if key.startswith("stats/")})
+        except (OSError, ValueError, KeyError):
+            # Unreadable or truncated entry, treat it as a miss
+            return None, None
+
+        return runData, meta
+
+    def store(self, path, trial, run, runData, meta):
+        meta = dict(meta, version=CACHE_VERSION, path=os.path.abspath(path), metrics={key: list(runData[key]) for key in METRIC_KEYS})
+        arrays = {"meta": np.array(json.dumps(meta))}
+        for key in ARRAY_KEYS:
+            arrays[key] = _to_storable(np.asarray(runData[key]))
+        for key in METRIC_KEYS:
+            for yDatName, values in runData[key].items():
+                arrays[f"{key}/{yDatName}"] = np.asarray(values)
+        if "settings" in runData:
+            arrays["settings"] = runData["settings"]
+        if "stats" in runData:
+            for key, values in runData["stats"].to_arrays().items():
+                arrays[f"stats/{key}"] = _to_storable(np.asarray(values))
+
+        entryPath = self.entry_path(path, trial, run)
+        os.makedirs(os.path.dirname(entryPath), exist_ok=True)
+        tmpPath = f"{entryPath}.{os.getpid()}.tmp"
+        with open(tmpPath, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmpPath, entryPath)
+        self._remove_stale(path, trial, run)
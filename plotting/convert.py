@@ -0,0 +1,79 @@
+"""Convert an app/output_files tree of text run files into the binary format of plotting.binary.
+
+    python -m plotting.convert app/output_files app/output_binary
+
+writes every run file that changed since its last conversion to the same
+path under the output directory, as a single segment. generate_plots.py
+--results-dir app/output_binary then reads the values without parsing them.
+"""
+import argparse
+import os
+
+import numpy as np
+
+from plotting.binary import is_binary, write_segment
+from plotting.parsing import describe_skipped, read_run
+from plotting.settings import is_dynamic
+
+
+def storage_dtype(values, floatDtype=np.float32):
+    """int32 for whole numbers that fit, like the Ints of the simulation, int64 for larger ones such as its Long sample times and `floatDtype` otherwise."""
+    if values.shape[0] > 0 and np.all(np.isfinite(values)) and np.all(values == np.round(values)):
+        if values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max:
+            return np.int32
+        if values.min() >= np.iinfo(np.int64).min and values.max() <= np.iinfo(np.int64).max:
+            return np.int64
+    return floatDtype
+
+
+def convert_run(path, outputPath, trial, floatDtype=np.float32):
+    """Write the complete blocks of text run file `path` to `outputPath` as a binary run file.
+
+    Corrupt blocks are left out and printed, see plotting.parsing.complete_blocks.
+    """
+    raw = read_run(path, trial)
+    for line in describe_skipped(path, raw.skipped):
+        print(line)
+
+    metrics = {yDatName: values.astype(storage_dtype(values, floatDtype)) for yDatName, values in raw.yRuns.items()}
+    x = lengths = None
+    if is_dynamic(trial):
+        x = raw.xRuns.astype(storage_dtype(raw.xRuns, np.float64))
+        lengths = np.asarray(raw.lengths, dtype=np.int32)
+
+    os.makedirs(os.path.dirname(outputPath), exist_ok=True)
+    tmpPath = f"{outputPath}.{os.getpid()}.tmp"
+    with open(tmpPath, "wb") as f:
+        write_segment(f, trial, raw.settings, x, lengths, metrics)
+    os.replace(tmpPath, outputPath)
+
+
+def convert_tree(topDir, outputDir, floatDtype=np.float32):
+    """Convert every text run file of `topDir` that is newer than its binary file in `outputDir`, returns how many were."""
+    nOfConverted = 0
+    for resultDir in sorted(os.listdir(topDir)):
+        for run in sorted(os.listdir(os.path.join(topDir, resultDir))):
+            path = os.path.join(topDir, resultDir, run)
+            outputPath = os.path.join(outputDir, resultDir, run)
+            if is_binary(path):
+                continue
+            if os.path.exists(outputPath) and os.stat(outputPath).st_mtime_ns >= os.stat(path).st_mtime_ns:
+                continue
+            convert_run(path, outputPath, resultDir, floatDtype)
+            nOfConverted += 1
+    return nOfConverted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the text run files of an app/output_files tree into binary run files")
+    parser.add_argument("topDir", nargs="?", default="app/output_files", help="directory holding the trial directories")
+    parser.add_argument("outputDir", nargs="?", default="app/output_binary", help="directory to write the binary tree to")
+    parser.add_argument("--float64", action="store_true", help="keep fractional values as float64 instead of the float32 the simulation computed them in")
+    args = parser.parse_args()
+
+    nOfConverted = convert_tree(args.topDir, args.outputDir, np.float64 if args.float64 else np.float32)
+    print(f"Converted {nOfConverted} run files into {args.outputDir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def _bucket_edges(n, nOfBuckets):
+    return np.unique(np.linspace(0, n, nOfBuckets + 1).astype(np.intp))
+
+
+def lttb_indices(x, y, nOfPoints):
+    """Indices of the `nOfPoints` samples that Largest-Triangle-Three-Buckets keeps of the line (x, y).
+
+    The first and last sample are always kept. The samples in between are
+    split into nOfPoints - 2 buckets and of every bucket the sample forming
+    the largest triangle with the sample kept of the previous bucket and the
+    mean of the next bucket is kept, which preserves peaks and trends far
+    better than taking every k-th sample. The buckets are those of the
+    reference implementation (Steinarsson, 2013), including where its
+    floating point bucket width rounds a boundary down.
+    """
+    n = x.shape[0]
+    if nOfPoints >= n or nOfPoints < 3:
+        return np.arange(n)
+
+    # Bucket i spans edges[i]:edges[i + 1] of the samples between the first and the last one
+    every = (n - 2) / (nOfPoints - 2)
+    edges = np.minimum(np.floor(np.arange(nOfPoints) * every).astype(np.intp) + 1, n)
+    starts, ends = edges[:-2], edges[1:-1]
+    # The mean of the bucket after bucket i, the last bucket is followed by the rest of the line
+    meanX = np.add.reduceat(x, edges[1:-1]) / np.diff(edges[1:])
+    meanY = np.add.reduceat(y, edges[1:-1]) / np.diff(edges[1:])
+
+    kept = np.empty(nOfPoints, dtype=np.intp)
+    kept[0] = 0
+    kept[-1] = n - 1
+    a = 0
+    for i in range(starts.shape[0]):
+        bucketX = x[starts[i]:ends[i]]
+        bucketY = y[starts[i]:ends[i]]
+        # Twice the area of the triangle (a, candidate, mean of the next bucket)
+        area = np.abs((x[a] - meanX[i]) * (bucketY - y[a]) - (x[a] - bucketX) * (meanY[i] - y[a]))
+        a = starts[i] + np.argmax(area)
+        kept[i + 1] = a
+    return kept
+
+
+def envelope(x, lower, upper, nOfBuckets):
+    """Reduce the band between `lower` and `upper` to the min/max of `nOfBuckets` buckets of samples.
+
+    Returns (x, lower, upper) to be drawn with `fill_between(..., step="post")`:
+    every bucket starts at the x of its first sample, and a last point at
+    x[-1] closes the band, so the envelope covers every original sample.
+    """
+    starts = _bucket_edges(x.shape[0], nOfBuckets)[:-1]
+    lowerMin = np.minimum.reduceat(lower, starts)
+    upperMax = np.maximum.reduceat(upper, starts)
+    return np.append(x[starts], x[-1]), np.append(lowerMin, lowerMin[-1]), np.append(upperMax, upperMax[-1])
@@ -0,0 +1,258 @@
+import numpy as np
+
+from plotting.downsample import envelope, lttb_indices
+from plotting.instrument import PROFILER, debug
+
+# Every function here renders one figure from already aggregated arrays to
+# `path` and closes it again, so figures can be rendered in worker processes.
+# matplotlib takes about half a second to import, so it is only imported by
+# the functions that draw, the registry and --summary run without it.
+
+
+def _save(fig, path):
+    import matplotlib.pyplot as plt
+    with PROFILER.stage("savefig"):
+        fig.savefig(path)
+    plt.close(fig)
+
+
+def line_figure(path, sorted_data, labels, xlabel, ylabel, xlim, legendLoc=None, percentX=False):
+    """Line plot with a ±std band for every (y, yErr) row pair following the x row of `sorted_data`."""
+    import matplotlib.pyplot as plt
+    fig = plt.figure()
+    ax1 = fig.subplots(1)
+
+    for i in range(1, sorted_data.shape[0], 2):
+        ax1.plot(
+            sorted_data[0,:],
+            sorted_data[i,:],
+            marker='o',
+            label=labels[i // 2]
+        )
+        ax1.fill_between(
+            sorted_data[0,:],
+            sorted_data[i,:] - sorted_data[i+1,:],
+            sorted_data[i,:] + sorted_data[i+1,:],
+            alpha=0.5
+        )
+
+    ax1.set_xlim(*xlim)
+    ax1.set_ylim(0)
+    ax1.set_ylabel(ylabel)
+    ax1.set_xlabel(xlabel)
+    if percentX:
+        import matplotlib.ticker as mtick
+        ax1.xaxis.set_major_formatter(mtick.PercentFormatter())
+
+    ax1.grid()
+
+    if legendLoc is None:
+        ax1.legend()
+    else:
+        ax1.legend(loc=legendLoc)
+
+    _save(fig, path)
+
+
+def bar_comparison_figure(path, y, yErr, graphLabels, protoLabels, ylabel, width=0.35):
+    """Bar chart of two protocols (columns of `y`) on every graph (rows of `y`)."""
+    import matplotlib.pyplot as plt
+    x = np.arange(len(graphLabels))
+
+    fig = plt.figure()
+    ax1 = fig.subplots(1)
+
+    ax1.grid()
+    ax1.set_axisbelow(True)
+
+    ax1.bar(x - width/2, y[:,0], width, label=protoLabels[0])
+    ax1.bar(x + width/2, y[:,1], width, label=protoLabels[1])
+    ax1.errorbar(x - width/2, y[:,0], yErr[:, 0], color="black", linestyle="", capsize=8)
+    ax1.errorbar(x + width/2, y[:,1], yErr[:, 1], color="black", linestyle="", capsize=8)
+
+    ax1.set_xticks(x)
+    ax1.set_xticklabels(graphLabels)
+    ax1.set_ylabel(ylabel)
+
+    ax1.legend()
+    _save(fig, path)
+
+
+# The dynamic figures take one array per protocol with rows time (s),
+# successRatio, networkImbalance, nsOfTxAbortBecauseLocked,
+# nsOfTxAbortBecauseNoFunds and nsOfRebalancingInvocations, each followed by
+# its std row. The bands around the lines are ±std, unless `bands` is given:
+# one array per protocol with the layout of `dt`, holding the lower bound of
+# the band in every metric row and the upper bound in the std row after it,
+# e.g. the confidence intervals of plotting.statistics. With `maxPoints` every
+# series longer than that is decimated before it is plotted, and `rasterized`
+# rasterizes the lines and bands in the otherwise vector PDF.
+
+def _band(dt, bands, i, row):
+    if bands is None:
+        return dt[i][row, :] - dt[i][row + 1, :], dt[i][row, :] + dt[i][row + 1, :]
+    return bands[i][row, :], bands[i][row + 1, :]
+
+
+def _line_with_band(ax, x, y, band, maxPoints=None, rasterized=False, **kwargs):
+    lower, upper = band
+    if maxPoints is None or x.shape[0] <= maxPoints:
+        ax.plot(x, y, rasterized=rasterized, **kwargs)
+        ax.fill_between(x, lower, upper, alpha=0.5, rasterized=rasterized)
+        return
+
+    kept = lttb_indices(x, y, maxPoints)
+    ax.plot(x[kept], y[kept], rasterized=rasterized, **kwargs)
+    # Every bucket of the envelope is drawn with two vertices
+    bandX, lower, upper = envelope(x, lower, upper, maxPoints // 2)
+    ax.fill_between(bandX, lower, upper, step="post", alpha=0.5, rasterized=rasterized)
+
+
+def success_ratio_figure(path, dt, labels, maxPoints=None, rasterized=False, bands=None):
+    import matplotlib.pyplot as plt
+    fig = plt.figure()
+    ax1, ax2 = fig.subplots(2, sharex=True)
+
+    for i in range(len(dt)):
+        _line_with_band(ax1, dt[i][0, :], dt[i][1, :], _band(dt, bands, i, 1), maxPoints, rasterized, label=labels[i])
+
+    ax1.set_xlim(0, dt[-1][0, -1])
+    ax1.set_ylim(0, 1)
+    ax1.set_ylabel("Success ratio")
+    ax2.set_xlabel("Time (s)")
+    ax1.grid()
+
+    for i in range(len(dt)):
+        _line_with_band(ax2, dt[i][0, :], dt[i][3, :], _band(dt, bands, i, 3), maxPoints, rasterized)
+
+    ax2.set_ylabel("Average network imbalance")
+    ax2.grid()
+
+    fig.legend()
+
+    _save(fig, path)
+
+
+def aborted_transactions_figure(path, dt, labels, maxPoints=None, rasterized=False):
+    import matplotlib.pyplot as plt
+    fig = plt.figure()
+    axes = fig.subplots(len(dt), sharex=True, sharey=True)
+
+    for i in range(len(dt)):
+        kept = slice(None)
+        if maxPoints is not None and dt[i].shape[1] > maxPoints:
+            # Both layers need the same x, so decimate on the top of the stack
+            kept = lttb_indices(dt[i][0, :], dt[i][5, :] + dt[i][7, :], maxPoints)
+        axes[i].stackplot(
+            dt[i][0, kept],
+            dt[i][5, kept],
+            dt[i][7, kept],
+            labels=['Aborted because locked', 'Aborted because no funds'] if i == 0 else [],
+            rasterized=rasterized
+        )
+        axes[i].set_ylabel(labels[i])
+        axes[i].yaxis.set_label_position('right')
+        axes[i].grid()
+
+        maxErrorLocked = np.max(dt[i][6, :])
+        maxErrorNoFunds = np.max(dt[i][8, :])
+        debug(f"StDev of {labels[i]} is locked: {maxErrorLocked} noFunds: {maxErrorNoFunds}")
+
+    axes[0].set_xlim(0, dt[-1][0, -1])
+    axes[-1].set_xlabel("Time (s)")
+    fig.supylabel("Number of aborted transactions")
+    axes[0].set_ylim(0, 4500)
+
+    fig.legend()
+
+    _save(fig, path)
+
+
+def rebalancing_invocations_figure(path, dt, labels, maxPoints=None, rasterized=False, bands=None):
+    import matplotlib.pyplot as plt
+    fig = plt.figure()
+    ax1 = fig.subplots(1)
+
+    for i in range(len(dt)):
+        _line_with_band(ax1, dt[i][0, :], dt[i][9, :], _band(dt, bands, i, 9), maxPoints, rasterized, label=labels[i])
+
+    ax1.set_xlim(0, dt[-1][0, -1])
+    ax1.set_xlabel("Time (s)")
+    ax1.set_ylabel("Number of protocol invocations")
+    ax1.grid()
+    ax1.set_ylim(0)
+
+    ax1.legend()
+
+    _save(fig, path)
+
+
+# The sweep figures take the arrays of a plotting.sweep.GiniSweep restricted
+# to the runs in `labels` and the metrics in `metricLabels`, with one facet
+# per metric.
+
+def sweep_steady_state_figure(path, ginis, mean, std, labels, metricLabels):
+    """Steady-state value of every metric against the Gini coefficient, `mean` and `std` have the axes (gini, run, metric)."""
+    import matplotlib.pyplot as plt
+    fig = plt.figure()
+    axes = fig.subplots(len(metricLabels), sharex=True, squeeze=False)[:, 0]
+
+    for k in range(len(metricLabels)):
+        for j in range(len(labels)):
+            axes[k].errorbar(ginis, mean[:, j, k], std[:, j, k], marker='o', capsize=4, label=labels[j] if k == 0 else None)
+        axes[k].set_ylabel(metricLabels[k])
+        axes[k].set_ylim(0)
+        axes[k].grid()
+
+    axes[-1].set_xlabel("Gini coefficient")
+    fig.legend()
+
+    _save(fig, path)
+
+
+def _band_verts(x, lower, upper):
+    # The polygon fill_between draws over the sample times a directory reached, none for a run it does not have
+    reached = np.isfinite(lower) & np.isfinite(upper)
+    if not np.any(reached):
+        return []
+    x, lower, upper = x[reached], lower[reached], upper[reached]
+    return [np.column_stack((np.concatenate((x, x[::-1])), np.concatenate((lower, upper[::-1]))))]
+
+
+def sweep_time_series_figure(path, ginis, x, mean, std, labels, metricLabels, rasterized=False):
+    """One page per Gini coefficient with the time series of every metric, `mean` and `std` have the axes (gini, run, time, metric).
+
+    The figure is laid out once and every page only swaps the data of its
+    lines and bands, all pages share the same axis limits.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    fig = plt.figure()
+    axes = fig.subplots(len(metricLabels), sharex=True, squeeze=False)[:, 0]
+    lines = np.empty((len(labels), len(metricLabels)), dtype=object)
+    bands = np.empty((len(labels), len(metricLabels)), dtype=object)
+
+    for k in range(len(metricLabels)):
+        for j in range(len(labels)):
+            lines[j, k], = axes[k].plot(x, mean[0, j, :, k], rasterized=rasterized, label=labels[j] if k == 0 else None)
+            bands[j, k] = axes[k].fill_between(x, 0, 0, alpha=0.5, color=lines[j, k].get_color(), rasterized=rasterized)
+        axes[k].set_xlim(0, x[-1])
+        top = np.nanmax(mean[:, :, :, k] + std[:, :, :, k])
+        axes[k].set_ylim(0, top * 1.05 if top > 0 else 1)
+        axes[k].set_ylabel(metricLabels[k])
+        axes[k].grid()
+    axes[-1].set_xlabel("Time (s)")
+    fig.legend()
+    title = fig.suptitle("")
+
+    with PdfPages(path) as pdf:
+        for i in range(len(ginis)):
+            title.set_text(f"Gini coefficient {ginis[i]:g}")
+            for j in range(len(labels)):
+                for k in range(len(metricLabels)):
+                    lines[j, k].set_ydata(mean[i, j, :, k])
+                    bands[j, k].set_verts(_band_verts(x, mean[i, j, :, k] - std[i, j, :, k], mean[i, j, :, k] + std[i, j, :, k]))
+            with PROFILER.stage("savefig"):
+                pdf.savefig(fig)
+    plt.close(fig)
@@ -0,0 +1,159 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from plotting.aggregate import aggregate_run
+from plotting.cache import prefix_hash
+from plotting.instrument import PROFILER, init_worker, worker_settings
+from plotting.parsing import ParsedRun, SkippedBlock, StreamedRun, append_run, is_settled, load_run, stream_run
+
+
+def _resume(path, trial, run, runData, meta, stat):
+    # Parse only what was appended after the consumed prefix of a cached run
+    if stat.st_size < meta["offset"] or prefix_hash(path, meta["offset"]) != meta["prefixHash"]:
+        return None
+
+    metricNames = meta["metrics"]["yRuns"] or meta["metrics"]["y"] or None
+    skipped = _skipped(meta)
+    if "stats" in runData:
+        appended = stream_run(path, trial, run, meta["offset"], metricNames, runData["stats"])
+        if appended is None:
+            return None
+        return appended._replace(blocks=meta["blocks"] + appended.blocks, skipped=skipped + appended.skipped)
+
+    appended = load_run(path, trial, run, meta["offset"], metricNames)
+    if appended is None:
+        return None
+    if appended.blocks > 0 and meta["blocks"] > 0 and set(appended.yRuns) != set(runData["yRuns"]):
+        return None
+
+    parsed = ParsedRun(runData["xRuns"], runData["yRuns"], runData.get("settings"), meta["blocks"], meta["offset"], skipped)
+    return append_run(parsed, appended)
+
+
+def _unchanged(path, meta, stat):
+    if meta["size"] != stat.st_size or meta["mtime_ns"] != stat.st_mtime_ns:
+        return False
+    # An invalid last block that was left unread while the file could still grow is reported once it settled
+    return meta["offset"] == meta["size"] or meta.get("settled", False) or not is_settled(path)
+
+
+def _skipped(meta):
+    return [SkippedBlock(*block) for block in meta.get("skipped", [])]
+
+
+def _run_data(parsed):
+    if isinstance(parsed, StreamedRun):
+        with PROFILER.stage("aggregate"):
+            x, y, yErr = parsed.stats.result()
+        return {
+            "xRuns": np.empty(0),
+            "yRuns": {},
+            "x": x,
+            "y": y,
+            "yErr": yErr,
+            "stats": parsed.stats,
+            "skipped": parsed.skipped
+        }
+
+    with PROFILER.stage("aggregate"):
+        x, y, yErr = aggregate_run(parsed.xRuns, parsed.yRuns)
+    runData = {
+        "xRuns": parsed.xRuns,
+        "yRuns": parsed.yRuns,
+        "x": x,
+        "y": y,
+        "yErr": yErr,
+        "skipped": parsed.skipped
+    }
+    if parsed.settings is not None:
+        runData["settings"] = parsed.settings
+    return runData
+
+
+def ingest_run(path, trial, run, cache=None, streaming=False, sketchAccuracy=None):
+    """Return the parsed and aggregated data of one run file, using and updating `cache`.
+
+    An unchanged file is served from the cache. When a file grew while the
+    simulation was running, only the blocks appended after the cached offset
+    are parsed and merged with the cached columns. With `streaming` the
+    samples are folded into OnlineStats accumulators (kept under "stats")
+    instead, and `xRuns`/`yRuns` are left empty; `sketchAccuracy` adds
+    quantile sketches to them. Corrupt blocks are left
+    out and listed under "skipped" (see plotting.parsing.complete_blocks).
+    """
+    stat = os.stat(path)
+    # Taken before parsing, so a file that settles meanwhile is checked again next time
+    settled = is_settled(path)
+    runData = meta = parsed = None
+    if cache is not None:
+        with PROFILER.stage("cache"):
+            runData, meta = cache.lookup(path, trial, run)
+        if runData is not None and (meta.get("streaming", False) != streaming or meta.get("sketchAccuracy") != sketchAccuracy):
+            runData = None
+
+    if runData is not None:
+        if _unchanged(path, meta, stat):
+            runData["skipped"] = _skipped(meta)
+            return runData
+        parsed = _resume(path, trial, run, runData, meta, stat)
+
+    if parsed is None:
+        parsed = stream_run(path, trial, run, sketchAccuracy=sketchAccuracy) if streaming else load_run(path, trial, run)
+        runData = None
+    elif parsed.blocks != meta["blocks"]:
+        runData = None
+    else:
+        # No complete block was appended and the cached aggregates still hold
+        runData["skipped"] = parsed.skipped
+
+    if runData is None:
+        runData = _run_data(parsed)
+
+    if cache is not None:
+        with PROFILER.stage("cache"):
+            cache.store(path, trial, run, runData, {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "offset": parsed.offset,
+                "blocks": parsed.blocks,
+                "prefixHash": prefix_hash(path, parsed.offset),
+                "streaming": streaming,
+                "sketchAccuracy": sketchAccuracy,
+                "settled": settled,
+                "skipped": [list(block) for block in parsed.skipped]
+            })
+    return runData
+
+
+def ingest_stored_run(store, trial, run):
+    """Return the aggregated data of one run read from a plotting.store.ResultStore instead of its text file."""
+    return _run_data(store.parsed_run(trial, run))
+
+
+def _ingest_job(job):
+    path, trial, run, cache, streaming, sketchAccuracy = job
+    runData = ingest_run(path, trial, run, cache, streaming, sketchAccuracy)
+    return runData, PROFILER.take() if PROFILER.enabled else None
+
+
+def ingest_runs(runs, cache=None, nOfJobs=1, streaming=False, sketchAccuracy=None):
+    """Ingest every (path, trial, run) of `runs`, in `nOfJobs` worker processes when more than one.
+
+    Results are returned in the order of `runs`, so the outcome does not
+    depend on which worker finishes first.
+    """
+    if nOfJobs <= 1 or len(runs) <= 1:
+        return [ingest_run(path, trial, run, cache, streaming, sketchAccuracy) for path, trial, run in runs]
+
+    # Hand out the largest files first so one big dynamic run does not end up last
+    order = sorted(range(len(runs)), key=lambda i: os.path.getsize(runs[i][0]), reverse=True)
+    results = [None] * len(runs)
+    with ProcessPoolExecutor(max_workers=min(nOfJobs, len(runs)), initializer=init_worker, initargs=worker_settings()) as executor:
+        futures = {executor.submit(_ingest_job, runs[i] + (cache, streaming, sketchAccuracy)): i for i in order}
+        for future, i in futures.items():
+            results[i], snapshot = future.result()
+            if snapshot is not None:
+                PROFILER.merge(snapshot)
+    return results
@@ -0,0 +1,159 @@
+import json
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# How much the pipeline prints, raised with -v. Debug output is only
+# formatted and written at verbosity 1 and up.
+verbosity = 0
+
+
+def set_verbosity(level):
+    global verbosity
+    verbosity = level
+
+
+def debug(*args):
+    if verbosity > 0:
+        print(*args)
+
+
+def _max_rss():
+    # ru_maxrss is in KiB on Linux but in bytes on macOS
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxRss if sys.platform == "darwin" else maxRss * 1024
+
+
+def _mib(nOfBytes):
+    # Stages timed with Profiler.add have no memory samples
+    return f"{nOfBytes / 2**20:.1f} MiB" if nOfBytes > 0 else "-"
+
+
+class Profiler:
+    """Wall time, peak memory and call count of every pipeline stage, plus what was read per run file.
+
+    Stages nest and the time of a stage excludes that of the stages inside
+    it, so the times of all stages add up to the instrumented total. Peak
+    RSS is the high-water mark of the process when a stage ends. The traced
+    peak is that of tracemalloc during the stage, only recorded when enabled
+    with `traceMemory` as tracing slows down every allocation. Disabled it
+    records nothing and `stage` costs a function call.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.traceMemory = False
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.files = {}
+        self.figures = {}
+        self._stack = []
+
+    def enable(self, traceMemory=False):
+        self.enabled = True
+        self.traceMemory = traceMemory
+        if traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _record(self, name, seconds, calls=1, peakRss=0, peakTraced=0):
+        stats = self.stages.setdefault(name, {"calls": 0, "seconds": 0., "peakRssBytes": 0, "peakTracedBytes": 0})
+        stats["calls"] += calls
+        stats["seconds"] += seconds
+        stats["peakRssBytes"] = max(stats["peakRssBytes"], peakRss)
+        stats["peakTracedBytes"] = max(stats["peakTracedBytes"], peakTraced)
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        # [start, seconds spent in nested stages, traced peak of nested stages]
+        frame = [time.perf_counter(), 0., 0]
+        if self.traceMemory:
+            if len(self._stack) > 0:
+                # reset_peak forgets the peak of the enclosing stage so far, keep it in its frame
+                self._stack[-1][2] = max(self._stack[-1][2], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            peakTraced = max(tracemalloc.get_traced_memory()[1], frame[2]) if self.traceMemory else 0
+            self._record(name, elapsed - frame[1], peakRss=_max_rss(), peakTraced=peakTraced)
+            if len(self._stack) > 0:
+                self._stack[-1][1] += elapsed
+                self._stack[-1][2] = max(self._stack[-1][2], peakTraced)
+
+    def add(self, name, seconds, calls=1):
+        """Record `seconds` measured by the caller, e.g. summed over a loop too hot for `stage`."""
+        self._record(name, seconds, calls)
+        if len(self._stack) > 0:
+            self._stack[-1][1] += seconds
+
+    def count_file(self, path, nOfBytes, nOfLines):
+        counts = self.files.setdefault(path, {"bytes": 0, "lines": 0})
+        counts["bytes"] += nOfBytes
+        counts["lines"] += nOfLines
+
+    def add_figure(self, path, seconds):
+        self.figures[path] = self.figures.get(path, 0.) + seconds
+
+    def take(self):
+        """Return everything recorded so far as a snapshot and start over, to ship it out of a worker process."""
+        snapshot = {"stages": self.stages, "files": self.files, "figures": self.figures}
+        self.stages, self.files, self.figures = {}, {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        for name, stats in snapshot["stages"].items():
+            self._record(name, stats["seconds"], stats["calls"], stats["peakRssBytes"], stats["peakTracedBytes"])
+        for path, counts in snapshot["files"].items():
+            self.count_file(path, counts["bytes"], counts["lines"])
+        for path, seconds in snapshot["figures"].items():
+            self.add_figure(path, seconds)
+
+    def to_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"stages": self.stages, "files": self.files, "figures": self.figures, "maxRssBytes": _max_rss()}, f, indent=2)
+
+    def summary(self):
+        total = sum(stats["seconds"] for stats in self.stages.values())
+        lines = [f"{'stage':<12}{'calls':>8}{'seconds':>10}{'share':>8}{'peak RSS':>12}{'peak traced':>14}"]
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1]["seconds"]):
+            lines.append(
+                f"{name:<12}{stats['calls']:>8}{stats['seconds']:>10.3f}{stats['seconds'] / max(total, 1e-12):>8.1%}"
+                f"{_mib(stats['peakRssBytes']):>12}{_mib(stats['peakTracedBytes']):>14}"
+            )
+        lines.append(f"{'total':<12}{'':>8}{total:>10.3f}")
+
+        if len(self.files) > 0:
+            nOfBytes = sum(counts["bytes"] for counts in self.files.values())
+            nOfLines = sum(counts["lines"] for counts in self.files.values())
+            lines.append(f"Read {nOfBytes / 2**20:.1f} MiB in {nOfLines} lines from {len(self.files)} run files")
+        for path, seconds in sorted(self.figures.items(), key=lambda item: -item[1])[:5]:
+            lines.append(f"  {seconds:.3f}s {path}")
+        return "\n".join(lines)
+
+
+# The profiler of this process, worker processes ship theirs back with take()
+PROFILER = Profiler()
+
+
+def init_worker(enabled, traceMemory, workerVerbosity):
+    """ProcessPoolExecutor initializer that carries the instrumentation settings over to a worker."""
+    set_verbosity(workerVerbosity)
+    # A forked worker starts out with a copy of everything its parent recorded
+    PROFILER.reset()
+    if enabled:
+        PROFILER.enable(traceMemory)
+
+
+def worker_settings():
+    return (PROFILER.enabled, PROFILER.traceMemory, verbosity)
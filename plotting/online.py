@@ -0,0 +1,204 @@
+import numpy as np
+
+from plotting.aggregate import group_stats
+
+# Relative accuracy of the quantile sketches of --quantiles
+SKETCH_ACCURACY = 0.01
+
+
+def _reindexed(values, index, size):
+    grown = np.zeros((size,) + values.shape[1:], dtype=values.dtype)
+    grown[index] = values
+    return grown
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch per x with logarithmically sized buckets, as in DDSketch.
+
+    Every quantile it returns is within a factor `accuracy` of a sample of
+    the right rank, and two sketches merge exactly by adding their bucket
+    counts. Memory is one row of buckets per x, covering only the range of
+    magnitudes that was actually seen.
+    """
+
+    def __init__(self, accuracy=SKETCH_ACCURACY, size=0):
+        self.accuracy = accuracy
+        self.logGamma = np.log((1 + accuracy) / (1 - accuracy))
+        self.zeros = np.zeros(size, dtype=np.int64)
+        # Buckets of positive values and of the magnitudes of negative values,
+        # column j of `buckets[sign]` counts the bucket with key offsets[sign] + j
+        self.buckets = [np.zeros((size, 0), dtype=np.int64), np.zeros((size, 0), dtype=np.int64)]
+        self.offsets = [0, 0]
+
+    def reindex(self, index, size):
+        self.zeros = _reindexed(self.zeros, index, size)
+        self.buckets = [_reindexed(buckets, index, size) for buckets in self.buckets]
+
+    def _widen(self, sign, low, high):
+        buckets, offset = self.buckets[sign], self.offsets[sign]
+        if buckets.shape[1] > 0:
+            low, high = min(low, offset), max(high, offset + buckets.shape[1] - 1)
+        if buckets.shape[1] == 0 or low < offset or high >= offset + buckets.shape[1]:
+            widened = np.zeros((buckets.shape[0], high - low + 1), dtype=np.int64)
+            widened[:, offset - low:offset - low + buckets.shape[1]] = buckets
+            self.buckets[sign], self.offsets[sign] = widened, low
+
+    def add(self, rows, values):
+        """Count every value of `values` in the row of its x index in `rows`."""
+        self.zeros += np.bincount(rows[values == 0], minlength=self.zeros.shape[0])
+        for sign, selected in enumerate((values > 0, values < 0)):
+            if not np.any(selected):
+                continue
+            keys = np.ceil(np.log(np.abs(values[selected])) / self.logGamma).astype(np.int64)
+            self._widen(sign, keys.min(), keys.max())
+            buckets = self.buckets[sign]
+            flat = rows[selected] * buckets.shape[1] + keys - self.offsets[sign]
+            buckets += np.bincount(flat, minlength=buckets.size).reshape(buckets.shape)
+
+    def merge(self, other):
+        """Add the counts of `other`, whose rows must already match the rows of this sketch."""
+        self.zeros += other.zeros
+        for sign in range(2):
+            buckets, offset = other.buckets[sign], other.offsets[sign]
+            if buckets.shape[1] == 0:
+                continue
+            self._widen(sign, offset, offset + buckets.shape[1] - 1)
+            start = offset - self.offsets[sign]
+            self.buckets[sign][:, start:start + buckets.shape[1]] += buckets
+
+    def quantile(self, q):
+        """The `q` quantile of every row, NaN for rows without samples."""
+        negative, positive = self.buckets[1], self.buckets[0]
+        # All buckets of a row in increasing order of the values they hold
+        ordered = np.hstack((negative[:, ::-1], self.zeros[:, None], positive))
+        gamma = np.exp(self.logGamma)
+        values = np.concatenate((
+            -2 * gamma ** (self.offsets[1] + np.arange(negative.shape[1])[::-1]) / (gamma + 1),
+            [0.],
+            2 * gamma ** (self.offsets[0] + np.arange(positive.shape[1])) / (gamma + 1)
+        ))
+
+        cumulative = np.cumsum(ordered, axis=1)
+        total = cumulative[:, -1]
+        # The bucket of the sample of the nearest rank
+        rank = np.round(q * (total - 1))
+        column = np.argmax(cumulative > rank[:, None], axis=1)
+        return np.where(total > 0, values[column], np.nan)
+
+
+class OnlineStats:
+    """Per-(x, metric) count, mean and sum of squared deviations, updated block by block.
+
+    Blocks are first reduced with group_stats and then folded in with the
+    pairwise form of Welford's update (Chan et al.), which is also how two
+    accumulators are merged, so accumulators of parallel workers or cached
+    partial results combine exactly. Memory is O(distinct x × metrics),
+    independent of the number of seeds.
+    """
+
+    def __init__(self, sketchAccuracy=None):
+        self.x = np.empty(0)
+        self.count = np.empty(0, dtype=np.int64)
+        self.mean = {}
+        self.m2 = {}
+        self.sketchAccuracy = sketchAccuracy
+        self.sketches = {}
+
+    def _align(self, x):
+        # Extend the rows to the union of the known and the new x values
+        union = np.union1d(self.x, x) if self.x.shape[0] > 0 else x
+        if union.shape[0] != self.x.shape[0]:
+            index = np.searchsorted(union, self.x)
+            self.count = _reindexed(self.count, index, union.shape[0])
+            for yDatName in self.mean:
+                self.mean[yDatName] = _reindexed(self.mean[yDatName], index, union.shape[0])
+                self.m2[yDatName] = _reindexed(self.m2[yDatName], index, union.shape[0])
+            for sketch in self.sketches.values():
+                sketch.reindex(index, union.shape[0])
+            self.x = union
+        return np.searchsorted(self.x, x)
+
+    def _combine(self, rows, count, mean, m2):
+        total = self.count[rows] + count
+        for yDatName in mean:
+            if yDatName not in self.mean:
+                self.mean[yDatName] = np.zeros(self.x.shape[0])
+                self.m2[yDatName] = np.zeros(self.x.shape[0])
+            delta = mean[yDatName] - self.mean[yDatName][rows]
+            self.mean[yDatName][rows] += delta * count / total
+            self.m2[yDatName][rows] += m2[yDatName] + delta * delta * self.count[rows] * count / total
+        self.count[rows] = total
+
+    def add(self, xRuns, yRuns):
+        """Fold the samples of one block into the accumulators."""
+        if len(xRuns) == 0:
+            return
+        x, count, stats = group_stats(xRuns, yRuns)
+        rows = self._align(x)
+        self._combine(rows, count, {yDatName: s.mean for yDatName, s in stats.items()}, {yDatName: s.std * s.std * count for yDatName, s in stats.items()})
+
+        if self.sketchAccuracy is not None:
+            sampleRows = self._align(xRuns)
+            for yDatName, values in yRuns.items():
+                if yDatName not in self.sketches:
+                    self.sketches[yDatName] = QuantileSketch(self.sketchAccuracy, self.x.shape[0])
+                self.sketches[yDatName].add(sampleRows, values)
+
+    def merge(self, other):
+        """Fold the accumulators of `other` into these ones."""
+        if other.x.shape[0] == 0:
+            return
+        rows = self._align(other.x)
+        self._combine(rows, other.count, other.mean, other.m2)
+
+        for yDatName, sketch in other.sketches.items():
+            if yDatName not in self.sketches:
+                self.sketches[yDatName] = QuantileSketch(sketch.accuracy, self.x.shape[0])
+            aligned = QuantileSketch(sketch.accuracy, sketch.zeros.shape[0])
+            aligned.merge(sketch)
+            aligned.reindex(rows, self.x.shape[0])
+            self.sketches[yDatName].merge(aligned)
+
+    def std(self, yDatName):
+        return np.sqrt(self.m2[yDatName] / self.count)
+
+    def quantile(self, yDatName, q):
+        return self.sketches[yDatName].quantile(q)
+
+    def result(self):
+        """Return (x, y, yErr) like aggregate_run does."""
+        return self.x, dict(self.mean), {yDatName: self.std(yDatName) for yDatName in self.mean}
+
+    def to_arrays(self):
+        """Flatten the accumulators into a dict of arrays, e.g. to store them in an .npz file."""
+        arrays = {"x": self.x, "count": self.count}
+        for yDatName in self.mean:
+            arrays[f"mean/{yDatName}"] = self.mean[yDatName]
+            arrays[f"m2/{yDatName}"] = self.m2[yDatName]
+        for yDatName, sketch in self.sketches.items():
+            arrays[f"sketch/{yDatName}/zeros"] = sketch.zeros
+            arrays[f"sketch/{yDatName}/positive"] = sketch.buckets[0]
+            arrays[f"sketch/{yDatName}/negative"] = sketch.buckets[1]
+            arrays[f"sketch/{yDatName}/settings"] = np.array([sketch.accuracy, sketch.offsets[0], sketch.offsets[1]])
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        stats = cls()
+        stats.x = arrays["x"]
+        stats.count = arrays["count"]
+        for key in arrays:
+            kind, _, yDatName = key.partition("/")
+            if kind == "mean":
+                stats.mean[yDatName] = arrays[key]
+                stats.m2[yDatName] = arrays[f"m2/{yDatName}"]
+            elif kind == "sketch" and yDatName.endswith("/settings"):
+                yDatName = yDatName[:-len("/settings")]
+                accuracy, positiveOffset, negativeOffset = arrays[key]
+                sketch = QuantileSketch(accuracy)
+                sketch.zeros = arrays[f"sketch/{yDatName}/zeros"]
+                sketch.buckets = [arrays[f"sketch/{yDatName}/positive"], arrays[f"sketch/{yDatName}/negative"]]
+                sketch.offsets = [int(positiveOffset), int(negativeOffset)]
+                stats.sketches[yDatName] = sketch
+                stats.sketchAccuracy = accuracy
+        return stats
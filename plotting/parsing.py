@@ -0,0 +1,553 @@
+import functools
+import itertools
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from plotting.binary import is_binary, read_segments
+from plotting.instrument import PROFILER
+from plotting.online import OnlineStats
+from plotting.ragged import RaggedRuns
+from plotting.settings import decode_settings, is_dynamic, settings_error, x_field
+
+# One `settings:` block as written by GraphHolder.saveData: the raw settings
+# string followed by one array per `metric:values` line. `start` and `end` are
+# the byte offsets of the block in its file, `error` says what is wrong with
+# one of its lines, None when they all parsed. `x` holds the sample times of
+# a dynamic block once complete_blocks has parsed them, None before.
+Block = namedtuple("Block", ["settings", "metrics", "start", "end", "error", "x"], defaults=[None])
+
+# A block that was left out because it is corrupt, with the byte range it
+# spans in its file and why
+SkippedBlock = namedtuple("SkippedBlock", ["start", "end", "reason"])
+
+# The flat columns parsed from (a part of) a run file. `blocks` counts the
+# settings blocks they came from and `offset` is the byte offset up to which
+# the file has been consumed. `settings` holds the decoded settings of every
+# block (see plotting.settings) or None for the dynamic trials. `skipped`
+# lists the corrupt blocks that were left out.
+ParsedRun = namedtuple("ParsedRun", ["xRuns", "yRuns", "settings", "blocks", "offset", "skipped"])
+
+# A run file as read by read_run, before its settings are decoded or its
+# samples aligned: `settings` holds the settings string of every block,
+# except for the dynamic trials whose sample times are parsed into `xRuns`
+# with the number of samples of every block in `lengths`.
+RawRun = namedtuple("RawRun", ["settings", "xRuns", "yRuns", "lengths", "blocks", "offset", "skipped"])
+
+# The same for a run file that was folded into OnlineStats accumulators
+StreamedRun = namedtuple("StreamedRun", ["stats", "blocks", "offset", "skipped"])
+
+
+# A run file that was not modified for this many seconds is no longer being
+# appended to, so a corrupt last block is final
+SETTLE_SECONDS = 60
+
+# count_values reads run files in chunks of this many bytes
+COUNT_CHUNK_BYTES = 1 << 20
+
+# Value lists longer than this many bytes are parsed by the C reader of
+# np.loadtxt, which is faster per value than np.fromstring but slower per call
+LOADTXT_BYTES = 1024
+
+
+class MisalignedOffset(ValueError):
+    pass
+
+
+def parse_values(values):
+    if len(values) == 0:
+        return np.empty(0)
+    if len(values) > LOADTXT_BYTES:
+        return np.loadtxt([values], delimiter=",", comments=None, ndmin=1)
+    return np.fromstring(values, sep=",")
+
+
+def checked_values(values):
+    """parse_values, but None instead of an exception when `values` (str or bytes) is not a list of numbers."""
+    # NumPy raises on anything else, except for a trailing comma, which
+    # np.fromstring ignores, or reads as -1 when a newline follows it
+    values = values.rstrip()
+    if values[-1:] in (",", b","):
+        return None
+    try:
+        return parse_values(values)
+    except ValueError:
+        return None
+
+
+def _lines(f, position, end=None):
+    # The complete lines from `position` up to byte `end`, with their byte offset.
+    # A run that was killed can leave a line without its newline, which the
+    # `settings:` line of the next run then continues, so such a line is split
+    # in front of it.
+    for line in f:
+        if not line.endswith(b"\n") or (end is not None and position >= end):
+            return
+        marker = line.find(b"settings:", 1)
+        if marker > 0:
+            yield position, line[:marker]
+            position += marker
+            line = line[marker:]
+        yield position, line
+        position += len(line)
+
+
+def read_blocks(path, offset=0, end=None):
+    """Yield one Block per `settings:` block while reading `path` line by line.
+
+    Reading starts at byte `offset` and stops at byte `end`, lines before the
+    first `settings:` line are skipped. A last line without a newline is
+    still being written by the simulation and is left for the next read. A
+    line that does not parse is recorded in the `error` of its block rather
+    than raised, so reading resumes at the next `settings:` line.
+    """
+    settings = None
+    metrics = {}
+    error = None
+    start = blockEnd = offset
+    # Timing every line is only worth it when profiling
+    timed = PROFILER.enabled
+    parseSeconds = 0.
+    nOfLines = 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for lineStart, line in _lines(f, offset, end):
+            nOfLines += 1
+            lineError = None
+            # The values stay bytes, NumPy parses them without decoding a copy
+            key, _, values = line.partition(b":")
+            try:
+                key = key.strip().decode()
+            except UnicodeDecodeError:
+                key = None
+                lineError = f"line at byte {lineStart} is not text"
+            if not line.endswith(b"\n"):
+                lineError = f"line at byte {lineStart} was cut off by the next settings: line"
+
+            if key == "settings":
+                if settings is not None:
+                    yield Block(settings, metrics, start, blockEnd, error)
+                try:
+                    settings = values.decode().strip()
+                except UnicodeDecodeError:
+                    settings = ""
+                    lineError = f"line at byte {lineStart} is not text"
+                metrics = {}
+                error = lineError
+                start = lineStart
+            elif settings is not None and key != "":
+                if lineError is None and not key.isidentifier():
+                    lineError = f"line at byte {lineStart} is not a metric:values line"
+                elif lineError is None and key in metrics:
+                    lineError = f"{key} occurs twice"
+                if lineError is None:
+                    if timed:
+                        parseStart = time.perf_counter()
+                        parsed = checked_values(values)
+                        parseSeconds += time.perf_counter() - parseStart
+                    else:
+                        parsed = checked_values(values)
+                    if parsed is None:
+                        lineError = f"{key} at byte {lineStart} does not hold only numbers"
+                    else:
+                        metrics[key] = parsed
+                if error is None:
+                    error = lineError
+            blockEnd = lineStart + len(line)
+
+    if timed:
+        PROFILER.add("parse", parseSeconds, nOfLines)
+        PROFILER.count_file(path, blockEnd - offset, nOfLines)
+    if settings is not None:
+        yield Block(settings, metrics, start, blockEnd, error)
+
+
+def count_values(path, trial, offset=0):
+    """Bound the number of blocks and of values per metric of run file `path` from byte `offset` without parsing them.
+
+    Every `settings:` line counts as a block, of as many values as it holds
+    sample times in a dynamic run and of one value otherwise. Returns
+    (blocks, values, end) where `end` is the byte offset up to which the
+    file was counted, so a reader that stops there fits buffers of these
+    sizes even while the file grows.
+    """
+    dynamic = is_dynamic(trial)
+    nOfBlocks = nOfValues = 0
+    end = offset
+    rest = b""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for chunk in iter(functools.partial(f.read, COUNT_CHUNK_BYTES), b""):
+            data = rest + chunk
+            # Only complete lines count, the rest is counted with the next chunk
+            complete = data.rfind(b"\n") + 1
+            if dynamic:
+                position = data.find(b"settings:", 0, complete)
+                while position >= 0:
+                    lineEnd = data.find(b"\n", position, complete)
+                    nOfBlocks += 1
+                    nOfValues += data.count(b",", position, lineEnd) + 1
+                    position = data.find(b"settings:", lineEnd, complete)
+            else:
+                nOfBlocks += data.count(b"settings:", 0, complete)
+            end += complete
+            rest = data[complete:]
+    return nOfBlocks, nOfValues if dynamic else nOfBlocks, end
+
+
+def _metrics_error(metrics, metricNames):
+    if metricNames is None or set(metrics) == set(metricNames):
+        return None
+    missing = [name for name in metricNames if name not in metrics]
+    if len(missing) > 0:
+        return f"missing {', '.join(missing)}"
+    return f"unexpected {', '.join(name for name in metrics if name not in metricNames)}"
+
+
+@functools.lru_cache(maxsize=4096)
+def _settings_error(trial, settings):
+    # Every seed repeats the same few settings strings
+    return settings_error(trial, [settings])
+
+
+def is_settled(path):
+    return time.time() - os.path.getmtime(path) >= SETTLE_SECONDS
+
+
+def _checked_block(block, trial, metricNames):
+    # `block` with the sample times of a dynamic run parsed into its `x`, and why it cannot be consumed, None when it can
+    if block.error is not None:
+        return block, block.error
+    error = _metrics_error(block.metrics, metricNames)
+    if error is not None:
+        return block, error
+
+    if is_dynamic(trial):
+        x = checked_values(block.settings)
+        if x is None:
+            return block, "sample times are not numbers"
+        block = block._replace(x=x)
+        nOfValues = x.shape[0]
+    else:
+        error = _settings_error(trial, block.settings)
+        if error is not None:
+            return block, error
+        # The other trials write one value per metric and block
+        nOfValues = 1
+    for yDatName, values in block.metrics.items():
+        if values.shape[0] != nOfValues:
+            return block, f"{yDatName} holds {values.shape[0]} instead of {nOfValues} values"
+    return block, None
+
+
+def complete_blocks(path, trial, offset=0, metricNames=None, skipped=None, end=None):
+    """Yield the valid blocks of run file `path` of `trial` between bytes `offset` and `end` that are safe to consume.
+
+    A block is valid when all its lines parsed, its settings decode (see
+    plotting.settings) and it holds every metric of `metricNames` (or else
+    of the first valid block), each with one value per sample time of a
+    dynamic run or a single value otherwise. The sample times of a dynamic
+    block are yielded parsed, in its `x`. A killed run leaves a block that
+    is not valid, which is appended to `skipped` as a SkippedBlock and
+    reading resumes at the next `settings:` line. An invalid last block of
+    the file is left unread as the simulation may still be appending it,
+    until the file is settled (see is_settled). Raises MisalignedOffset
+    when `offset` does not point at a `settings:` line.
+    """
+    def check(block, following):
+        block, error = _checked_block(block, trial, metricNames)
+        # Until the metrics are known, a first block that is cut short shows by the next one holding more
+        if error is None and metricNames is None and following is not None and following.error is None and set(following.metrics) > set(block.metrics):
+            error = f"missing {', '.join(name for name in following.metrics if name not in block.metrics)}"
+        return block, error
+
+    previous = None
+    for block in read_blocks(path, offset, end):
+        if previous is None and offset > 0 and block.start != offset:
+            raise MisalignedOffset(f"{path} has no settings: line at byte {offset}")
+        if previous is not None:
+            previous, error = check(previous, block)
+            if error is None:
+                yield previous
+                if metricNames is None:
+                    metricNames = list(previous.metrics)
+            elif skipped is not None:
+                skipped.append(SkippedBlock(previous.start, previous.end, error))
+        previous = block
+
+    if previous is not None:
+        previous, error = check(previous, None)
+        if error is None:
+            yield previous
+        elif skipped is not None and is_settled(path):
+            skipped.append(SkippedBlock(previous.start, previous.end, error))
+
+
+def _segment_error(segment, trial, metricNames):
+    # The checks of _checked_block for all blocks of a binary segment at once
+    dynamic = is_dynamic(trial)
+    if segment.error is not None:
+        return segment.error
+    if dynamic != (segment.x is not None):
+        return f"holds the blocks of {segment.trial}"
+    error = _metrics_error(segment.metrics, metricNames)
+    if error is not None:
+        return error
+
+    if dynamic:
+        if segment.lengths.shape[0] != segment.blocks or np.sum(segment.lengths) != segment.x.shape[0]:
+            return "the sample counts of its blocks do not add up"
+        nOfValues = segment.x.shape[0]
+    else:
+        if len(segment.settings) != segment.blocks:
+            return "does not hold one settings string per block"
+        error = settings_error(trial, segment.settings)
+        if error is not None:
+            return error
+        nOfValues = segment.blocks
+    for yDatName, values in segment.metrics.items():
+        if values.shape[0] != nOfValues:
+            return f"{yDatName} holds {values.shape[0]} instead of {nOfValues} values"
+    return None
+
+
+def complete_segments(path, trial, offset=0, metricNames=None, skipped=None):
+    """complete_blocks for binary run files (see plotting.binary), yields the valid Segments from byte `offset`.
+
+    A segment is always written whole, so unlike a text block it is only
+    checked against `metricNames` or the first valid segment.
+    """
+    first = True
+    for segment in read_segments(path, offset):
+        if first and offset > 0 and segment.start != offset:
+            raise MisalignedOffset(f"{path} has no segment at byte {offset}")
+        first = False
+        error = _segment_error(segment, trial, metricNames)
+        if error is None:
+            yield segment
+            if metricNames is None:
+                metricNames = list(segment.metrics)
+        elif skipped is not None:
+            skipped.append(SkippedBlock(segment.start, segment.end, error))
+
+
+def _run_blocks(path, trial, offset, metricNames, skipped):
+    # (settings string, sample times, metrics, end) of every valid block of a text or binary
+    # run file, the sample times only of the dynamic trials and the settings only of the others
+    dynamic = is_dynamic(trial)
+    if not is_binary(path):
+        for block in complete_blocks(path, trial, offset, metricNames, skipped):
+            yield block.settings, block.x, block.metrics, block.end
+        return
+
+    for segment in complete_segments(path, trial, offset, metricNames, skipped):
+        if dynamic:
+            ends = np.cumsum(segment.lengths)
+            for start, end in zip((ends - segment.lengths).tolist(), ends.tolist()):
+                yield None, segment.x[start:end], {yDatName: values[start:end] for yDatName, values in segment.metrics.items()}, segment.end
+        else:
+            for i, settings in enumerate(segment.settings):
+                yield settings, None, {yDatName: values[i:i + 1] for yDatName, values in segment.metrics.items()}, segment.end
+
+
+def describe_skipped(name, skipped):
+    """The lines to print about the corrupt blocks left out of run file `name`."""
+    if len(skipped) == 0:
+        return []
+    return [f"Skipped {len(skipped)} corrupt block{'s' if len(skipped) > 1 else ''} of {name}:"] + [
+        f"  bytes {block.start}-{block.end}: {block.reason}" for block in skipped
+    ]
+
+
+def read_run(path, trial, offset=0, metricNames=None):
+    """Read the complete blocks of one run file from byte `offset` into a RawRun.
+
+    Only complete blocks are read and corrupt ones are skipped, see
+    complete_blocks. The columns are allocated once, at the sizes
+    count_values finds, and every block is copied into them as it is parsed.
+    Binary run files are read by read_binary_run. Returns None when `offset`
+    does not point at a `settings:` line.
+    """
+    if is_binary(path):
+        return read_binary_run(path, trial, offset, metricNames)
+
+    dynamic = is_dynamic(trial)
+    with PROFILER.stage("read"):
+        nOfBlocks, capacity, end = count_values(path, trial, offset)
+    xRuns = np.empty(capacity if dynamic else 0)
+    lengths = np.empty(nOfBlocks, dtype=np.intp)
+    settingsStrings = []
+    yRuns = {}
+    skipped = []
+    nOfBlocks = size = 0
+    consumed = offset
+
+    try:
+        with PROFILER.stage("read"):
+            for block in complete_blocks(path, trial, offset, metricNames, skipped, end):
+                # The other trials write one value per metric and block
+                nOfValues = block.x.shape[0] if dynamic else 1
+                if dynamic:
+                    xRuns[size:size + nOfValues] = block.x
+                    lengths[nOfBlocks] = nOfValues
+                else:
+                    settingsStrings.append(block.settings)
+                for yDatName, values in block.metrics.items():
+                    if yDatName not in yRuns:
+                        yRuns[yDatName] = np.empty(capacity)
+                    yRuns[yDatName][size:size + nOfValues] = values
+                nOfBlocks += 1
+                size += nOfValues
+                consumed = block.end
+    except MisalignedOffset:
+        return None
+
+    # Skipped blocks are consumed too, so they are not read and reported again
+    if len(skipped) > 0:
+        consumed = max(consumed, skipped[-1].end)
+    yRuns = {yDatName: values[:size] for yDatName, values in yRuns.items()}
+    return RawRun(settingsStrings, xRuns[:size] if dynamic else xRuns, yRuns, lengths[:nOfBlocks] if dynamic else [], nOfBlocks, consumed, skipped)
+
+
+def _joined(arrays):
+    # A single array, such as the one segment plotting.convert writes, stays a view of the file
+    if len(arrays) == 1:
+        return arrays[0]
+    return np.concatenate(arrays) if len(arrays) > 0 else np.empty(0)
+
+
+def read_binary_run(path, trial, offset=0, metricNames=None):
+    """read_run for binary run files (see plotting.binary).
+
+    Nothing is parsed: the columns of a file with a single segment are
+    np.frombuffer views of its memory map, those of several segments are
+    concatenated. They keep the dtype they were written with, decode_run
+    copies int32 and float32 columns once to widen them to float64.
+    """
+    dynamic = is_dynamic(trial)
+    segments = []
+    skipped = []
+    consumed = offset
+    try:
+        with PROFILER.stage("read"):
+            for segment in complete_segments(path, trial, offset, metricNames, skipped):
+                segments.append(segment)
+                consumed = segment.end
+    except MisalignedOffset:
+        return None
+
+    if len(skipped) > 0:
+        consumed = max(consumed, skipped[-1].end)
+    if PROFILER.enabled:
+        PROFILER.count_file(path, consumed - offset, 0)
+    yRuns = {yDatName: _joined([segment.metrics[yDatName] for segment in segments]) for yDatName in (segments[0].metrics if len(segments) > 0 else {})}
+    return RawRun(
+        [] if dynamic else [settings for segment in segments for settings in segment.settings],
+        _joined([segment.x for segment in segments]) if dynamic else np.empty(0),
+        yRuns,
+        _joined([segment.lengths for segment in segments]) if dynamic else [],
+        sum(segment.blocks for segment in segments),
+        consumed,
+        skipped
+    )
+
+
+def _float64(yRuns):
+    # Binary run files keep the float32 and int32 values of the simulation, the statistics are computed in
+    # float64. Values that were aligned were widened by the copy align makes anyway, and are not copied again.
+    return {yDatName: values.astype(np.float64, copy=False) for yDatName, values in yRuns.items()}
+
+
+def decode_run(raw, trial, run):
+    """Turn a RawRun into the flat columns of a ParsedRun.
+
+    The settings of all blocks are decoded at once into typed columns, and
+    the blocks of dynamic runs are aligned onto the common sampling grid (see
+    RaggedRuns.align) instead of being cut to the shortest one.
+    """
+    if not is_dynamic(trial):
+        with PROFILER.stage("decode"):
+            settings = decode_settings(trial, raw.settings)
+        field = x_field(trial, run)
+        xRuns = settings[field] if settings is not None and field is not None else np.empty(0)
+        return ParsedRun(xRuns, _float64(raw.yRuns), settings, raw.blocks, raw.offset, raw.skipped)
+
+    with PROFILER.stage("align"):
+        aligned = RaggedRuns.from_lengths(raw.xRuns, raw.yRuns, raw.lengths).align(dtype=np.float64)
+    return ParsedRun(aligned.x, _float64(aligned.y), None, raw.blocks, raw.offset, raw.skipped)
+
+
+def load_run(path, trial, run, offset=0, metricNames=None):
+    """Parse the blocks of one run file from byte `offset` into flat `xRuns` and `yRuns` arrays.
+
+    See read_run and decode_run. Returns None when `offset` does not point
+    at a `settings:` line.
+    """
+    raw = read_run(path, trial, offset, metricNames)
+    if raw is None:
+        return None
+    return decode_run(raw, trial, run)
+
+
+def append_run(parsed, appended):
+    """Combine the columns of a consumed prefix with those parsed from the blocks appended after it."""
+    if appended.blocks == 0:
+        return parsed._replace(offset=appended.offset, skipped=parsed.skipped + appended.skipped)
+    if parsed.blocks == 0:
+        return appended._replace(skipped=parsed.skipped + appended.skipped)
+
+    return ParsedRun(
+        np.concatenate((parsed.xRuns, appended.xRuns)),
+        {yDatName: np.concatenate((values, appended.yRuns[yDatName])) for yDatName, values in parsed.yRuns.items()},
+        None if parsed.settings is None else np.concatenate((parsed.settings, appended.settings)),
+        parsed.blocks + appended.blocks,
+        appended.offset,
+        parsed.skipped + appended.skipped
+    )
+
+
+def stream_run(path, trial, run, offset=0, metricNames=None, stats=None, sketchAccuracy=None):
+    """Fold the blocks of one run file from byte `offset` into OnlineStats `stats`.
+
+    Unlike load_run no samples are kept, every block is dropped as soon as it
+    has been added to the accumulators. A new `stats` keeps quantile
+    sketches of `sketchAccuracy` when it is set. Reads text and binary run
+    files. Returns a StreamedRun, or None when `offset` does not point at a
+    `settings:` line.
+    """
+    dynamic = is_dynamic(trial)
+    field = x_field(trial, run)
+    stats = OnlineStats(sketchAccuracy) if stats is None else stats
+    skipped = []
+    nOfBlocks = 0
+    consumed = offset
+
+    blocks = _run_blocks(path, trial, offset, metricNames, skipped)
+    try:
+        first = next(blocks, None)
+    except MisalignedOffset:
+        return None
+
+    # Stats are updated in place, so only start once the offset is known to be right
+    with PROFILER.stage("read"):
+        for settings, x, metrics, end in itertools.chain([first] if first is not None else [], blocks):
+            nOfBlocks += 1
+            consumed = end
+
+            if dynamic:
+                with PROFILER.stage("align"):
+                    aligned = RaggedRuns.from_lengths(x, metrics, [x.shape[0]]).align(dtype=np.float64)
+                with PROFILER.stage("aggregate"):
+                    stats.add(aligned.x, _float64(aligned.y))
+            else:
+                with PROFILER.stage("decode"):
+                    decoded = decode_settings(trial, [settings])
+                if decoded is not None and field is not None:
+                    with PROFILER.stage("aggregate"):
+                        stats.add(decoded[field], _float64(metrics))
+
+    if len(skipped) > 0:
+        consumed = max(consumed, skipped[-1].end)
+    return StreamedRun(stats, nOfBlocks, consumed, skipped)
@@ -0,0 +1,62 @@
+import numpy as np
+
+# GraphHolder.start samples the dynamic statistics every samplingInterval ms
+SAMPLING_INTERVAL = 10000.
+
+
+class RaggedRuns:
+    """Time series of several runs of unequal length, stored CSR style.
+
+    `x` and every array in `y` hold the samples of all runs back to back and
+    run i spans `offsets[i]:offsets[i + 1]`, so memory is proportional to the
+    total number of samples instead of runs times the longest run.
+    """
+
+    def __init__(self, x, y, offsets):
+        self.x = x
+        self.y = y
+        self.offsets = offsets
+
+    @classmethod
+    def from_lengths(cls, x, y, lengths):
+        return cls(x, y, np.concatenate(([0], np.cumsum(lengths, dtype=np.intp))))
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def run_index(self):
+        return np.repeat(np.arange(self.offsets.shape[0] - 1), self.lengths())
+
+    def align(self, interval=SAMPLING_INTERVAL, dtype=None):
+        """Resample every run onto the common grid of multiples of `interval`.
+
+        A run covers the grid points from its first to its last sample time and
+        at each of them takes its latest sample at or before that time. The
+        sampled statistics are running totals and snapshots, so carrying the
+        last sample forward is exact for points at which a run had no event.
+        The values are cast to `dtype` as they are copied, or else keep theirs.
+        """
+        if self.x.shape[0] == 0:
+            return self
+
+        lengths = self.lengths()
+        nonEmpty = lengths > 0
+        firstCell = np.zeros(lengths.shape[0], dtype=np.int64)
+        lastCell = np.full(lengths.shape[0], -1, dtype=np.int64)
+        firstCell[nonEmpty] = np.ceil(self.x[self.offsets[:-1][nonEmpty]] / interval)
+        lastCell[nonEmpty] = np.floor(self.x[self.offsets[1:][nonEmpty] - 1] / interval)
+        alignedLengths = np.maximum(lastCell - firstCell + 1, 0)
+        alignedOffsets = np.concatenate(([0], np.cumsum(alignedLengths)))
+
+        # Filled run by run, so no index array spans all samples at once
+        x = np.empty(alignedOffsets[-1])
+        y = {yDatName: np.empty(alignedOffsets[-1], dtype=dtype or values.dtype) for yDatName, values in self.y.items()}
+        for i in np.flatnonzero(alignedLengths).tolist():
+            start, end = self.offsets[i], self.offsets[i + 1]
+            aligned = slice(alignedOffsets[i], alignedOffsets[i + 1])
+            x[aligned] = np.arange(firstCell[i], lastCell[i] + 1) * interval
+            take = start + np.searchsorted(self.x[start:end], x[aligned], side="right") - 1
+            for yDatName, values in self.y.items():
+                y[yDatName][aligned] = values[take]
+
+        return RaggedRuns(x, y, alignedOffsets)
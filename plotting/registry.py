@@ -0,0 +1,327 @@
+import functools
+from collections import namedtuple
+
+import numpy as np
+
+from plotting import figures
+from plotting.render import FigureJob
+from plotting.settings import node_type_names
+from plotting.sweep import gini_dirs, gini_sweep, steady_state
+
+# A thesis figure: `build(spec, inputs)` turns the aggregated data of the
+# `runs` of `trial` into the kwargs of `render` (see plotting.figures).
+# `inputs` maps every run to its "x", "y" and "yErr", plus "yLower" and
+# "yUpper" when confidence bands were computed, and holds only the declared
+# `metrics`, so a spec cannot silently depend on anything else.
+# `options` names the optional keyword arguments of `render` that can be set
+# from the command line.
+FigureSpec = namedtuple("FigureSpec", ["name", "trial", "runs", "metrics", "render", "build", "options"], defaults=((),))
+
+STATIC_RUNS = ["score_complete_graph.txt.csv", "score_difficult_graph.txt.csv", "score_lightning.csv"]
+STATIC_GRAPH_LABELS = [r"$G_{\mathrm{Complete}}$", r"$G_{\mathrm{Design}}$", r"$G_{\mathrm{Lightning}}$"]
+
+# Every dynamic figure takes the same row layout, see plotting.figures
+DYNAMIC_RUNS = ["data_CoinWasher.csv", "data_Revive.csv", "data_Normal.csv"]
+DYNAMIC_LABELS = ["Our protocol", "Revive", "No rebalancing"]
+DYNAMIC_METRICS = ["successRatio", "networkImbalance", "nsOfTxAbortBecauseLocked", "nsOfTxAbortBecauseNoFunds", "nsOfRebalancingInvocations"]
+# Their time series grow with the length of the simulation, see plotting.downsample
+DYNAMIC_OPTIONS = ("maxPoints", "rasterized")
+# The metrics the dynamic figures draw a band around, see plotting.statistics for confidence bands
+DYNAMIC_BAND_METRICS = ["successRatio", "networkImbalance", "nsOfRebalancingInvocations"]
+
+
+# The facets of the sweep figures
+SWEEP_METRIC_LABELS = {
+    "successRatio": "Success ratio",
+    "networkImbalance": "Average network imbalance",
+    "nsOfRebalancingInvocations": "Number of protocol invocations"
+}
+
+
+def sort_on_first_row(data):
+    return data[:, data[0, :].argsort()]
+
+
+def _line_kwargs(spec, inputs, labels, xScale=1., **kwargs):
+    # One (y, yErr) row pair per run, all runs share the x values of the first one
+    rows = [np.array(inputs[spec.runs[0]]["x"], dtype=np.double) * xScale]
+    for run in spec.runs:
+        rows += [inputs[run]["y"][spec.metrics[0]], inputs[run]["yErr"][spec.metrics[0]]]
+    return dict(kwargs, sorted_data=sort_on_first_row(np.array(rows, dtype=np.double)), labels=labels)
+
+
+def _static_kwargs(spec, inputs, lightningExponent, ylabel):
+    protoTypes = node_type_names(inputs[spec.runs[0]]["x"])
+    protoTypes[protoTypes == "CoinWasher"] = "Our protocol"
+
+    metric = spec.metrics[0]
+    y = np.array([inputs[run]["y"][metric] for run in spec.runs], dtype=np.double)
+    yErr = np.array([inputs[run]["yErr"][metric] for run in spec.runs], dtype=np.double)
+
+    # The lightning graph is orders of magnitude larger, scale it to fit next to the others
+    y[2, :] = y[2, :] / 10 ** lightningExponent
+    yErr[2, :] = yErr[2, :] / 10 ** lightningExponent
+    graphLabels = STATIC_GRAPH_LABELS[:2] + [fr"{STATIC_GRAPH_LABELS[2]} / $10^{lightningExponent}$"]
+
+    return {
+        "y": y,
+        "yErr": yErr,
+        "graphLabels": graphLabels,
+        "protoLabels": list(protoTypes[:2]),
+        "ylabel": ylabel
+    }
+
+
+def _dynamic_kwargs(spec, inputs, drawsBands=False):
+    dt = []
+    for run in spec.runs:
+        rows = [inputs[run]["x"] / 1000]
+        for metric in spec.metrics:
+            rows += [inputs[run]["y"][metric], inputs[run]["yErr"][metric]]
+        dt.append(np.array(rows, dtype=np.double))
+    kwargs = {"dt": dt, "labels": [DYNAMIC_LABELS[DYNAMIC_RUNS.index(run)] for run in spec.runs]}
+
+    if drawsBands and all("yLower" in inputs[run] for run in spec.runs):
+        # Confidence bands in the layout of `dt`, metrics without one keep ±std
+        bands = []
+        for run in spec.runs:
+            rows = [inputs[run]["x"] / 1000]
+            for metric in spec.metrics:
+                y, yErr = inputs[run]["y"][metric], inputs[run]["yErr"][metric]
+                rows += [inputs[run]["yLower"].get(metric, y - yErr), inputs[run]["yUpper"].get(metric, y + yErr)]
+            bands.append(np.array(rows, dtype=np.double))
+        kwargs["bands"] = bands
+    return kwargs
+
+
+def _sweep_indices(spec, sweep):
+    return [sweep.runs.index(run) for run in spec.runs], [sweep.metrics.index(metric) for metric in spec.metrics]
+
+
+def _sweep_labels(spec):
+    return {
+        "labels": [DYNAMIC_LABELS[DYNAMIC_RUNS.index(run)] for run in spec.runs],
+        "metricLabels": [SWEEP_METRIC_LABELS[metric] for metric in spec.metrics]
+    }
+
+
+def _steady_state_kwargs(spec, sweep):
+    runs, metrics = _sweep_indices(spec, sweep)
+    mean, std = steady_state(sweep)
+    return dict(_sweep_labels(spec), ginis=sweep.ginis, mean=mean[:, runs][:, :, metrics], std=std[:, runs][:, :, metrics])
+
+
+def _sweep_time_series_kwargs(spec, sweep):
+    runs, metrics = _sweep_indices(spec, sweep)
+    return dict(
+        _sweep_labels(spec),
+        ginis=sweep.ginis,
+        x=sweep.x / 1000,
+        mean=sweep.mean[:, runs][:, :, :, metrics],
+        std=sweep.std[:, runs][:, :, :, metrics]
+    )
+
+
+FIGURES = [
+    FigureSpec(
+        "hopCount", "PART_DISC",
+        ["hopCount_5.csv", "hopCount_7.csv", "hopCount_9.csv"], ["nOfParticipants"],
+        figures.line_figure,
+        functools.partial(
+            _line_kwargs,
+            labels=[fr"$I_m = {i}$" for i in (5, 7, 9)],
+            xlabel="Hop count $h_c$",
+            ylabel="Number of participants $|P|$",
+            xlim=(1,)
+        )
+    ),
+    FigureSpec(
+        "maxNumberOfInvites", "PART_DISC",
+        ["maxNumberOfInvites_3.csv", "maxNumberOfInvites_4.csv", "maxNumberOfInvites_5.csv"], ["nOfParticipants"],
+        figures.line_figure,
+        functools.partial(
+            _line_kwargs,
+            labels=[fr"$h_c = {j}$" for j in (3, 4, 5)],
+            xlabel="Maxmimum number of invites per node $I_m$",
+            ylabel="Number of participants $|P|$",
+            xlim=(1,),
+            legendLoc="upper left"
+        )
+    ),
+    FigureSpec(
+        "percentageLeaders_score", "SCORE_VS_PERC_LEADERS",
+        ["percentageLeaders_5.csv", "percentageLeaders_7.csv", "percentageLeaders_9.csv"], ["totalDemandsMet"],
+        figures.line_figure,
+        functools.partial(
+            _line_kwargs,
+            labels=[fr"$I_m = {i}$" for i in (5, 7, 9)],
+            xScale=100.,
+            xlabel=r"Percentage of leaders $\rho$",
+            ylabel="Number of demands met",
+            xlim=(0, 100),
+            legendLoc="lower right",
+            percentX=True
+        )
+    ),
+    FigureSpec(
+        "percentageLeaders_mes", "SCORE_VS_PERC_LEADERS",
+        ["percentageLeaders_5.csv", "percentageLeaders_7.csv", "percentageLeaders_9.csv"], ["nOfRebalanceMes"],
+        figures.line_figure,
+        functools.partial(
+            _line_kwargs,
+            labels=[fr"$I_m = {i}$" for i in (5, 7, 9)],
+            xScale=100.,
+            xlabel=r"Percentage of leaders $\rho$",
+            ylabel="Number of messages send",
+            xlim=(0, 100),
+            percentX=True
+        )
+    ),
+    FigureSpec(
+        "static_comp_1", "STATIC_REBALANCING_COMPARISON", STATIC_RUNS, ["totalDemandsMet"],
+        figures.bar_comparison_figure,
+        functools.partial(_static_kwargs, lightningExponent=4, ylabel="Number of demands met")
+    ),
+    FigureSpec(
+        "static_comp_messages", "STATIC_REBALANCING_COMPARISON", STATIC_RUNS, ["nOfRebalanceMes"],
+        figures.bar_comparison_figure,
+        functools.partial(_static_kwargs, lightningExponent=3, ylabel="Number of messages send")
+    ),
+    FigureSpec(
+        "static_comp_time", "STATIC_REBALANCING_COMPARISON", STATIC_RUNS, ["time"],
+        figures.bar_comparison_figure,
+        functools.partial(_static_kwargs, lightningExponent=2, ylabel="Total time elapsed (ms)")
+    ),
+    FigureSpec(
+        "success_ratio", "DYNAMIC_REBALANCING_COMPARISON", DYNAMIC_RUNS, DYNAMIC_METRICS,
+        figures.success_ratio_figure, functools.partial(_dynamic_kwargs, drawsBands=True), DYNAMIC_OPTIONS
+    ),
+    FigureSpec(
+        "nOfTransactions", "DYNAMIC_REBALANCING_COMPARISON", DYNAMIC_RUNS, DYNAMIC_METRICS,
+        figures.aborted_transactions_figure, _dynamic_kwargs, DYNAMIC_OPTIONS
+    ),
+    # The baseline never invokes a rebalancing protocol
+    FigureSpec(
+        "nOfRebalancingInvocations", "DYNAMIC_REBALANCING_COMPARISON", DYNAMIC_RUNS[:-1], DYNAMIC_METRICS,
+        figures.rebalancing_invocations_figure, functools.partial(_dynamic_kwargs, drawsBands=True), DYNAMIC_OPTIONS
+    )
+]
+
+
+# Figures over every Gini coefficient directory of a trial, rendered with
+# --sweep. `build(spec, sweep)` gets the plotting.sweep.GiniSweep of the trial.
+SWEEPS = [
+    FigureSpec(
+        "sweep_steady_state", "DYNAMIC_REBALANCING_COMPARISON", DYNAMIC_RUNS, ["successRatio", "networkImbalance"],
+        figures.sweep_steady_state_figure, _steady_state_kwargs
+    ),
+    FigureSpec(
+        "sweep_time_series", "DYNAMIC_REBALANCING_COMPARISON", DYNAMIC_RUNS, ["successRatio", "networkImbalance"],
+        figures.sweep_time_series_figure, _sweep_time_series_kwargs, ("rasterized",)
+    )
+]
+
+
+def trial_matches(pattern, trial):
+    """Whether result directory `trial` belongs to `pattern`.
+
+    The dynamic trial writes one directory per Gini coefficient, e.g.
+    DYNAMIC_REBALANCING_COMPARISON_0.225, which all match
+    DYNAMIC_REBALANCING_COMPARISON.
+    """
+    return trial == pattern or trial.startswith(f"{pattern}_")
+
+
+def _check_names(names, specs):
+    unknown = set(names or ()) - {spec.name for spec in specs}
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown figures {sorted(unknown)}, see --list")
+
+
+def figure_targets(trialDirs, names=None, trials=None):
+    """Return the (spec, trial directory) pair of every figure to render.
+
+    Only figures named in `names` and directories matching one of `trials`
+    are selected, all of them when these are empty.
+    """
+    _check_names(names, FIGURES)
+
+    return [
+        (spec, trial) for spec in FIGURES for trial in sorted(trialDirs)
+        if trial_matches(spec.trial, trial)
+        and (not names or spec.name in names)
+        and (not trials or any(trial_matches(pattern, trial) for pattern in trials))
+    ]
+
+
+def required_runs(targets):
+    """The (trial directory, run file) pairs the figures of `targets` read, in a stable order."""
+    return sorted({(trial, run) for spec, trial in targets for run in spec.runs})
+
+
+def sweep_targets(trialDirs, names=None, trials=None):
+    """Return the (spec, trial) pair of every sweep figure to render, selected like figure_targets."""
+    _check_names(names, SWEEPS)
+    return [
+        (spec, spec.trial) for spec in SWEEPS
+        if len(gini_dirs(trialDirs, spec.trial)) > 0
+        and (not names or spec.name in names)
+        and (not trials or spec.trial in trials)
+    ]
+
+
+def sweep_runs(targets, trialDirs):
+    """The (trial directory, run file) pairs the sweep figures of `targets` read, in a stable order."""
+    return sorted({(resultDir, run) for spec, trial in targets for _, resultDir in gini_dirs(trialDirs, trial) for run in spec.runs})
+
+
+def figure_path(spec, trial):
+    return f"{trial}_{spec.name}.pdf"
+
+
+def figure_job(spec, trial, trialData, options=None):
+    """Build the FigureJob of `spec` from the aggregated data of the runs of `trial`.
+
+    Of `options` only the render options `spec` supports are passed on.
+    Raises KeyError when a declared run or metric has not been loaded.
+    """
+    inputs = {}
+    for run in spec.runs:
+        if run not in trialData:
+            raise KeyError(f"{trial}/{run} is missing")
+        runData = trialData[run]
+        inputs[run] = {
+            "x": runData["x"],
+            "y": {yDatName: runData["y"][yDatName] for yDatName in spec.metrics},
+            "yErr": {yDatName: runData["yErr"][yDatName] for yDatName in spec.metrics}
+        }
+        if "yLower" in runData:
+            inputs[run]["yLower"] = {yDatName: runData["yLower"][yDatName] for yDatName in spec.metrics if yDatName in runData["yLower"]}
+            inputs[run]["yUpper"] = {yDatName: runData["yUpper"][yDatName] for yDatName in spec.metrics if yDatName in runData["yUpper"]}
+    kwargs = spec.build(spec, inputs)
+    for name, value in (options or {}).items():
+        if name in spec.options:
+            kwargs[name] = value
+    return FigureJob(spec.render, figure_path(spec, trial), kwargs)
+
+
+def sweep_jobs(targets, trialDirs, trialData, options=None):
+    """Build the FigureJobs of the sweep figures of `targets`.
+
+    The runs and metrics of all figures of a trial are stacked into a single
+    GiniSweep once, which every figure of that trial then slices.
+    """
+    sweeps = {}
+    jobs = []
+    for spec, trial in targets:
+        if trial not in sweeps:
+            specs = [other for other, otherTrial in targets if otherTrial == trial]
+            runs = list(dict.fromkeys(run for other in specs for run in other.runs))
+            metrics = list(dict.fromkeys(metric for other in specs for metric in other.metrics))
+            sweeps[trial] = gini_sweep(trialData, trialDirs, trial, runs, metrics)
+        kwargs = spec.build(spec, sweeps[trial])
+        for name, value in (options or {}).items():
+            if name in spec.options:
+                kwargs[name] = value
+        jobs.append(FigureJob(spec.render, figure_path(spec, trial), kwargs))
+    return jobs
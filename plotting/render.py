@@ -0,0 +1,150 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from plotting.instrument import PROFILER, init_worker, worker_settings
+
+# A figure to render: `render(path, **kwargs)` from plotting.figures, with
+# kwargs holding only already aggregated arrays and plotting parameters.
+FigureJob = namedtuple("FigureJob", ["render", "path", "kwargs"])
+
+
+def _init_worker(instrumentSettings):
+    import matplotlib
+    matplotlib.use("Agg")
+    init_worker(*instrumentSettings)
+
+
+def _render(job):
+    start = time.perf_counter()
+    with PROFILER.stage("render"):
+        job.render(job.path, **job.kwargs)
+    if PROFILER.enabled:
+        PROFILER.add_figure(job.path, time.perf_counter() - start)
+    return job.path
+
+
+def _render_job(job):
+    path = _render(job)
+    return path, PROFILER.take() if PROFILER.enabled else None
+
+
+def _hash_value(digest, value):
+    # Type tags keep e.g. the list [1, 2] and the string "[1, 2]" apart
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        if value.dtype == object:
+            value = value.astype(str)
+        digest.update(f"ndarray:{value.dtype.str}:{value.shape}:".encode())
+        digest.update(value.tobytes())
+    elif isinstance(value, dict):
+        digest.update(f"dict:{len(value)}:".encode())
+        for key in sorted(value):
+            _hash_value(digest, key)
+            _hash_value(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}:{len(value)}:".encode())
+        for item in value:
+            _hash_value(digest, item)
+    else:
+        digest.update(f"{type(value).__name__}:{value!r};".encode())
+
+
+@functools.lru_cache(maxsize=None)
+def render_sources(render):
+    """The source code a render function draws with.
+
+    That is its own source, that of the private helpers of its module and
+    the whole source of the other plotting modules it takes functions from,
+    such as plotting.downsample.
+    """
+    module = inspect.getmodule(render)
+    helpers = []
+    modules = set()
+    for name, value in sorted(vars(module).items()):
+        if not inspect.isfunction(value) or not value.__module__.startswith("plotting."):
+            continue
+        if value.__module__ != module.__name__:
+            modules.add(value.__module__)
+        elif name.startswith("_"):
+            helpers.append(inspect.getsource(value))
+    return [inspect.getsource(render)] + helpers + [inspect.getsource(sys.modules[name]) for name in sorted(modules)]
+
+
+def fingerprint(job):
+    """Hash everything the output of `job` depends on.
+
+    That is the aggregated arrays and plotting parameters in its kwargs, the
+    source of its render function and of the helpers it draws with (see
+    render_sources), so restyling one figure only invalidates that figure
+    while changing a shared helper invalidates all of them, and the
+    matplotlib version.
+    """
+    import matplotlib
+
+    digest = hashlib.sha256()
+    _hash_value(digest, [job.render.__module__, job.render.__qualname__, render_sources(job.render), matplotlib.__version__])
+    _hash_value(digest, job.kwargs)
+    return digest.hexdigest()
+
+
+class FigureManifest:
+    """JSON file mapping the path of every rendered figure to the fingerprint it was rendered from."""
+
+    def __init__(self, manifestPath):
+        self.manifestPath = manifestPath
+        self.fingerprints = {}
+        try:
+            with open(manifestPath) as f:
+                self.fingerprints = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def is_current(self, path, figureFingerprint):
+        return self.fingerprints.get(path) == figureFingerprint and os.path.exists(path)
+
+    def record(self, path, figureFingerprint):
+        self.fingerprints[path] = figureFingerprint
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.manifestPath) or ".", exist_ok=True)
+        tmpPath = f"{self.manifestPath}.{os.getpid()}.tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(self.fingerprints, f, indent=2, sort_keys=True)
+        os.replace(tmpPath, self.manifestPath)
+
+
+def render_figures(jobs, nOfJobs=1, manifest=None):
+    """Render every FigureJob, concurrently in `nOfJobs` Agg worker processes when more than one.
+
+    With a FigureManifest, jobs whose figure already exists with the same
+    fingerprint are skipped. Returns the paths that were rendered.
+    """
+    if manifest is not None:
+        with PROFILER.stage("fingerprint"):
+            fingerprints = {job.path: fingerprint(job) for job in jobs}
+        jobs = [job for job in jobs if not manifest.is_current(job.path, fingerprints[job.path])]
+
+    if nOfJobs <= 1 or len(jobs) <= 1:
+        paths = [_render(job) for job in jobs]
+    else:
+        paths = []
+        with ProcessPoolExecutor(max_workers=min(nOfJobs, len(jobs)), initializer=_init_worker, initargs=(worker_settings(),)) as executor:
+            for path, snapshot in executor.map(_render_job, jobs):
+                paths.append(path)
+                if snapshot is not None:
+                    PROFILER.merge(snapshot)
+
+    if manifest is not None and len(paths) > 0:
+        for path in paths:
+            manifest.record(path, fingerprints[path])
+        manifest.save()
+    return paths
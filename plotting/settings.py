@@ -0,0 +1,98 @@
+import re
+
+import numpy as np
+
+# AlgoSettings.toFileName() writes "${hopCount}_${maxNumberOfInvites}_${percentageOfLeaders}"
+ALGO_SETTINGS_DTYPE = np.dtype([
+    ("hopCount", np.int32),
+    ("maxNumberOfInvites", np.int32),
+    ("percentageOfLeaders", np.float64)
+])
+
+# The NodeTypes enum of GraphHolder.kt, a node type is stored as its index in here
+NODE_TYPES = ["ParticipantDisc", "CoinWasher", "Revive", "Normal"]
+NODE_TYPE_DTYPE = np.dtype([("nodeType", np.uint8)])
+
+
+def _algo_settings(string):
+    # The (hopCount, maxNumberOfInvites, percentageOfLeaders) of one settings string
+    parts = string.split("_")
+    if len(parts) != len(ALGO_SETTINGS_DTYPE.names):
+        raise ValueError(f"Settings {string!r} are not of the form hopCount_maxNumberOfInvites_percentageOfLeaders")
+    try:
+        return int(parts[0]), int(parts[1]), float(parts[2])
+    except ValueError:
+        raise ValueError(f"Settings {string!r} do not hold an integer hopCount and maxNumberOfInvites and a percentageOfLeaders") from None
+
+
+def decode_algo_settings(strings):
+    """Decode AlgoSettings.toFileName() strings into ALGO_SETTINGS_DTYPE records, checking every string on its own."""
+    # A run file repeats the same few settings for every seed
+    unique, inverse = np.unique(np.asarray(strings, dtype=str), return_inverse=True)
+    return np.array([_algo_settings(string) for string in unique.tolist()], dtype=ALGO_SETTINGS_DTYPE)[inverse]
+
+
+def encode_node_types(strings):
+    """Dictionary-encode node type names to their NODE_TYPES index."""
+    names, inverse = np.unique(np.asarray(strings, dtype=str), return_inverse=True)
+    unknown = [str(name) for name in names if name not in NODE_TYPES]
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown node types {unknown}")
+
+    records = np.empty(len(strings), dtype=NODE_TYPE_DTYPE)
+    records["nodeType"] = np.array([NODE_TYPES.index(name) for name in names], dtype=np.uint8)[inverse]
+    return records
+
+
+def decode_settings(trial, strings):
+    """Decode the `settings:` strings of the blocks of one run file into a structured array.
+
+    Returns None for trials whose settings line does not hold settings, such
+    as the sample times of the dynamic trials.
+    """
+    if trial == "STATIC_REBALANCING_COMPARISON":
+        return encode_node_types(strings)
+    if trial in ("PART_DISC", "SCORE_VS_PERC_LEADERS"):
+        if len(strings) == 0:
+            return np.empty(0, dtype=ALGO_SETTINGS_DTYPE)
+        return decode_algo_settings(strings)
+    return None
+
+
+def settings_error(trial, strings):
+    """Why decode_settings cannot decode the `settings:` strings of `trial`, None when it can."""
+    try:
+        decode_settings(trial, strings)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def is_dynamic(trial):
+    return "DYNAMIC_REBALANCING_COMPARISON" in trial
+
+
+def split_result_dir(resultDir):
+    """Return the trial and Gini coefficient of a result directory, main.kt writes one dynamic directory per coefficient."""
+    match = re.fullmatch(r"(.*)_(\d+(?:\.\d+)?)", resultDir)
+    if is_dynamic(resultDir) and match is not None:
+        return match.group(1), float(match.group(2))
+    return resultDir, None
+
+
+def x_field(trial, run):
+    """The settings column a run file of `trial` is plotted against, if any."""
+    if trial == "PART_DISC" and "hopCount" in run:
+        return "hopCount"
+    elif trial == "PART_DISC" and "maxNumberOfInvites" in run:
+        return "maxNumberOfInvites"
+    elif trial == "SCORE_VS_PERC_LEADERS" and "percentageLeaders" in run:
+        return "percentageOfLeaders"
+    elif trial == "STATIC_REBALANCING_COMPARISON":
+        return "nodeType"
+    return None
+
+
+def node_type_names(codes):
+    return np.array(NODE_TYPES, dtype=object)[codes]
+
@@ -0,0 +1,225 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+
+# The most (row, resample, sample) triples bootstrap_ci multiplies at once
+MAX_CHUNK_ELEMENTS = 2**22
+
+# Per-x outcome of comparing one metric of two runs, `pWelch` and
+# `pMannWhitney` are two-sided p-values
+TestResult = namedtuple("TestResult", ["x", "meanDifference", "t", "pWelch", "u", "pMannWhitney"])
+
+_lgamma = np.vectorize(math.lgamma, otypes=[np.double])
+_erfc = np.vectorize(math.erfc, otypes=[np.double])
+
+
+def sample_matrix(xRuns, yRuns, metrics):
+    """Group the samples of `metrics` by their x value into one row per (metric, x), padded with NaN.
+
+    Returns (x, count, samples): the sorted unique x values, the number of
+    samples per x and a (len(metrics) * len(x), max(count)) matrix whose
+    first len(x) rows hold the first metric. The samples of a row are in
+    the order of the blocks, so row i of two runs with the same x holds the
+    same seeds.
+    """
+    order = np.argsort(xRuns, kind="stable")
+    sortedX = xRuns[order]
+    starts = np.flatnonzero(np.concatenate(([True], sortedX[1:] != sortedX[:-1])))
+    count = np.diff(np.append(starts, sortedX.shape[0]))
+    x = sortedX[starts]
+
+    group = np.repeat(np.arange(x.shape[0]), count)
+    column = np.arange(sortedX.shape[0]) - np.repeat(starts, count)
+    samples = np.full((len(metrics) * x.shape[0], count.max(initial=0)), np.nan)
+    for k, metric in enumerate(metrics):
+        samples[k * x.shape[0] + group, column] = yRuns[metric][order]
+    return x, count, samples
+
+
+def _resample_weights(rng, nOfSamples, nOfResamples, resamplesPerChunk):
+    # Yields (first resample, weights) for chunks of at most `resamplesPerChunk` resamples. The picks are drawn
+    # as int64, which takes whole outputs of `rng`, so they do not depend on the chunk size
+    for first in range(0, nOfResamples, resamplesPerChunk):
+        size = min(resamplesPerChunk, nOfResamples - first)
+        picks = rng.integers(0, nOfSamples, size=(size, nOfSamples), dtype=np.int64)
+        picks += nOfSamples * np.arange(size)[:, None]
+        yield first, np.bincount(picks.ravel(), minlength=size * nOfSamples).reshape(size, nOfSamples) / nOfSamples
+
+
+def bootstrap_ci(samples, count, confidence=0.95, nOfResamples=1000, seed=0, maxElements=MAX_CHUNK_ELEMENTS):
+    """Percentile bootstrap confidence interval of the mean of every row of `samples`.
+
+    Row i holds count[i] samples followed by NaN padding. A resample is drawn
+    as how often each of the count[i] samples is picked, shared by all rows
+    with the same count, so the resampled means of a chunk of rows are a
+    single matrix product. Rows and resamples are chunked so that a chunk
+    multiplies at most `maxElements` (row, resample, sample) triples. The
+    same `seed` always draws the same resamples, whatever the chunk sizes.
+    Returns (lower, upper), NaN for rows without samples.
+    """
+    rng = np.random.default_rng(seed)
+    count = np.broadcast_to(count, (samples.shape[0],))
+    lower = np.full(samples.shape[0], np.nan)
+    upper = np.full(samples.shape[0], np.nan)
+    alpha = (1 - confidence) / 2
+
+    for nOfSamples in np.unique(count[count > 0]):
+        resamplesPerChunk = int(min(nOfResamples, max(1, maxElements // nOfSamples)))
+        rowsPerChunk = int(max(1, maxElements // (resamplesPerChunk * nOfSamples)))
+        rows = np.flatnonzero(count == nOfSamples)
+        state = rng.bit_generator.state
+        for start in range(0, rows.shape[0], rowsPerChunk):
+            chunk = rows[start:start + rowsPerChunk]
+            rowSamples = samples[chunk, :nOfSamples]
+            means = np.empty((chunk.shape[0], nOfResamples))
+            # Every chunk of rows redraws the same resamples
+            rng.bit_generator.state = state
+            for first, weights in _resample_weights(rng, nOfSamples, nOfResamples, resamplesPerChunk):
+                means[:, first:first + weights.shape[0]] = rowSamples @ weights.T
+            lower[chunk], upper[chunk] = np.quantile(means, [alpha, 1 - alpha], axis=1)
+    return lower, upper
+
+
+def _betainc(a, b, x, nOfIterations=200):
+    # Regularized incomplete beta function with the continued fraction of Numerical Recipes (betacf), elementwise
+    a, b, x = np.broadcast_arrays(np.asarray(a, dtype=np.double), np.asarray(b, dtype=np.double), np.asarray(x, dtype=np.double))
+    # The continued fraction converges fast for x < (a + 1) / (a + b + 2), use I_x(a, b) = 1 - I_(1 - x)(b, a) otherwise
+    flip = x > (a + 1) / (a + b + 2)
+    a, b, x = np.where(flip, b, a), np.where(flip, a, b), np.where(flip, 1 - x, x)
+
+    tiny = 1e-300
+    c = np.ones_like(x)
+    d = 1 - (a + b) * x / (a + 1)
+    d = 1 / np.where(np.abs(d) < tiny, tiny, d)
+    fraction = d
+    for m in range(1, nOfIterations + 1):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))
+        ):
+            d = 1 + numerator * d
+            d = 1 / np.where(np.abs(d) < tiny, tiny, d)
+            c = 1 + numerator / c
+            c = np.where(np.abs(c) < tiny, tiny, c)
+            fraction = fraction * d * c
+        if np.all(np.abs(d * c - 1) < 1e-12):
+            break
+
+    with np.errstate(divide="ignore"):
+        front = np.exp(_lgamma(a + b) - _lgamma(a) - _lgamma(b) + a * np.log(x) + b * np.log1p(-x)) / a
+    result = np.where(x <= 0, 0., front * fraction)
+    return np.where(flip, 1 - result, result)
+
+
+def _row_moments(samples, count):
+    valid = ~np.isnan(samples)
+    mean = np.sum(samples, axis=1, where=valid) / count
+    deviation = np.where(valid, samples - mean[:, None], 0.)
+    return mean, np.sum(deviation * deviation, axis=1) / (count - 1)
+
+
+def welch_t_test(a, countA, b, countB):
+    """Welch's unequal variances t-test between every row of `a` and the same row of `b`, returns (t, two-sided p)."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        meanA, varianceA = _row_moments(a, countA)
+        meanB, varianceB = _row_moments(b, countB)
+        errorA, errorB = varianceA / countA, varianceB / countB
+        t = (meanA - meanB) / np.sqrt(errorA + errorB)
+        df = (errorA + errorB) ** 2 / (errorA ** 2 / (countA - 1) + errorB ** 2 / (countB - 1))
+        p = _betainc(df / 2, 0.5, df / (df + t * t))
+    return t, np.where(np.isfinite(t), p, np.nan)
+
+
+def mann_whitney_u(a, countA, b, countB):
+    """Two-sided Mann-Whitney U test between every row of `a` and the same row of `b`.
+
+    All rows are ranked with a single sort along the rows. The p-value uses
+    the normal approximation with tie and continuity correction. Returns
+    (U of `a`, p).
+    """
+    pooled = np.concatenate((a, b), axis=1)
+    order = np.argsort(pooled, axis=1)
+    # The NaN padding sorts last, so the position of every sample in its sorted row is its rank - 1
+    row, position = np.nonzero(~np.isnan(np.take_along_axis(pooled, order, axis=1)))
+    values = pooled[row, order[row, position]]
+    fromA = order[row, position] < a.shape[1]
+
+    # Ties share the average of the ranks they span within their row
+    tieStarts = np.flatnonzero(np.concatenate(([True], (row[1:] != row[:-1]) | (values[1:] != values[:-1]))))
+    tieSize = np.diff(np.append(tieStarts, row.shape[0]))
+    rank = np.repeat(position[tieStarts] + (tieSize + 1) / 2, tieSize)
+
+    nOfRows = a.shape[0]
+    rankSumA = np.bincount(row[fromA], weights=rank[fromA], minlength=nOfRows)
+    tieTerm = np.bincount(row[tieStarts], weights=tieSize ** 3 - tieSize, minlength=nOfRows)
+
+    n = countA + countB
+    u = rankSumA - countA * (countA + 1) / 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sigma = np.sqrt(countA * countB / 12 * ((n + 1) - tieTerm / (n * (n - 1))))
+        z = (np.abs(u - countA * countB / 2) - 0.5) / sigma
+        p = np.minimum(_erfc(np.maximum(z, 0) / math.sqrt(2)), 1.)
+    return u, np.where(sigma > 0, p, np.nan)
+
+
+def _check_samples(runData):
+    if runData["xRuns"].shape[0] == 0 and "stats" in runData:
+        raise ValueError("Confidence intervals and tests need the samples of every seed, which --streaming does not keep")
+
+
+def confidence_bands(runData, metrics, confidence=0.95, nOfResamples=1000, seed=0):
+    """Bootstrap confidence intervals of the mean of `metrics` at every x of an aggregated run.
+
+    Returns (yLower, yUpper), dicts of arrays aligned with runData["x"] like
+    "y" and "yErr", to be shaded with fill_between instead of y ± yErr.
+    """
+    _check_samples(runData)
+    x, count, samples = sample_matrix(runData["xRuns"], runData["yRuns"], metrics)
+    lower, upper = bootstrap_ci(samples, np.tile(count, len(metrics)), confidence, nOfResamples, seed)
+    nOfX = x.shape[0]
+    return (
+        {metric: lower[k * nOfX:(k + 1) * nOfX] for k, metric in enumerate(metrics)},
+        {metric: upper[k * nOfX:(k + 1) * nOfX] for k, metric in enumerate(metrics)}
+    )
+
+
+def run_quantiles(runData, metrics, levels):
+    """The quantiles `levels` of the samples of `metrics` at every x of an aggregated run, as {metric: {level: array}}.
+
+    Runs ingested with --streaming have no samples, their quantiles come
+    from the QuantileSketch of their OnlineStats instead, which is within
+    its relative accuracy of the exact one.
+    """
+    if "stats" in runData:
+        stats = runData["stats"]
+        return {metric: {level: stats.quantile(metric, level) for level in levels} for metric in metrics if metric in stats.sketches}
+
+    x, count, samples = sample_matrix(runData["xRuns"], runData["yRuns"], metrics)
+    quantiles = np.nanquantile(samples, levels, axis=1)
+    nOfX = x.shape[0]
+    return {metric: {level: quantiles[i, k * nOfX:(k + 1) * nOfX] for i, level in enumerate(levels)} for k, metric in enumerate(metrics)}
+
+
+def compare_runs(runDataA, runDataB, metrics):
+    """Test at every x both runs have whether the mean of every metric in `metrics` differs, returns a TestResult per metric."""
+    _check_samples(runDataA)
+    _check_samples(runDataB)
+    xA, countA, samplesA = sample_matrix(runDataA["xRuns"], runDataA["yRuns"], metrics)
+    xB, countB, samplesB = sample_matrix(runDataB["xRuns"], runDataB["yRuns"], metrics)
+    x, keptA, keptB = np.intersect1d(xA, xB, assume_unique=True, return_indices=True)
+
+    # Every metric takes len(x) rows, so all of them are tested at once
+    rowsA = (keptA + xA.shape[0] * np.arange(len(metrics))[:, None]).ravel()
+    rowsB = (keptB + xB.shape[0] * np.arange(len(metrics))[:, None]).ravel()
+    countA, countB = np.tile(countA[keptA], len(metrics)), np.tile(countB[keptB], len(metrics))
+    t, pWelch = welch_t_test(samplesA[rowsA], countA, samplesB[rowsB], countB)
+    u, pMannWhitney = mann_whitney_u(samplesA[rowsA], countA, samplesB[rowsB], countB)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        difference = _row_moments(samplesA[rowsA], countA)[0] - _row_moments(samplesB[rowsB], countB)[0]
+
+    nOfX = x.shape[0]
+    return {
+        metric: TestResult(x, *(values[k * nOfX:(k + 1) * nOfX] for values in (difference, t, pWelch, u, pMannWhitney)))
+        for k, metric in enumerate(metrics)
+    }
@@ -0,0 +1,298 @@
+"""SQLite store of the parsed results of an app/output_files tree.
+
+    python -m plotting.store app/output_files app/results.sqlite
+
+imports every run file that changed since the last import. Samples are
+stored as generate_plots.py uses them: the settings of the non-dynamic
+trials decoded, the dynamic runs aligned onto the sampling grid.
+"""
+import argparse
+import os
+import re
+import sqlite3
+
+import numpy as np
+
+from plotting.parsing import ParsedRun, describe_skipped, read_run
+from plotting.ragged import RaggedRuns
+from plotting.settings import NODE_TYPES, decode_settings, is_dynamic, split_result_dir, x_field
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    trial TEXT NOT NULL,
+    resultDir TEXT NOT NULL,
+    run TEXT NOT NULL,
+    nodeType TEXT,
+    gini REAL,
+    size INTEGER NOT NULL,
+    mtimeNs INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    UNIQUE (resultDir, run)
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    id INTEGER PRIMARY KEY,
+    runId INTEGER NOT NULL,
+    blockIndex INTEGER NOT NULL,
+    settings TEXT NOT NULL,
+    hopCount INTEGER,
+    maxNumberOfInvites INTEGER,
+    percentageOfLeaders REAL,
+    nodeType TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+    blockId INTEGER NOT NULL,
+    metricId INTEGER NOT NULL,
+    x REAL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS runsByTrial ON runs (trial, nodeType, gini);
+CREATE INDEX IF NOT EXISTS blocksBySetting ON blocks (runId, nodeType, hopCount, maxNumberOfInvites, percentageOfLeaders);
+"""
+
+# Maintaining these while inserting takes longer than building them afterwards, see import_tree
+SAMPLE_INDEXES = """
+CREATE INDEX IF NOT EXISTS samplesByMetric ON samples (metricId, x);
+CREATE INDEX IF NOT EXISTS samplesByBlock ON samples (blockId, metricId);
+"""
+
+ALGO_SETTINGS = ["hopCount", "maxNumberOfInvites", "percentageOfLeaders"]
+
+# What `ResultStore.samples` returns, one record per sample
+SAMPLE_DTYPE = np.dtype([
+    ("resultDir", object),
+    ("run", object),
+    ("nodeType", object),
+    ("gini", np.float64),
+    ("hopCount", np.float64),
+    ("maxNumberOfInvites", np.float64),
+    ("percentageOfLeaders", np.float64),
+    ("block", np.int64),
+    ("x", np.float64),
+    ("value", np.float64)
+])
+
+
+def _run_node_type(resultDir, run):
+    # The dynamic trial writes data_<NodeTypes>.csv
+    match = re.fullmatch(r"data_(\w+)\.csv", run)
+    if is_dynamic(resultDir) and match is not None:
+        return match.group(1)
+    return None
+
+
+class ResultStore:
+    """Indexed SQLite copy of the run files of one or more output trees.
+
+    `runs` holds one row per run file, `blocks` one per `settings:` block
+    with its decoded settings and `samples` one per (block, metric, x).
+    Every NULL column means the setting does not apply to that trial.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA cache_size = -262144")
+        self.connection.executescript(SCHEMA + SAMPLE_INDEXES)
+
+    def close(self):
+        self.connection.close()
+
+    def _metric_id(self, name):
+        self.connection.execute("INSERT OR IGNORE INTO metrics (name) VALUES (?)", (name,))
+        return self.connection.execute("SELECT id FROM metrics WHERE name = ?", (name,)).fetchone()[0]
+
+    def _delete_run(self, runId):
+        self.connection.execute("DELETE FROM samples WHERE blockId IN (SELECT id FROM blocks WHERE runId = ?)", (runId,))
+        self.connection.execute("DELETE FROM blocks WHERE runId = ?", (runId,))
+        self.connection.execute("DELETE FROM runs WHERE id = ?", (runId,))
+
+    def _stored_run(self, resultDir, run):
+        return self.connection.execute("SELECT id, size, mtimeNs FROM runs WHERE resultDir = ? AND run = ?", (resultDir, run)).fetchone()
+
+    def is_current(self, path, resultDir, run):
+        stat = os.stat(path)
+        row = self._stored_run(resultDir, run)
+        return row is not None and row[1:] == (stat.st_size, stat.st_mtime_ns)
+
+    def import_run(self, path, resultDir, run):
+        """(Re)import one run file, returns False when it is unchanged since its last import.
+
+        Corrupt blocks are left out and printed, see plotting.parsing.complete_blocks.
+        """
+        if self.is_current(path, resultDir, run):
+            return False
+        stat = os.stat(path)
+        row = self._stored_run(resultDir, run)
+
+        raw = read_run(path, resultDir)
+        for line in describe_skipped(path, raw.skipped):
+            print(line)
+        trial, gini = split_result_dir(resultDir)
+        runNodeType = _run_node_type(resultDir, run)
+        blockSettings = [dict.fromkeys(ALGO_SETTINGS + ["nodeType"]) for _ in range(raw.blocks)]
+
+        if is_dynamic(resultDir):
+            aligned = RaggedRuns.from_lengths(raw.xRuns, raw.yRuns, raw.lengths).align()
+            x, yRuns, blockOf = aligned.x, aligned.y, aligned.run_index()
+            # The settings line holds the sample times, which are in `x` already
+            settingsStrings = [""] * raw.blocks
+            for values in blockSettings:
+                values["nodeType"] = runNodeType
+        else:
+            settingsStrings = raw.settings
+            settings = decode_settings(resultDir, raw.settings)
+            field = x_field(resultDir, run)
+            x = settings[field].astype(np.float64) if settings is not None and field is not None else np.full(raw.blocks, np.nan)
+            yRuns, blockOf = raw.yRuns, np.arange(raw.blocks)
+            for name in (settings.dtype.names if settings is not None else ()):
+                for i, value in enumerate(settings[name].tolist()):
+                    blockSettings[i][name] = NODE_TYPES[value] if name == "nodeType" else value
+            for yDatName, values in yRuns.items():
+                if values.shape[0] != raw.blocks:
+                    raise ValueError(f"{path}: {yDatName} does not have one value per block")
+
+        with self.connection:
+            if row is not None:
+                self._delete_run(row[0])
+            runId = self.connection.execute(
+                "INSERT INTO runs (trial, resultDir, run, nodeType, gini, size, mtimeNs, offset) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (trial, resultDir, run, runNodeType, gini, stat.st_size, stat.st_mtime_ns, raw.offset)
+            ).lastrowid
+            self.connection.executemany(
+                "INSERT INTO blocks (runId, blockIndex, settings, hopCount, maxNumberOfInvites, percentageOfLeaders, nodeType) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(runId, i, settingsStrings[i], *(values[name] for name in ALGO_SETTINGS), values["nodeType"]) for i, values in enumerate(blockSettings)]
+            )
+            blockIds = np.array([blockId for blockId, in self.connection.execute("SELECT id FROM blocks WHERE runId = ? ORDER BY blockIndex", (runId,))], dtype=np.int64)
+
+            for yDatName, values in yRuns.items():
+                metricId = self._metric_id(yDatName)
+                self.connection.executemany(
+                    "INSERT INTO samples (blockId, metricId, x, value) VALUES (?, ?, ?, ?)",
+                    zip(blockIds[blockOf].tolist(), [metricId] * values.shape[0], x.tolist(), values.tolist())
+                )
+        return True
+
+    def import_tree(self, topDir):
+        """Import every run file of `topDir` that changed and drop the runs whose file is gone.
+
+        When the import at least doubles the stored data, the sample indexes
+        are dropped during the import and rebuilt afterwards. Returns the
+        number of imported run files.
+        """
+        present = set()
+        changed = []
+        for resultDir in sorted(os.listdir(topDir)):
+            for run in sorted(os.listdir(os.path.join(topDir, resultDir))):
+                path = os.path.join(topDir, resultDir, run)
+                present.add((resultDir, run))
+                if not self.is_current(path, resultDir, run):
+                    changed.append((path, resultDir, run))
+
+        with self.connection:
+            for runId, resultDir, run in self.connection.execute("SELECT id, resultDir, run FROM runs").fetchall():
+                if (resultDir, run) not in present:
+                    self._delete_run(runId)
+
+        storedSize = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM runs").fetchone()[0]
+        bulk = sum(os.path.getsize(path) for path, _, _ in changed) >= storedSize
+        if bulk:
+            self.connection.executescript("DROP INDEX IF EXISTS samplesByMetric; DROP INDEX IF EXISTS samplesByBlock;")
+        try:
+            for path, resultDir, run in changed:
+                self.import_run(path, resultDir, run)
+        finally:
+            if bulk:
+                self.connection.executescript(SAMPLE_INDEXES)
+        return len(changed)
+
+    def result_dirs(self):
+        return [resultDir for resultDir, in self.connection.execute("SELECT DISTINCT resultDir FROM runs ORDER BY resultDir")]
+
+    def runs(self):
+        """The (result directory, run file) of every stored run."""
+        return self.connection.execute("SELECT resultDir, run FROM runs ORDER BY resultDir, run").fetchall()
+
+    def parsed_run(self, resultDir, run):
+        """Return the ParsedRun of a stored run, equal to what load_run returns for its file.
+
+        The corrupt blocks the import left out were reported then and are not listed again.
+        """
+        row = self.connection.execute("SELECT id, offset FROM runs WHERE resultDir = ? AND run = ?", (resultDir, run)).fetchone()
+        if row is None:
+            raise KeyError(f"{resultDir}/{run} is not in {self.path}")
+        runId, offset = row
+
+        settingsStrings = [settings for settings, in self.connection.execute("SELECT settings FROM blocks WHERE runId = ? ORDER BY blockIndex", (runId,))]
+        samples = np.fromiter(self.connection.execute(
+            "SELECT s.metricId, s.x, s.value FROM samples s JOIN blocks b ON s.blockId = b.id WHERE b.runId = ? ORDER BY s.rowid",
+            (runId,)
+        ), dtype=[("metricId", np.int64), ("x", np.float64), ("value", np.float64)])
+        names = dict(self.connection.execute("SELECT id, name FROM metrics"))
+        metricIds = list(dict.fromkeys(samples["metricId"].tolist()))
+        yRuns = {names[metricId]: samples["value"][samples["metricId"] == metricId] for metricId in metricIds}
+
+        if is_dynamic(resultDir):
+            xRuns = samples["x"][samples["metricId"] == metricIds[0]] if len(metricIds) > 0 else np.empty(0)
+            return ParsedRun(xRuns, yRuns, None, len(settingsStrings), offset, [])
+
+        settings = decode_settings(resultDir, settingsStrings)
+        field = x_field(resultDir, run)
+        xRuns = settings[field] if settings is not None and field is not None else np.empty(0)
+        return ParsedRun(xRuns, yRuns, settings, len(settingsStrings), offset, [])
+
+    def samples(self, metric, trial=None, nodeType=None, gini=None, x=None, **settings):
+        """Return every stored sample of `metric` matching the given columns as a SAMPLE_DTYPE array.
+
+        `trial` is the Trials name, e.g. DYNAMIC_REBALANCING_COMPARISON for
+        all its Gini coefficients, and `settings` can restrict hopCount,
+        maxNumberOfInvites and percentageOfLeaders. `x` is the sample time
+        in ms of the dynamic trials and the plotted setting otherwise, e.g.
+        the successRatio at t=600s across all Gini coefficients and node
+        types is `samples("successRatio", "DYNAMIC_REBALANCING_COMPARISON", x=600000)`.
+        """
+        unknown = set(settings) - set(ALGO_SETTINGS)
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown settings {sorted(unknown)}")
+
+        conditions = ["m.name = ?"]
+        parameters = [metric]
+        for column, value in [("r.trial", trial), ("b.nodeType", nodeType), ("r.gini", gini), ("s.x", x)] + [(f"b.{name}", value) for name, value in settings.items()]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+
+        rows = self.connection.execute(
+            "SELECT r.resultDir, r.run, b.nodeType, r.gini, b.hopCount, b.maxNumberOfInvites, b.percentageOfLeaders, b.blockIndex, s.x, s.value "
+            "FROM samples s JOIN metrics m ON s.metricId = m.id JOIN blocks b ON s.blockId = b.id JOIN runs r ON b.runId = r.id "
+            f"WHERE {' AND '.join(conditions)} ORDER BY s.rowid",
+            parameters
+        ).fetchall()
+
+        result = np.empty(len(rows), dtype=SAMPLE_DTYPE)
+        for name, column in zip(SAMPLE_DTYPE.names, zip(*rows)):
+            # NULL becomes NaN in the float columns
+            result[name] = np.array(column, dtype=SAMPLE_DTYPE[name])
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import an app/output_files tree into a SQLite results store")
+    parser.add_argument("topDir", help="directory holding the trial directories")
+    parser.add_argument("database", help="SQLite file to create or update")
+    args = parser.parse_args()
+
+    store = ResultStore(args.database)
+    try:
+        nOfImported = store.import_tree(args.topDir)
+    finally:
+        store.close()
+    print(f"Imported {nOfImported} run files into {args.database}")
+
+
+if __name__ == "__main__":
+    main()
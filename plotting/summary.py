@@ -0,0 +1,98 @@
+import csv
+import json
+
+import numpy as np
+
+from plotting.settings import node_type_names, x_field
+
+# Runs with more x values than this only show their first and last rows in the text summary
+TEXT_ROWS = 10
+
+
+def _metrics(runData, metrics=None):
+    return [yDatName for yDatName in (metrics or runData["y"]) if yDatName in runData["y"]]
+
+
+def _x_values(trial, run, runData):
+    # The x values of a run as a list, node types by their name like the figures label them
+    x = np.asarray(runData["x"])
+    if x_field(trial, run) == "nodeType":
+        return node_type_names(x.astype(int)).tolist()
+    return x.tolist()
+
+
+def _quantiles(runData, names):
+    # (column name, metric, level) of every quantile generate_plots.py --quantiles added to the run
+    quantiles = runData.get("quantiles", {})
+    return [(f"{name} q{level:g}", name, level) for name in names if name in quantiles for level in quantiles[name]]
+
+
+def write_text(f, trialData, trialRuns, metrics=None):
+    """Write the mean ± std of every metric per x of every (trial, run) of `trialRuns` as a plain table."""
+    for trial, run in trialRuns:
+        if run not in trialData.get(trial, {}):
+            continue
+        runData = trialData[trial][run]
+        names = _metrics(runData, metrics)
+        quantiles = _quantiles(runData, names)
+        x = _x_values(trial, run, runData)
+        f.write(f"{trial}/{run}\n")
+        f.write("".join([f"{'x':>14}"] + [f"{name:>32}" for name in names] + [f"{column:>36}" for column, _, _ in quantiles]) + "\n")
+
+        rows = list(range(len(x)))
+        if len(x) > TEXT_ROWS:
+            rows = rows[:TEXT_ROWS // 2] + [None] + rows[-(TEXT_ROWS // 2):]
+        for i in rows:
+            if i is None:
+                f.write(f"{'...':>14}  ({len(x) - TEXT_ROWS} more rows)\n")
+                continue
+            cells = [f"{runData['y'][name][i]:.6g} ± {runData['yErr'][name][i]:.3g}" for name in names]
+            quantileCells = [f"{runData['quantiles'][name][level][i]:>36.6g}" for _, name, level in quantiles]
+            xCell = f"{x[i]:>14}" if isinstance(x[i], str) else f"{x[i]:>14.6g}"
+            f.write("".join([xCell] + [f"{cell:>32}" for cell in cells] + quantileCells) + "\n")
+
+        # What the aborted transactions figure used to print for every protocol
+        if len(x) > 0:
+            f.write("".join([f"{'max std':>14}"] + [f"{np.max(runData['yErr'][name]):>32.6g}" for name in names]) + "\n")
+        f.write("\n")
+
+
+def write_csv(f, trialData, trialRuns, metrics=None):
+    """Write one trial,run,metric,x,y,yErr row per aggregated value, followed by a column per --quantiles level."""
+    loaded = [(trial, run) for trial, run in trialRuns if run in trialData.get(trial, {})]
+    levels = sorted({level for trial, run in loaded for byLevel in trialData[trial][run].get("quantiles", {}).values() for level in byLevel})
+    writer = csv.writer(f)
+    writer.writerow(["trial", "run", "metric", "x", "y", "yErr"] + [f"q{level:g}" for level in levels])
+    for trial, run in loaded:
+        runData = trialData[trial][run]
+        for name in _metrics(runData, metrics):
+            byLevel = runData.get("quantiles", {}).get(name, {})
+            columns = [byLevel[level].tolist() if level in byLevel else [""] * len(runData["x"]) for level in levels]
+            for x, y, yErr, *quantiles in zip(_x_values(trial, run, runData), runData["y"][name].tolist(), runData["yErr"][name].tolist(), *columns):
+                writer.writerow([trial, run, name, x, y, yErr] + quantiles)
+
+
+def write_json(f, trialData, trialRuns, metrics=None):
+    """Write {trial: {run: {"x": [...], "y": {metric: [...]}, "yErr": {metric: [...]}}}}.
+
+    Runs with --quantiles also get "quantiles": {metric: {level: [...]}}.
+    """
+    tables = {}
+    for trial, run in trialRuns:
+        if run not in trialData.get(trial, {}):
+            continue
+        runData = trialData[trial][run]
+        names = _metrics(runData, metrics)
+        tables.setdefault(trial, {})[run] = {
+            "x": _x_values(trial, run, runData),
+            "y": {name: runData["y"][name].tolist() for name in names},
+            "yErr": {name: runData["yErr"][name].tolist() for name in names}
+        }
+        quantiles = runData.get("quantiles", {})
+        if len(quantiles) > 0:
+            tables[trial][run]["quantiles"] = {name: {f"{level:g}": values.tolist() for level, values in quantiles[name].items()} for name in names if name in quantiles}
+    json.dump(tables, f, indent=2)
+    f.write("\n")
+
+
+WRITERS = {"text": write_text, "csv": write_csv, "json": write_json}
@@ -0,0 +1,84 @@
+from collections import namedtuple
+
+import numpy as np
+
+from plotting.settings import split_result_dir
+
+# The aggregated dynamic results of every Gini coefficient of a trial as one
+# array. `mean` and `std` have the axes (gini, run, time, metric), where the
+# runs are the node types the simulation compared (data_<NodeTypes>.csv) and
+# time the sample times in ms any directory reached. A run, metric or sample
+# time a directory does not have is NaN.
+GiniSweep = namedtuple("GiniSweep", ["ginis", "resultDirs", "runs", "metrics", "x", "mean", "std"])
+
+# Which part of the simulation counts as the steady state, see steady_state
+STEADY_STATE_FRACTION = 0.2
+
+
+def gini_dirs(trialDirs, trial):
+    """The result directories of `trial` with a Gini coefficient, ordered on it, as (gini, directory) pairs."""
+    ginis = []
+    for resultDir in trialDirs:
+        dirTrial, gini = split_result_dir(resultDir)
+        if gini is not None and dirTrial == trial:
+            ginis.append((gini, resultDir))
+    return sorted(ginis)
+
+
+def gini_sweep(trialData, trialDirs, trial, runs, metrics):
+    """Stack the aggregated `runs` of every Gini coefficient directory of `trial` in `trialData` into a GiniSweep.
+
+    Directories of a simulation that is still running can be shorter than
+    the others, so the time axis holds the sample times of all directories
+    and the shorter ones are padded with NaN.
+    """
+    resultDirs = gini_dirs([resultDir for resultDir in trialDirs if resultDir in trialData], trial)
+    if len(resultDirs) == 0:
+        raise ValueError(f"No result directories of {trial} with a Gini coefficient were loaded")
+
+    xs = [trialData[resultDir][run]["x"] for _, resultDir in resultDirs for run in runs if run in trialData[resultDir]]
+    if len(xs) == 0:
+        raise KeyError(f"None of {', '.join(runs)} are loaded for {trial}")
+    x = xs[0]
+    for other in xs[1:]:
+        x = np.union1d(x, other)
+
+    shape = (len(resultDirs), len(runs), x.shape[0], len(metrics))
+    mean = np.full(shape, np.nan)
+    std = np.full(shape, np.nan)
+    for i, (_, resultDir) in enumerate(resultDirs):
+        for j, run in enumerate(runs):
+            runData = trialData[resultDir].get(run)
+            if runData is None:
+                continue
+            columns = np.searchsorted(x, runData["x"])
+            for k, metric in enumerate(metrics):
+                if metric in runData["y"]:
+                    mean[i, j, columns, k] = runData["y"][metric]
+                    std[i, j, columns, k] = runData["yErr"][metric]
+
+    ginis = np.array([gini for gini, _ in resultDirs])
+    return GiniSweep(ginis, [resultDir for _, resultDir in resultDirs], list(runs), list(metrics), x, mean, std)
+
+
+def steady_state(sweep, fraction=STEADY_STATE_FRACTION):
+    """Average the last `fraction` of the simulated time, returns (mean, std) with the axes (gini, run, metric).
+
+    The window is taken from the sample times every run of every directory
+    reached itself, so a directory that is still running averages the end
+    of what it simulated so far. The std is the average over time of the
+    std between seeds, the spread of a single seed rather than the error
+    of the average.
+    """
+    shape = sweep.mean.shape[:2] + sweep.mean.shape[3:]
+    mean = np.full(shape, np.nan)
+    std = np.full(shape, np.nan)
+    for i in range(shape[0]):
+        for j in range(shape[1]):
+            times = np.flatnonzero(np.any(~np.isnan(sweep.mean[i, j]), axis=1))
+            if times.shape[0] == 0:
+                continue
+            window = times[min(int(times.shape[0] * (1 - fraction)), times.shape[0] - 1):]
+            mean[i, j] = np.mean(sweep.mean[i, j, window], axis=0)
+            std[i, j] = np.mean(sweep.std[i, j, window], axis=0)
+    return mean, std
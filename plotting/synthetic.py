@@ -0,0 +1,150 @@
+"""Write synthetic app/output_files trees in the format of GraphHolder.saveData.
+
+The values only roughly resemble real results, they exist to measure how
+the plotting pipeline scales without hours of simulation:
+
+    python -m plotting.synthetic /tmp/output_files --seeds 100 --samples 1000
+"""
+import argparse
+import os
+
+import numpy as np
+
+from plotting.ragged import SAMPLING_INTERVAL
+
+TRIALS = ["PART_DISC", "SCORE_VS_PERC_LEADERS", "STATIC_REBALANCING_COMPARISON", "DYNAMIC_REBALANCING_COMPARISON"]
+
+# The setting grids of main.kt
+HOP_COUNTS = [1, 5, 10, 15, 20, 25, 30]
+MAX_NUMBERS_OF_INVITES = [1, 5, 10, 15, 20, 25, 30]
+PART_DISC_INVITES = [5, 7, 9]
+PART_DISC_HOP_COUNTS = [3, 4, 5]
+PERCENTAGES_OF_LEADERS = [0.01, 0.05, 0.1, 0.15, 0.2, 0.4, 0.6, 0.8, 1.0]
+STATIC_GRAPHS = ["complete_graph.txt", "difficult_graph.txt", "lightning"]
+STATIC_NODE_TYPES = ["CoinWasher", "Revive"]
+DYNAMIC_NODE_TYPES = ["CoinWasher", "Revive", "Normal"]
+GINI_COEFFICIENTS = [0.225]
+
+
+def _values(values):
+    if values.dtype.kind == "f":
+        # Kotlin prints Floats with about 7 significant digits
+        values = np.round(values, 7)
+    return ",".join(map(str, values.tolist()))
+
+
+def _write_block(f, settings, metrics):
+    f.write(f"settings:{settings}\n")
+    for yDatName, values in metrics.items():
+        f.write(f"{yDatName}:{_values(np.asarray(values))}\n")
+
+
+def _algo_settings(hopCount, maxNumberOfInvites, percentageOfLeaders):
+    # AlgoSettings.toFileName()
+    return f"{hopCount}_{maxNumberOfInvites}_{float(percentageOfLeaders)}"
+
+
+def _write_part_disc(trialDir, nOfSeeds, rng):
+    for maxNumberOfInvites in PART_DISC_INVITES:
+        with open(f"{trialDir}/hopCount_{maxNumberOfInvites}.csv", "w") as f:
+            for _ in range(nOfSeeds):
+                for hopCount in HOP_COUNTS:
+                    participants = rng.binomial(2000, 1 - np.exp(-hopCount * maxNumberOfInvites / 60))
+                    _write_block(f, _algo_settings(hopCount, maxNumberOfInvites, 1.), {"nOfParticipants": [participants]})
+
+    for hopCount in PART_DISC_HOP_COUNTS:
+        with open(f"{trialDir}/maxNumberOfInvites_{hopCount}.csv", "w") as f:
+            for _ in range(nOfSeeds):
+                for maxNumberOfInvites in MAX_NUMBERS_OF_INVITES:
+                    participants = rng.binomial(2000, 1 - np.exp(-hopCount * maxNumberOfInvites / 60))
+                    _write_block(f, _algo_settings(hopCount, maxNumberOfInvites, 1.), {"nOfParticipants": [participants]})
+
+
+def _write_score_vs_perc_leaders(trialDir, nOfSeeds, rng):
+    for maxNumberOfInvites in PART_DISC_INVITES:
+        with open(f"{trialDir}/percentageLeaders_{maxNumberOfInvites}.csv", "w") as f:
+            for _ in range(nOfSeeds):
+                for percentageOfLeaders in PERCENTAGES_OF_LEADERS:
+                    _write_block(f, _algo_settings(3, maxNumberOfInvites, percentageOfLeaders), {
+                        "totalDemandsMet": [rng.poisson(5000 * np.sqrt(percentageOfLeaders))],
+                        "nOfRebalanceMes": [rng.poisson(20000 * percentageOfLeaders * maxNumberOfInvites)]
+                    })
+
+
+def _write_static(trialDir, nOfSeeds, rng):
+    for graphName in STATIC_GRAPHS:
+        scale = 1e4 if graphName == "lightning" else 1.
+        with open(f"{trialDir}/score_{graphName}.csv", "w") as f:
+            for _ in range(nOfSeeds):
+                for nodeType in STATIC_NODE_TYPES:
+                    _write_block(f, nodeType, {
+                        "totalDemandsMet": [rng.poisson(40 * scale)],
+                        "nOfRebalanceMes": [rng.poisson(100 * scale / 10)],
+                        "time": [rng.poisson(5000 * scale / 100)]
+                    })
+
+
+def _write_dynamic(trialDir, nodeType, giniCoefficient, nOfSeeds, nOfSamples, rng):
+    rebalancing = nodeType != "Normal"
+    with open(f"{trialDir}/data_{nodeType}.csv", "w") as f:
+        for _ in range(nOfSeeds):
+            # Runs end at slightly different times and now and then a sampling point has no event
+            cells = np.arange(1, nOfSamples - rng.integers(0, nOfSamples // 10 + 1) + 1)
+            cells = cells[rng.random(cells.shape[0]) > 0.01]
+            n = cells.shape[0]
+            t = cells / max(nOfSamples, 1)
+
+            decay = np.exp(-3 * t) if rebalancing else np.ones(n)
+            _write_block(f, _values((cells * SAMPLING_INTERVAL).astype(np.int64)), {
+                "successRatio": np.clip(0.95 - 0.3 * t * (1.5 - decay) + rng.normal(0, 0.01, n), 0, 1),
+                "networkImbalance": np.clip(giniCoefficient * (0.5 + 0.5 * decay) + rng.normal(0, 0.005, n), 0, 1),
+                "nsOfTxAbortBecauseLocked": np.cumsum(rng.poisson(2. if rebalancing else 0.5, n)),
+                "nsOfTxAbortBecauseNoFunds": np.cumsum(rng.poisson(1. if rebalancing else 3., n)),
+                "nsOfRebalancingInvocations": np.cumsum(rng.poisson(5., n)) if rebalancing else np.zeros(n, dtype=np.int64)
+            })
+
+
+def generate_tree(topDir, trials=TRIALS, nOfSeeds=1, nOfSamples=1000, giniCoefficients=GINI_COEFFICIENTS, seed=0):
+    """Write the run files of `trials` with `nOfSeeds` blocks per setting to `topDir`.
+
+    Dynamic runs get about `nOfSamples` samples each, one result directory
+    per Gini coefficient as main.kt does. Blocks are written one at a time,
+    so the size of the tree is not limited by memory.
+    """
+    rng = np.random.default_rng(seed)
+    for trial in trials:
+        if trial == "DYNAMIC_REBALANCING_COMPARISON":
+            for giniCoefficient in giniCoefficients:
+                trialDir = f"{topDir}/{trial}_{giniCoefficient}"
+                os.makedirs(trialDir, exist_ok=True)
+                for nodeType in DYNAMIC_NODE_TYPES:
+                    _write_dynamic(trialDir, nodeType, giniCoefficient, nOfSeeds, nOfSamples, rng)
+            continue
+
+        trialDir = f"{topDir}/{trial}"
+        os.makedirs(trialDir, exist_ok=True)
+        if trial == "PART_DISC":
+            _write_part_disc(trialDir, nOfSeeds, rng)
+        elif trial == "SCORE_VS_PERC_LEADERS":
+            _write_score_vs_perc_leaders(trialDir, nOfSeeds, rng)
+        elif trial == "STATIC_REBALANCING_COMPARISON":
+            _write_static(trialDir, nOfSeeds, rng)
+        else:
+            raise ValueError(f"Unknown trial {trial}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic app/output_files tree")
+    parser.add_argument("topDir", help="directory to write the trial directories to")
+    parser.add_argument("--trial", action="append", choices=TRIALS, help="only write this trial, can be repeated")
+    parser.add_argument("--seeds", type=int, default=1, help="number of blocks per setting")
+    parser.add_argument("--samples", type=int, default=1000, help="approximate number of samples per dynamic run")
+    parser.add_argument("--gini", type=float, action="append", help="Gini coefficient of a dynamic result directory, can be repeated")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random values")
+    args = parser.parse_args()
+
+    generate_tree(args.topDir, args.trial or TRIALS, args.seeds, args.samples, args.gini or GINI_COEFFICIENTS, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Load the Lightning topology the simulations run on into NumPy arrays, with its graph statistics.
+
+    python -m plotting.topology app/src/main/resources/nodes_05-05-2021.json app/src/main/resources/channels_05-05-2021.json
+
+parses both JSON files like TopologyTranslator.kt does and caches the
+result as .npy files that later loads memory-map.
+"""
+import argparse
+import json
+import os
+import shutil
+from collections import namedtuple
+
+import numpy as np
+
+TOPOLOGY_VERSION = 1
+RESOURCES_DIR = "app/src/main/resources"
+
+# Node i is nodeIds[i] (its public key). Channel c runs between source[c] and
+# target[c] with capacity[c] (NaN when the JSON holds none). The channels of
+# node i are channels[indptr[i]:indptr[i + 1]], and its neighbours over those
+# channels are indices[indptr[i]:indptr[i + 1]]; every channel appears in
+# the lists of both its nodes, as payment channels can be used both ways.
+Topology = namedtuple("Topology", ["nodeIds", "source", "target", "capacity", "indptr", "indices", "channels", "meta"])
+
+ARRAY_KEYS = ["nodeIds", "source", "target", "capacity", "indptr", "indices", "channels"]
+
+
+def _csr(nOfNodes, source, target):
+    ends = np.concatenate((source, target))
+    neighbours = np.concatenate((target, source))
+    channels = np.tile(np.arange(source.shape[0], dtype=np.int32), 2)
+    order = np.argsort(ends, kind="stable")
+    indptr = np.zeros(nOfNodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ends, minlength=nOfNodes), out=indptr[1:])
+    return indptr, neighbours[order].astype(np.int32), channels[order]
+
+
+def parse_topology(nodePath, channelPath):
+    """Parse the node and channel JSON into a Topology.
+
+    Like TopologyTranslator.translate, a node id that occurs again is
+    skipped and so is a channel of which a node is unknown; how many of
+    both there were is kept in `meta`.
+    """
+    with open(nodePath) as f:
+        jsonNodes = json.load(f)
+    with open(channelPath) as f:
+        jsonChannels = json.load(f)
+
+    nodeIndex = {}
+    for jsonNode in jsonNodes:
+        nodeIndex.setdefault(jsonNode["id"], len(nodeIndex))
+
+    ends = np.array([(nodeIndex.get(channel["source"], -1), nodeIndex.get(channel["target"], -1)) for channel in jsonChannels], dtype=np.int32).reshape(-1, 2)
+    matched = np.all(ends >= 0, axis=1)
+    capacity = np.array([float(channel.get("capacity", "nan")) for channel in jsonChannels], dtype=np.float64)
+    source, target, capacity = ends[matched, 0], ends[matched, 1], capacity[matched]
+
+    indptr, indices, channels = _csr(len(nodeIndex), source, target)
+    return Topology(
+        np.array(list(nodeIndex), dtype=bytes), source, target, capacity, indptr, indices, channels,
+        {"duplicateNodes": len(jsonNodes) - len(nodeIndex), "unmatchedChannels": int(np.sum(~matched))}
+    )
+
+
+def _sources_meta(nodePath, channelPath):
+    return {
+        "version": TOPOLOGY_VERSION,
+        "sources": [[os.path.abspath(path), os.stat(path).st_size, os.stat(path).st_mtime_ns] for path in (nodePath, channelPath)]
+    }
+
+
+def load_topology(nodePath, channelPath, cacheDir=None):
+    """Return the Topology of the JSON files, from the .npy cache in `cacheDir` when it is up to date.
+
+    Cached arrays are memory-mapped read-only, so a load only reads the
+    parts of them that are used.
+    """
+    if cacheDir is None:
+        return parse_topology(nodePath, channelPath)
+
+    sourcesMeta = _sources_meta(nodePath, channelPath)
+    metaPath = os.path.join(cacheDir, "meta.json")
+    if os.path.exists(metaPath):
+        with open(metaPath) as f:
+            meta = json.load(f)
+        if {key: meta.get(key) for key in sourcesMeta} == sourcesMeta:
+            arrays = [np.load(os.path.join(cacheDir, f"{key}.npy"), mmap_mode="r") for key in ARRAY_KEYS]
+            return Topology(*arrays, meta["topology"])
+
+    topology = parse_topology(nodePath, channelPath)
+    # Write the whole cache next to it and swap it in, so a reader never sees half of it
+    tmpDir = f"{cacheDir}.tmp{os.getpid()}"
+    os.makedirs(tmpDir, exist_ok=True)
+    for key in ARRAY_KEYS:
+        np.save(os.path.join(tmpDir, f"{key}.npy"), getattr(topology, key))
+    with open(os.path.join(tmpDir, "meta.json"), "w") as f:
+        json.dump(dict(sourcesMeta, topology=topology.meta), f)
+    if os.path.exists(cacheDir):
+        shutil.rmtree(cacheDir)
+    os.replace(tmpDir, cacheDir)
+    return topology
+
+
+def degrees(topology):
+    return np.diff(topology.indptr)
+
+
+def gini(values):
+    """Gini coefficient of the non-negative `values`, NaNs are left out."""
+    values = np.sort(values[~np.isnan(values)])
+    n = values.shape[0]
+    if n == 0 or values.sum() == 0:
+        return float("nan")
+    return float(2 * np.sum(np.arange(1, n + 1) * values) / (n * values.sum()) - (n + 1) / n)
+
+
+def component_labels(topology):
+    """Label every node with the smallest node index of its connected component.
+
+    Every round all nodes take the smallest label among their neighbours at
+    once, after which labels follow their own label (pointer jumping), so
+    the number of rounds grows with the logarithm of the diameter.
+    """
+    labels = np.arange(topology.indptr.shape[0] - 1)
+    while True:
+        smallest = labels.copy()
+        np.minimum.at(smallest, topology.source, labels[topology.target])
+        np.minimum.at(smallest, topology.target, labels[topology.source])
+        while True:
+            jumped = smallest[smallest]
+            if np.array_equal(jumped, smallest):
+                break
+            smallest = jumped
+        if np.array_equal(smallest, labels):
+            return labels
+        labels = smallest
+
+
+def graph_stats(topology):
+    """The topology facts the figure captions quote, as a JSON-serializable dict."""
+    degree = degrees(topology)
+    labels = component_labels(topology)
+    sizes = np.bincount(labels)
+    largest = np.flatnonzero(labels == np.argmax(sizes)) if sizes.shape[0] > 0 else np.empty(0, dtype=np.intp)
+    # The channels of which both nodes are in the largest component, the graph the simulations run on
+    inLargest = np.zeros(degree.shape[0], dtype=bool)
+    inLargest[largest] = True
+    largestChannels = inLargest[topology.source] & inLargest[topology.target]
+    return {
+        "nodes": int(degree.shape[0]),
+        "channels": int(topology.source.shape[0]),
+        "duplicateNodes": topology.meta["duplicateNodes"],
+        "unmatchedChannels": topology.meta["unmatchedChannels"],
+        "selfLoops": int(np.sum(topology.source == topology.target)),
+        "meanDegree": float(degree.mean()) if degree.shape[0] > 0 else float("nan"),
+        "maxDegree": int(degree.max(initial=0)),
+        "degreeDistribution": np.bincount(degree).tolist(),
+        "capacityGini": gini(np.asarray(topology.capacity)),
+        "totalCapacity": float(np.nansum(topology.capacity)),
+        "components": int(np.count_nonzero(sizes)),
+        "largestComponentNodes": int(largest.shape[0]),
+        "largestComponentChannels": int(np.sum(largestChannels))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the graph statistics of the Lightning topology the simulations use")
+    parser.add_argument("nodes", nargs="?", default=os.path.join(RESOURCES_DIR, "nodes_05-05-2021.json"), help="node JSON file")
+    parser.add_argument("channels", nargs="?", default=os.path.join(RESOURCES_DIR, "channels_05-05-2021.json"), help="channel JSON file")
+    parser.add_argument("--cache-dir", default="app/plot_cache/topology", help="directory of the memory-mappable arrays, parsed again when the JSON changed")
+    parser.add_argument("--no-cache", action="store_true", help="always parse the JSON")
+    args = parser.parse_args()
+
+    topology = load_topology(args.nodes, args.channels, None if args.no_cache else args.cache_dir)
+    print(json.dumps(graph_stats(topology), indent=2))
+
+
+if __name__ == "__main__":
+    main()
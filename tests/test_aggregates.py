@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pytest
+
+from plotting.ingest import ingest_run
+from plotting.settings import node_type_names
+from plotting.synthetic import generate_tree
+
+TRIALS = ["PART_DISC", "SCORE_VS_PERC_LEADERS", "STATIC_REBALANCING_COMPARISON"]
+
+
+def baseline_aggregates(path, trial, run):
+    # The parse and aggregation of generate_plots.py before plotting.parsing: x stays the settings string
+    # (part), every metric line goes through np.fromstring and every unique x is averaged with np.where
+    with open(path) as f:
+        lines = f.readlines()
+
+    xRuns = []
+    yRuns = {}
+    for line in lines:
+        key, values = line.strip().split(":")
+        if key == "settings":
+            settingParts = values.split("_")
+            if trial == "PART_DISC" and "hopCount" in run:
+                xRuns.append(settingParts[0])
+            elif trial == "PART_DISC" and "maxNumberOfInvites" in run:
+                xRuns.append(settingParts[1])
+            elif trial == "SCORE_VS_PERC_LEADERS" and "percentageLeaders" in run:
+                xRuns.append(settingParts[2])
+            elif trial == "STATIC_REBALANCING_COMPARISON":
+                xRuns.append(values)
+        else:
+            yRuns.setdefault(key, []).append(np.fromstring(values, sep=","))
+
+    xRuns = np.array(xRuns, dtype=object)
+    yRuns = {yDatName: np.array(values).flatten() for yDatName, values in yRuns.items()}
+    aggregates = {}
+    for xU in np.unique(xRuns):
+        uniqueIndices = np.where(xRuns == xU)
+        aggregates[xU] = {yDatName: (np.average(values[uniqueIndices]), np.std(values[uniqueIndices])) for yDatName, values in yRuns.items()}
+    return aggregates
+
+
+@pytest.fixture(scope="module")
+def topDir(tmp_path_factory):
+    topDir = tmp_path_factory.mktemp("output_files")
+    generate_tree(str(topDir), trials=TRIALS, nOfSeeds=7, seed=3)
+    return topDir
+
+
+def run_files(topDir):
+    return [(trial, run) for trial in TRIALS for run in sorted(os.listdir(topDir / trial))]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_aggregates_match_baseline(topDir, streaming):
+    runs = run_files(topDir)
+    assert len(runs) == 12
+    for trial, run in runs:
+        path = str(topDir / trial / run)
+        expected = baseline_aggregates(path, trial, run)
+        runData = ingest_run(path, trial, run, streaming=streaming)
+
+        if trial == "STATIC_REBALANCING_COMPARISON":
+            x = node_type_names(runData["x"])
+        else:
+            x = runData["x"]
+            expected = {float(xU): aggregates for xU, aggregates in expected.items()}
+        assert sorted(x.tolist()) == sorted(expected)
+
+        for i, xU in enumerate(x.tolist()):
+            for yDatName, (mean, std) in expected[xU].items():
+                assert runData["y"][yDatName][i] == pytest.approx(mean, rel=1e-12), (trial, run, xU, yDatName)
+                assert runData["yErr"][yDatName][i] == pytest.approx(std, rel=1e-9, abs=1e-9), (trial, run, xU, yDatName)
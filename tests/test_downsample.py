@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+import pytest
+
+from plotting.downsample import envelope, lttb_indices
+
+
+def reference_lttb(x, y, threshold):
+    # A plain port of the reference implementation (Steinarsson, 2013)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    kept = [0]
+    for i in range(threshold - 2):
+        avgStart = int(math.floor((i + 1) * every)) + 1
+        avgEnd = min(int(math.floor((i + 2) * every)) + 1, n)
+        avgX = sum(x[avgStart:avgEnd]) / (avgEnd - avgStart)
+        avgY = sum(y[avgStart:avgEnd]) / (avgEnd - avgStart)
+
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        best, bestArea = None, -1
+        for j in range(start, end):
+            area = abs((x[a] - avgX) * (y[j] - y[a]) - (x[a] - x[j]) * (avgY - y[a])) * 0.5
+            if area > bestArea:
+                best, bestArea = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return kept
+
+
+def test_lttb_matches_reference_for_every_size():
+    rng = np.random.default_rng(0)
+    for n in range(3, 80):
+        x = np.arange(n, dtype=float)
+        y = rng.normal(size=n)
+        for nOfPoints in range(3, n + 1):
+            assert lttb_indices(x, y, nOfPoints).tolist() == reference_lttb(x.tolist(), y.tolist(), nOfPoints), (n, nOfPoints)
+
+
+@pytest.mark.parametrize("n, nOfPoints", [(50, 49), (1000, 37), (10007, 500)])
+def test_lttb_matches_reference_on_a_time_series(n, nOfPoints):
+    rng = np.random.default_rng(n)
+    # Irregular sample times with a trend, noise and a few peaks
+    x = np.cumsum(rng.integers(1, 4, n)) * 1000.
+    y = np.exp(-x / x[-1] * 3) + rng.normal(0, 0.01, n)
+    y[rng.integers(0, n, 5)] += 1
+    assert lttb_indices(x, y, nOfPoints).tolist() == reference_lttb(x.tolist(), y.tolist(), nOfPoints)
+
+
+def test_lttb_keeps_short_lines():
+    x = np.arange(5.)
+    assert lttb_indices(x, x, 5).tolist() == [0, 1, 2, 3, 4]
+    assert lttb_indices(x, x, 2).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_envelope_covers_every_sample():
+    rng = np.random.default_rng(1)
+    x = np.arange(103.)
+    lower = rng.normal(size=103)
+    upper = lower + rng.random(103)
+    bucketX, bucketLower, bucketUpper = envelope(x, lower, upper, 10)
+    # With step="post" sample i is drawn in the last bucket starting at or before it
+    bucket = np.searchsorted(bucketX[:-1], x, side="right") - 1
+    assert np.all(bucketLower[bucket] <= lower)
+    assert np.all(bucketUpper[bucket] >= upper)
+    assert bucketX[-1] == x[-1]
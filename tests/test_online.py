@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from plotting.aggregate import aggregate_run
+from plotting.online import OnlineStats
+
+
+def blocks(rng, nOfBlocks):
+    # Blocks of varying length over partly overlapping x values, like the sample times of seeds that ran for
+    # different times
+    for _ in range(nOfBlocks):
+        x = np.arange(rng.integers(0, 5), rng.integers(6, 20), dtype=float)
+        yield x, {"a": rng.normal(5, 2, x.shape[0]), "b": rng.exponential(3, x.shape[0])}
+
+
+def assert_same_result(result, expected):
+    x, y, yErr = result
+    np.testing.assert_array_equal(x, expected[0])
+    for yDatName in expected[1]:
+        np.testing.assert_allclose(y[yDatName], expected[1][yDatName], rtol=1e-12)
+        np.testing.assert_allclose(yErr[yDatName], expected[2][yDatName], rtol=1e-10, atol=1e-12)
+
+
+@pytest.mark.parametrize("nOfParts", [2, 3, 7])
+def test_merged_stats_match_single_accumulator(nOfParts):
+    rng = np.random.default_rng(nOfParts)
+    allBlocks = list(blocks(rng, 21))
+
+    single = OnlineStats()
+    for xRuns, yRuns in allBlocks:
+        single.add(xRuns, yRuns)
+
+    # Every part gets every nOfParts-th block, as parallel workers would
+    parts = [OnlineStats() for _ in range(nOfParts)]
+    for i, (xRuns, yRuns) in enumerate(allBlocks):
+        parts[i % nOfParts].add(xRuns, yRuns)
+    merged = OnlineStats()
+    for part in parts:
+        merged.merge(part)
+
+    xRuns = np.concatenate([xRuns for xRuns, _ in allBlocks])
+    yRuns = {yDatName: np.concatenate([yRuns[yDatName] for _, yRuns in allBlocks]) for yDatName in ("a", "b")}
+    expected = aggregate_run(xRuns, yRuns)
+    assert_same_result(single.result(), expected)
+    assert_same_result(merged.result(), expected)
+    np.testing.assert_array_equal(merged.count, single.count)
+
+
+def test_merge_of_disjoint_x_and_empty_stats():
+    first, second = OnlineStats(), OnlineStats()
+    first.add(np.array([3., 4.]), {"a": np.array([1., 2.])})
+    second.add(np.array([1., 2., 1.]), {"a": np.array([5., 6., 7.])})
+    first.merge(second)
+    first.merge(OnlineStats())
+
+    x, y, yErr = first.result()
+    assert x.tolist() == [1., 2., 3., 4.]
+    assert y["a"].tolist() == [6., 6., 1., 2.]
+    assert yErr["a"].tolist() == [1., 0., 0., 0.]
+
+
+def test_arrays_round_trip():
+    stats = OnlineStats()
+    for xRuns, yRuns in blocks(np.random.default_rng(0), 5):
+        stats.add(xRuns, yRuns)
+    assert_same_result(OnlineStats.from_arrays(stats.to_arrays()).result(), stats.result())
@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+import pytest
+
+from plotting.statistics import mann_whitney_u, sample_matrix, welch_t_test
+
+
+def padded(rows):
+    # One row per sample list, padded with NaN like sample_matrix does
+    samples = np.full((len(rows), max(len(row) for row in rows)), np.nan)
+    for i, row in enumerate(rows):
+        samples[i, :len(row)] = row
+    return samples, np.array([len(row) for row in rows])
+
+
+def t_tail(t, df, nOfSteps=400001):
+    # Two-sided p-value of Student's t by integrating its density from 0 to |t|
+    grid = np.linspace(0, abs(t), nOfSteps)
+    scale = math.exp(math.lgamma((df + 1) / 2) - math.lgamma(df / 2)) / math.sqrt(df * math.pi)
+    density = scale * (1 + grid * grid / df) ** (-(df + 1) / 2)
+    return 1 - 2 * np.trapezoid(density, grid)
+
+
+def test_welch_t_test_matches_integrated_t_distribution():
+    rng = np.random.default_rng(1)
+    rowsA = [rng.normal(0, 1, n) for n in (2, 5, 12, 40, 7)]
+    rowsB = [rng.normal(shift, scale, n) for shift, scale, n in ((0.5, 1, 3), (1, 3, 6), (0.3, 0.5, 20), (0.2, 1, 35), (4, 1, 9))]
+    a, countA = padded(rowsA)
+    b, countB = padded(rowsB)
+
+    t, p = welch_t_test(a, countA, b, countB)
+    for i, (rowA, rowB) in enumerate(zip(rowsA, rowsB)):
+        errorA, errorB = np.var(rowA, ddof=1) / len(rowA), np.var(rowB, ddof=1) / len(rowB)
+        expectedT = (np.mean(rowA) - np.mean(rowB)) / math.sqrt(errorA + errorB)
+        df = (errorA + errorB) ** 2 / (errorA ** 2 / (len(rowA) - 1) + errorB ** 2 / (len(rowB) - 1))
+        assert t[i] == pytest.approx(expectedT, rel=1e-12)
+        assert p[i] == pytest.approx(t_tail(expectedT, df), rel=1e-6, abs=1e-9)
+
+
+def test_welch_t_test_without_variance_is_nan():
+    a, countA = padded([[1.], [2., 2., 2.]])
+    b, countB = padded([[1., 3.], [2., 2.]])
+    t, p = welch_t_test(a, countA, b, countB)
+    assert np.all(np.isnan(p))
+
+
+def brute_force_mann_whitney_u(rowA, rowB):
+    # U counts the pairs where the sample of a is larger, ties count half
+    u = sum(1. if x > y else 0.5 if x == y else 0. for x in rowA for y in rowB)
+    n = len(rowA) + len(rowB)
+    _, tieSize = np.unique(np.concatenate((rowA, rowB)), return_counts=True)
+    sigma = math.sqrt(len(rowA) * len(rowB) / 12 * ((n + 1) - np.sum(tieSize ** 3 - tieSize) / (n * (n - 1))))
+    z = max((abs(u - len(rowA) * len(rowB) / 2) - 0.5) / sigma, 0)
+    return u, min(math.erfc(z / math.sqrt(2)), 1.)
+
+
+def test_mann_whitney_u_matches_brute_force():
+    rng = np.random.default_rng(2)
+    # Small integers, so most rows have ties within and between the samples
+    rowsA = [rng.integers(0, 6, n).astype(float) for n in (1, 4, 9, 15, 30)]
+    rowsB = [rng.integers(1, 7, n).astype(float) for n in (3, 8, 9, 2, 25)]
+    a, countA = padded(rowsA)
+    b, countB = padded(rowsB)
+
+    u, p = mann_whitney_u(a, countA, b, countB)
+    for i, (rowA, rowB) in enumerate(zip(rowsA, rowsB)):
+        expectedU, expectedP = brute_force_mann_whitney_u(rowA, rowB)
+        assert u[i] == expectedU
+        assert p[i] == pytest.approx(expectedP, rel=1e-12)
+
+
+def test_sample_matrix_rows_follow_block_order():
+    xRuns = np.array([2., 1., 2., 1., 2.])
+    x, count, samples = sample_matrix(xRuns, {"a": np.arange(5.), "b": -np.arange(5.)}, ["a", "b"])
+    assert x.tolist() == [1., 2.]
+    assert count.tolist() == [2, 3]
+    np.testing.assert_array_equal(samples, [[1., 3., np.nan], [0., 2., 4.], [-1., -3., np.nan], [0., -2., -4.]])